@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: N. Siomos
+
+Equivalence check and benchmark of the licel decoders. Synthetic licel files
+are written in both supported layouts (licel and licel_old2rack). Every file
+is decoded with the vectorized read_body and find_sep of the reader and with
+the reference read_body_ref and find_sep_ref (the original bin by bin
+decoders). The decoded arrays must be identical byte for byte, also when the
+whole folder is read with dtfs (serially, with workers, and lazily). The
+decoding times per file are reported
+"""
+
+import os, time, tempfile
+import warnings
+from datetime import datetime, timedelta
+import numpy as np
+from scc_converter.readers import read_licel, read_licel_old2rack
+
+warnings.filterwarnings('ignore')
+
+#------------------------------------------------------------------------------
+# A) Inputs
+#------------------------------------------------------------------------------
+n_files = 20 # Number of licel files per folder
+
+bins = [16380, 16380, 8000, 8000, 16380, 16380, 4000, 4000, 16380, 16380, 2000, 2000] # Number of bins per channel
+
+workers = 4 # Number of workers of the concurrent reading
+
+readers = {'licel' : read_licel,
+           'licel_old2rack' : read_licel_old2rack}
+
+#------------------------------------------------------------------------------
+# B) Synthetic licel files
+#------------------------------------------------------------------------------
+def write_files(folder, file_format, seed = 0):
+
+    """ Writes n_files synthetic licel files of file_format in folder. The
+    files are written in reverse temporal order so that the sorting of the
+    readers is also checked"""
+
+    rng = np.random.default_rng(seed)
+
+    start = datetime(2024, 3, 8, 20, 0, 0)
+
+    date = lambda t: t.strftime('%d/%m/%Y %H:%M:%S')
+
+    for k in reversed(range(n_files)):
+
+        stime = start + timedelta(minutes = k)
+
+        etime = stime + timedelta(seconds = 59)
+
+        if file_format == 'licel':
+            lines = [f' b{k:07d}.dat',
+                     f' Athens {date(stime)} {date(etime)} 0100 0023.7200 0037.9600 0.0 0.0 ',
+                     ' 0001200 0010 0000000 0010 02 ']
+        else:
+            lines = [f' b{k:07d}.dat', ' ', ' ',
+                     f' Athens {date(stime)} {date(etime)} 0 0 0023.7200 0037.9600 0100 ',
+                     ' 0001200 0010 0000000 0010 02 ']
+
+        body = b''
+
+        for j in range(len(bins)):
+
+            if file_format == 'licel':
+                lines.append(f' 1 {j % 2} 1 {bins[j]} 1 0800 7.50 00{355 + j}.o 0 0 00 000 12 {1200 - k:06d} 0.500 BT{j} ')
+            else:
+                lines.append(f' 1 {j % 2} 1 {bins[j]} 1 0800 7.50 00{355 + j}.o 12 {1200 - k:06d} 0.500 BT{j} ')
+
+            # Include the edge values of the 32bit unsigned integers
+            block = rng.integers(0, 2**32, bins[j], dtype = np.uint64)
+
+            block[:2] = [0, 2**32 - 1]
+
+            body = body + block.astype('<u4').tobytes() + b'\r\n'
+
+        with open(os.path.join(folder, f'b{k:07d}.dat'), 'wb') as f:
+            f.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+
+    return()
+
+#------------------------------------------------------------------------------
+# C) Equivalence check and benchmark
+#------------------------------------------------------------------------------
+print('format | files | reference [s/file] | vectorized [s/file] | speedup | identical')
+
+with tempfile.TemporaryDirectory() as folder_root:
+
+    for file_format in readers.keys():
+
+        reader = readers[file_format]
+
+        folder = os.path.join(folder_root, file_format)
+
+        os.makedirs(folder)
+
+        write_files(folder = folder, file_format = file_format)
+
+        mfiles = sorted([os.path.join(folder, fname) for fname in os.listdir(folder)])
+
+        buffer = reader.read_buffer(mfiles[0])
+
+        channel_info = reader.read_channels(reader.read_header(buffer = buffer, sep = reader.find_sep(buffer, mfiles[0])))
+
+        t_ref, t_vec, sig_ref = 0., 0., []
+
+        identical = True
+
+        for mfile in mfiles:
+
+            buffer = reader.read_buffer(mfile)
+
+            start = time.perf_counter()
+            sep_ref = reader.find_sep_ref(buffer, mfile)
+            sig_ref.append(reader.read_body_ref(channel_info, buffer = buffer, sep = sep_ref))
+            t_ref = t_ref + time.perf_counter() - start
+
+            start = time.perf_counter()
+            sep = reader.find_sep(buffer, mfile)
+            sig = reader.read_body(channel_info, buffer = buffer, sep = sep, fname = mfile)
+            t_vec = t_vec + time.perf_counter() - start
+
+            identical = identical and sep == sep_ref and \
+                sig.dtype == sig_ref[-1].dtype and \
+                sig.tobytes() == sig_ref[-1].tobytes()
+
+        # The files are named in temporal order
+        sig_ref = np.stack(sig_ref)
+
+        for options in [dict(), dict(workers = workers), dict(lazy = True)]:
+
+            sig_raw = reader.dtfs(folder, **options)[3]
+
+            identical = identical and sig_raw.values.tobytes() == sig_ref.tobytes()
+
+        print(f'{file_format:>14} | {n_files:5d} | {t_ref / n_files:18.4f} | {t_vec / n_files:19.5f} | {t_ref / t_vec:7.0f} | {identical}')
+
+        if not identical:
+            raise Exception(f'-- Error: The vectorized and the reference decoders of the {file_format} reader differ!')
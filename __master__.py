@@ -43,6 +43,7 @@ def main(mst_args):
     cnv_files = processing_chain.converter(mst_args = mst_args,
                                            mst_cfg = mst_cfg,  
                                            cnv_out = mst_args['converter_out'],
+                                           prs_out = mst_args['preprocessor_out'],
                                            processing = processing,
                                            reprocess = reprocess['converter'])
     
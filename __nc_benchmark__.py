@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: N. Siomos
+
+Benchmark of the storage options of the QA file signal variables (see
+scc_converter.tools.make.storage_options). A synthetic night of lidar signals
+is written with make.make_nc_var for each compression level and chunking.
+The write time, the file size, and the read times of the whole variable, of
+a single time frame, and of a single channel are reported
+"""
+
+import os, time, tempfile
+import numpy as np
+import netCDF4 as nc
+from scc_converter.tools import make
+
+#------------------------------------------------------------------------------
+# A) Inputs
+#------------------------------------------------------------------------------
+n_time = 600 # Number of time frames (e.g. 10 hours of 1 minute files)
+
+n_channels = 8 # Number of channels, half analog and half photon counting
+
+n_points = 8000 # Number of bins per profile (e.g. 60 km with 7.5 m resolution)
+
+compression_levels = [0, 1, 4, 9] # zlib compression levels, 0 means no compression
+
+chunkings = [None, 'profile', 'frame', 'channel'] # Chunk shapes, None means the default of each compression level
+
+repeat = 3 # The read times are the minimum of repeat reads
+
+#------------------------------------------------------------------------------
+# B) Synthetic signals
+#------------------------------------------------------------------------------
+rng = np.random.default_rng(0)
+
+height = 7.5 * np.arange(1, n_points + 1)
+
+# Range corrected molecular-like decay with a background
+profile = 1E9 * np.exp(-height / 8000.) / np.power(height, 2) + 2.
+
+sig = np.zeros((n_time, n_channels, n_points))
+
+for j in range(n_channels):
+    scale = 1. + rng.random(n_time)
+    if j % 2 == 0:
+        # Analog signals in mV
+        sig[:, j, :] = scale[:, np.newaxis] * profile[np.newaxis, :] * 1E-2 + \
+            1E-3 * rng.standard_normal((n_time, n_points))
+    else:
+        # Photon counting signals in counts
+        sig[:, j, :] = rng.poisson(scale[:, np.newaxis] * profile[np.newaxis, :])
+
+print(f'-- Synthetic signal: {n_time} time frames, {n_channels} channels, {n_points} bins ({np.round(sig.nbytes / 1E6, decimals = 1)} MB)')
+
+#------------------------------------------------------------------------------
+# C) Benchmark
+#------------------------------------------------------------------------------
+def read_time(nc_path, key):
+
+    times = []
+
+    for i in range(repeat):
+        with nc.Dataset(nc_path, mode = 'r') as ds:
+            start = time.perf_counter()
+            ds.variables['Raw_Lidar_Data'][key]
+            times.append(time.perf_counter() - start)
+
+    return(np.min(times))
+
+print('level | chunking | write [s] | size [MB] | read all [s] | read frame [s] | read channel [s]')
+
+with tempfile.TemporaryDirectory() as folder:
+
+    for level in compression_levels:
+
+        for chunking in chunkings:
+
+            if level == 0 and chunking == None:
+                label = 'contiguous'
+            elif chunking == None:
+                continue
+            else:
+                label = chunking
+
+            nc_path = os.path.join(folder, f'benchmark_{level}_{label}.nc')
+
+            start = time.perf_counter()
+
+            with nc.Dataset(nc_path, mode = 'w') as ds:
+                ds.createDimension('time', n_time)
+                ds.createDimension('channels', n_channels)
+                ds.createDimension('points', n_points)
+
+                make.make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.copy(), dtype = 'float', dims = ('time', 'channels', 'points',), compression_level = level, chunking = chunking)
+
+            t_write = time.perf_counter() - start
+
+            size = os.path.getsize(nc_path) / 1E6
+
+            t_all = read_time(nc_path, key = slice(None))
+
+            t_frame = read_time(nc_path, key = (n_time // 2, slice(None), slice(None)))
+
+            t_channel = read_time(nc_path, key = (slice(None), n_channels // 2, slice(None)))
+
+            print(f'{level:5d} | {label:>10} | {t_write:9.3f} | {size:9.1f} | {t_all:12.3f} | {t_frame:14.4f} | {t_channel:16.4f}')
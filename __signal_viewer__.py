@@ -34,7 +34,9 @@ statistics_range = [5.7, 7.3] # in km. Select a range to calculate statistics on
 
 mtype = 'drk' # set to either 'ray', 'drk', 'tlc', 'pcb' to plot the signals of the corresponding QA test 
 
-signal_type = 'raw' # select either 'raw' or 'rangecor' to plots the raw or the rangecorrected signals, respectively
+signal_type = 'raw' # select either 'raw', 'rangecor', or 'debug' to plots the raw, the rangecorrected signals, or the debug snapshots of a preprocessing stage, respectively
+
+debug_stage = 'sig_bgc' # the preprocessing stage of the debug snapshots, e.g. 'sig_puc', 'sig_dtc', 'sig_avg', 'sig_trc', 'sig_trm', 'sig_bgc', 'sig_drc'. Only used if signal_type is 'debug'. The debug snapshots are plotted per bin
 
 channels = None# ['1064xpat'] # use the ATLAS IDs to plot only specific channels, can be a list or scalar, set to None to plot all channels
     
@@ -48,6 +50,9 @@ custom_label = 'pretrigger_50us' # provide a label to be added to the plot title
 # Path to the 'netcdf' folder that contains the files exported from ATLAS (more than 1 paths can be provided)
 netcdf_folder = os.path.join(parent_folder, 'netcdf')
 
+# Path to the preprocessor output folder (preprocessor_out), the debug snapshots are placed in its debug subfolder
+preprocessor_folder = os.path.join(netcdf_folder, 'preprocessor')
+
 # Path to the folder where the plots will be placed. If set to None
 plot_folder = os.path.join(parent_folder, 'html')
 
@@ -63,7 +68,8 @@ options = dict(netcdf_folder = netcdf_folder,
                signal_type = signal_type,
                channels = channels,
                colorscale = colorscale,
-               custom_label = custom_label)
+               custom_label = custom_label,
+               debug_stage = debug_stage)
 
 viewer_utils.check_options(options)
 
@@ -71,9 +77,14 @@ viewer_utils.check_options(options)
 #------------------------------------------------------------------------------
 # C) Reading files 
 #------------------------------------------------------------------------------
-fpath_list = viewer_utils.get_fpaths(netcdf_folder = options['netcdf_folder'], 
-                                     signal_type = options['signal_type'],
-                                     mtype = options['mtype'])
+if options['signal_type'] == 'debug':
+    fpath_list = viewer_utils.get_debug_fpaths(preprocessor_folder = preprocessor_folder, 
+                                               mtype = options['mtype'],
+                                               stage = options['debug_stage'])
+else:
+    fpath_list = viewer_utils.get_fpaths(netcdf_folder = options['netcdf_folder'], 
+                                         signal_type = options['signal_type'],
+                                         mtype = options['mtype'])
     
 if options['signal_type'] == 'raw':
     for fpath in fpath_list:
@@ -87,6 +98,12 @@ if options['signal_type'] == 'rangecor':
             viewer_utils.get_prepro_signals(fpath = fpath,
                                             options = options)
 
+if options['signal_type'] == 'debug':
+    for fpath in fpath_list:
+        sig, ranges, date_info, stats = \
+            viewer_utils.get_debug_signals(fpath = fpath,
+                                           options = options)
+
 #------------------------------------------------------------------------------
 # E) Plotting 
 #------------------------------------------------------------------------------
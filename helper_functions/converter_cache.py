@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: N. Siomos
+
+Content-addressed cache of the converter QA files
+
+A cache key is computed for each measurement type from the raw file list of
+its input folders (relative names, sizes, and modification times), the
+contents of the configuration file, the converter settings that affect that
+measurement type, and the ATLAS version. The key is stored as a global
+attribute of the QA file. An existing QA file is reused only if its stored
+key matches the key of the current inputs
+"""
+
+import os, glob, json, hashlib, fnmatch
+import netCDF4 as nc
+
+key_attribute = 'ATLAS_Cache_Key'
+
+# Raw input folders read by each measurement type
+input_folders = {'ray' : ['rayleigh_folder', 'dark_folder'],
+                 'tlc' : ['telecover_sectors_folder', 'telecover_rings_folder',
+                          'dark_folder'],
+                 'pcb' : ['pcb_cal_p45_folder', 'pcb_cal_m45_folder',
+                          'pcb_cal_stc_folder', 'dark_folder'],
+                 'drk' : ['dark_folder']}
+
+# Settings that only affect some of the measurement types
+specific_settings = {'ray' : ['radiosonde', 'ground_*', 'rsonde_*',
+                              'slice_rayleigh', 'rayleigh_windows'],
+                     'tlc' : ['files_per_*'],
+                     'pcb' : ['radiosonde', 'ground_*', 'rsonde_*'],
+                     'drk' : []}
+
+# Paths that are hashed by content and options that do not change the output
+ignored_settings = ['parent_folder', '*_folder', 'config_file',
+                    'rayleigh_filename', 'debug', 'workers', 'header_index',
+                    'lazy_read', 'compact_read', 'append']
+
+def listing_digest(path):
+
+    """ Returns the sha1 digest of the listing of a file or of all the files
+    inside a folder and its subfolders (relative path, size, and modification
+    time). The ATLAS sidecar files (.atlas_*) are skipped"""
+
+    hasher = hashlib.sha1()
+
+    if path != None and os.path.isfile(path):
+        stat = os.stat(path)
+        hasher.update(f'{os.path.basename(path)}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+
+    elif path != None and os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted([dname for dname in dirs if not dname.startswith('.atlas')])
+            for fname in sorted(files):
+                if fname.startswith('.atlas'):
+                    continue
+                fpath = os.path.join(root, fname)
+                stat = os.stat(fpath)
+                hasher.update(f'{os.path.relpath(fpath, path)}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+
+    return(hasher.hexdigest())
+
+def settings_digest(args, meas_type, version):
+
+    """ Returns the sha1 digest of the configuration file contents, of the
+    converter settings that affect the meas_type QA file, and of the ATLAS
+    version"""
+
+    def is_ignored(key):
+        patterns = [pattern for mtype in specific_settings.keys()
+                    if mtype != meas_type
+                    for pattern in specific_settings[mtype]
+                    if pattern not in specific_settings[meas_type]]
+        return(any([fnmatch.fnmatch(key, pattern)
+                    for pattern in ignored_settings + patterns]))
+
+    settings = {key : args[key] for key in sorted(args.keys())
+                if not is_ignored(key)}
+
+    hasher = hashlib.sha1()
+
+    hasher.update(version.encode())
+
+    hasher.update(json.dumps(settings, sort_keys = True, default = str).encode())
+
+    if args['config_file'] != None and os.path.isfile(args['config_file']):
+        with open(args['config_file'], 'rb') as file:
+            hasher.update(file.read())
+
+    return(hasher.hexdigest())
+
+def cache_key(args, meas_type, version):
+
+    """ Returns the cache key of the meas_type QA file as
+    '<settings digest>-<inputs digest>'. The inputs digest covers the raw
+    input folders, the radiosonde file(s) of the ray and pcb types, and the
+    cache key of the rayleigh QA file used by the pcb type"""
+
+    hasher = hashlib.sha1()
+
+    for key in input_folders[meas_type]:
+        hasher.update(f'{key}:{listing_digest(args[key])}\n'.encode())
+
+    if meas_type in ['ray', 'pcb']:
+        hasher.update(f'radiosonde:{listing_digest(args["radiosonde"])}\n'.encode())
+
+    if meas_type == 'pcb' and args['rayleigh_filename'] != None:
+        ray_path = os.path.join(args['output_folder'], args['rayleigh_filename'])
+        hasher.update(f'rayleigh:{stored_key(ray_path)}\n'.encode())
+
+    key = f'{settings_digest(args, meas_type, version)}-{hasher.hexdigest()}'
+
+    return(key)
+
+def stored_key(nc_path):
+
+    """ Returns the cache key stored in an existing QA file or None if the
+    file does not exist or has no key"""
+
+    key = None
+
+    if os.path.exists(nc_path):
+
+        ds = nc.Dataset(nc_path, mode = 'r')
+
+        key = getattr(ds, key_attribute, None)
+
+        ds.close()
+
+    return(key)
+
+def store_key(nc_path, key):
+
+    """ Writes the cache key as a global attribute of the QA file"""
+
+    ds = nc.Dataset(nc_path, mode = 'a')
+
+    ds.setncattr(key_attribute, key)
+
+    ds.close()
+
+    return()
+
+def clean(output_folder, meas_type, key, reprocess = True, append = False):
+
+    """ Removes the meas_type QA files of the output_folder whose stored
+    cache key does not match the key of the current inputs. Files without a
+    key (older ATLAS versions) are removed only if reprocess is True. In
+    append mode a rayleigh QA file is kept if only its raw inputs changed so
+    that the new raw files are appended to it. Returns the QA files that are
+    up to date"""
+
+    settings = key.split('-')[0]
+
+    nc_files = glob.glob(os.path.join(output_folder, f'*_{meas_type}_ATLAS_*.nc'))
+
+    valid = []
+
+    for nc_path in nc_files:
+
+        stored = stored_key(nc_path)
+
+        if stored == key or (stored == None and reprocess == False):
+            valid.append(nc_path)
+
+        elif append and meas_type == 'ray' and stored != None and \
+            stored.split('-')[0] == settings:
+            print(f'-- The raw inputs of the {meas_type} QA file changed. New raw files will be appended to: {nc_path}')
+
+        else:
+            if stored != None:
+                print(f'-- The inputs of the {meas_type} QA file changed. Removing: {nc_path}')
+            os.remove(nc_path)
+
+    if len(valid) > 0:
+        print(f'-- The inputs of the {meas_type} QA file did not change. Skipping the conversion: {valid[0]}')
+
+    return(valid)
+
+def remove_outputs(output_folder, meas_type):
+
+    """ Removes the preprocessed files of meas_type (including its 
+    quicklooks) from the preprocessor output_folder. Called when the QA file
+    is rebuilt or appended, so that the preprocessor does not reuse files 
+    made from the previous QA file"""
+
+    nc_files = glob.glob(os.path.join(output_folder, f'*_{meas_type}_ATLAS_*_prepro.nc'))
+
+    for nc_path in nc_files:
+        print(f'-- The {meas_type} QA file was updated. Removing the outdated preprocessed file: {nc_path}')
+        os.remove(nc_path)
+
+    return()
@@ -105,7 +105,7 @@ def call_parser(get_defaults = False):
     parser.add_argument('--quick_run', metavar='quick_run', 
                         type=bool, default = False,
                         action = argparse.BooleanOptionalAction,
-                        help='Defaults to: False. If set to True the converter and the preprocessing modules will not be called if the algorithm detects output files already produced by them for a specific measurement. This mainly saves time during execution.')            
+                        help='Defaults to: False. If set to True the preprocessing module will not be called if the algorithm detects output files already produced by it for a specific measurement. This mainly saves time during execution. The converter output files are always reused if their inputs (raw files, configuration file, converter settings, and ATLAS version) did not change and are regenerated otherwise, regardless of this option.')            
 
     parser.add_argument('--process', metavar='process', 
                         type=str, nargs='?', default = ['ray','tlc','pcb','drk'],
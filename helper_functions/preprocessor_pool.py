@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: N. Siomos
+
+Runs the ATLAS preprocessor jobs of a processing chain, sequentially or
+concurrently in a process pool
+
+The jobs are grouped by dependency. The polarization calibration reads the
+rayleigh QA file, so it runs in the same group right after the rayleigh job
+and reuses the parsed file and the corrected signals through the qa_cache of
+that process. The groups are independent and are started as long as the sum
+of their estimated memory fits in the memory limit (at least one group always
+runs). The output of each concurrent group is captured and printed as a whole
+once the group finishes, so the logs of the groups do not interleave
+"""
+
+import io, contextlib, traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import xarray as xr
+from processor.__preprocessor__ import main as __preprocessor__
+from processor.readers.parse_args import view_parser as view_prs
+
+# Peak memory of a preprocessor call relative to the size of the signals of
+# its QA file(s)
+memory_factor = 4.
+
+def run(jobs, version, workers = 1, memory_limit = 0.):
+
+    """ Runs the preprocessor for each measurement type of jobs (a dictionary
+    with the preprocessor arguments per type) and returns the output files
+    of each type. With more than one worker the independent groups of jobs
+    run in a process pool, the memory_limit (in MB, 0 for no limit) caps the
+    total estimated memory of the running groups. If a group fails, the
+    running groups finish, the pending ones are skipped, and a single error
+    names all the failed types"""
+
+    groups = job_groups(jobs)
+
+    workers = min(int(workers), len(groups))
+
+    files = dict()
+
+    if workers <= 1:
+        for group in groups:
+            for mtype, args in group:
+                view_prs(args)
+                files[mtype] = __preprocessor__(args, version)
+
+        return(files)
+
+    print(f"Preprocessing the {', '.join(jobs.keys())} measurements with {workers} workers")
+
+    pending = [(group, estimate_memory(group)) for group in groups]
+
+    running = dict()
+
+    errors = []
+
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+
+        while len(pending) > 0 or len(running) > 0:
+
+            # Start the next groups while they fit in the workers and memory
+            while len(pending) > 0 and len(running) < workers:
+
+                group, size = pending[0]
+
+                used = sum(running.values())
+
+                if len(running) > 0 and memory_limit > 0 and \
+                    used + size > memory_limit:
+                    break
+
+                pending.pop(0)
+
+                running[pool.submit(run_group, group, version)] = size
+
+            done, _ = wait(running.keys(), return_when = FIRST_COMPLETED)
+
+            for future in done:
+
+                running.pop(future)
+
+                group_files, log, error = future.result()
+
+                print(log, end = '')
+
+                files.update(group_files)
+
+                if error is not None:
+                    # Let the running groups finish but start no new ones
+                    errors.append(error)
+                    pending = []
+
+    if len(errors) > 0:
+        failed = '; '.join([f'{mtype}: {exc}' for mtype, exc in errors])
+        raise Exception(f"-- Error: The preprocessing of the {', '.join([mtype for mtype, _ in errors])} measurements failed ({failed})") from errors[0][1]
+
+    return(files)
+
+def job_groups(jobs):
+
+    """ Splits the jobs in groups of (type, arguments) pairs that must run
+    sequentially in the same process. The polarization calibration follows
+    the rayleigh job"""
+
+    groups = []
+
+    for mtype in jobs.keys():
+
+        if mtype == 'pcb' and 'ray' in jobs.keys():
+            continue
+
+        group = [(mtype, jobs[mtype])]
+
+        if mtype == 'ray' and 'pcb' in jobs.keys():
+            group.append(('pcb', jobs['pcb']))
+
+        groups.append(group)
+
+    # The largest groups start first
+    groups.sort(key = lambda group: -len(group))
+
+    return(groups)
+
+def run_group(group, version):
+
+    """ Runs the jobs of a group and returns their output files, the
+    captured log, and the type of the failed job with its exception (or 
+    None). The traceback of the exception is added to the log"""
+
+    files = dict()
+
+    error = None
+
+    log = io.StringIO()
+
+    with contextlib.redirect_stdout(log):
+        try:
+            for mtype, args in group:
+                view_prs(args)
+                files[mtype] = __preprocessor__(args, version)
+        except Exception as exc:
+            print(traceback.format_exc(), end = '')
+            error = (mtype, exc)
+
+    return(files, log.getvalue(), error)
+
+def estimate_memory(group):
+
+    """ Estimates the peak memory in MB of a group of jobs from the size of
+    the signals in their QA files. The jobs of a group run one after the
+    other, so the largest job counts"""
+
+    sizes = []
+
+    for mtype, args in group:
+
+        with xr.open_dataset(args['input_file']) as file:
+            size = sum([file[var].size * 8. for var in
+                        ['Raw_Lidar_Data', 'Background_Profile']
+                        if var in file.variables])
+
+        sizes.append(memory_factor * size / 1E6)
+
+    return(max(sizes))
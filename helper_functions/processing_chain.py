@@ -10,8 +10,9 @@ from version import __version__
 import os, warnings, glob
 from helper_functions import cleaner
 from helper_functions import parse_master_args
+from helper_functions import converter_cache
+from helper_functions import preprocessor_pool
 from scc_converter.__scc_converter__ import main as __scc_converter__
-from processor.__preprocessor__ import main as __preprocessor__
 from visualizer.__quicklook__ import main as __quicklook__
 from visualizer.__rayleigh_fit__ import main as __rayleigh_fit__
 from visualizer.__telecover_quadrants__ import main as __telecover_quadrants__
@@ -27,7 +28,6 @@ from visualizer.readers.parse_pcb_args import check_parser as check_pcb
 from visualizer.readers.parse_drk_args import check_parser as check_drk
 from visualizer.readers.parse_cmp_args import check_parser as check_cmp
 from scc_converter.readers.parse_args import view_parser as view_cnv
-from processor.readers.parse_args import view_parser as view_prs
 from visualizer.readers.parse_qck_args import view_parser as view_qck
 from visualizer.readers.parse_ray_args import view_parser as view_ray
 from visualizer.readers.parse_tlc_args import view_parser as view_tlc
@@ -46,7 +46,7 @@ from visualizer.readers.parse_drk_args import call_parser as parse_drk
 
 warnings.filterwarnings('ignore')
 
-def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
+def converter(mst_args, mst_cfg, cnv_out, prs_out, processing, reprocess = True):
 
     cnv_ray_file = []
     cnv_tlc_file = []
@@ -61,6 +61,10 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
         cnv_args = parse_master_args.substitute(org = cnv_args, rpl = mst_args)
         cnv_args = parse_master_args.substitute(org = cnv_args, rpl = mst_cfg.cnv)
         
+        # The processing chain handles a single rayleigh QA file
+        if cnv_args['rayleigh_windows'] != None:
+            raise Exception('-- Error: The rayleigh_windows option (batch slicing in one rayleigh QA file per window) is not supported by the processing chain, which expects a single rayleigh QA file. Please run the scc_converter separately for the batch slicing or use the slice_rayleigh option for a single window')
+        
     if processing['ray'] == True:
         
         cnv_ray_args = cnv_args.copy()   
@@ -69,14 +73,11 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
         cnv_ray_args = check_cnv(cnv_ray_args)
     
         os.makedirs(cnv_out, exist_ok = True)
-    
-        if reprocess == True:
-            for file in glob.glob(os.path.join(cnv_out, '*_ray_ATLAS_*.nc')):
-                os.remove(file)
                 
-        # QA files
-        if os.path.exists(cnv_ray_args['rayleigh_folder']):                    
-            cnv_ray_file = glob.glob(os.path.join(cnv_out, '*_ray_ATLAS_*.nc'))
+        # QA files - the ones with outdated inputs are removed
+        if os.path.exists(cnv_ray_args['rayleigh_folder']):
+            cache_key = converter_cache.cache_key(cnv_ray_args, meas_type = 'ray', version = __version__)
+            cnv_ray_file = converter_cache.clean(cnv_out, meas_type = 'ray', key = cache_key, reprocess = reprocess, append = cnv_ray_args['append'])
             if len(cnv_ray_file) > 1:
                 raise Exception(f'More than one rayleigh fit files detected in folder {cnv_out}. Please make sure that only one rayleigh file exists in that folder ')
            
@@ -86,6 +87,8 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
                 files = __scc_converter__(cnv_ray_args, __version__ = __version__)
                 if files['rayleigh'] != None:
                     cnv_ray_file = [files['rayleigh']]
+                    converter_cache.store_key(files['rayleigh'], cache_key)
+                    converter_cache.remove_outputs(prs_out, meas_type = 'ray')
                 else:
                     cnv_ray_file = []
         else:
@@ -104,16 +107,13 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
         cnv_tlc_args = check_cnv(cnv_tlc_args)
         
         os.makedirs(cnv_out, exist_ok = True)
-    
-        if reprocess == True:
-            for file in glob.glob(os.path.join(cnv_out, '*_tlc_ATLAS_*.nc')):
-                os.remove(file)
                 
-        # QA files  
+        # QA files - the ones with outdated inputs are removed
         if os.path.exists(cnv_tlc_args['telecover_sectors_folder']) or \
                 os.path.exists(cnv_tlc_args['telecover_rings_folder']):
                     
-            cnv_tlc_file = glob.glob(os.path.join(cnv_out, '*_tlc_ATLAS_*.nc'))
+            cache_key = converter_cache.cache_key(cnv_tlc_args, meas_type = 'tlc', version = __version__)
+            cnv_tlc_file = converter_cache.clean(cnv_out, meas_type = 'tlc', key = cache_key, reprocess = reprocess)
             if len(cnv_tlc_file) > 1:
                 raise Exception(f'More than one telecover files detected in folder {cnv_out}. Please make sure that only one telecover file exists in that folder ')
             
@@ -122,7 +122,9 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
                 view_cnv(cnv_tlc_args)
                 files = __scc_converter__(cnv_tlc_args, __version__ = __version__)
                 if files['telecover'] != None:
-                    cnv_tlc_file = [files['telecover']]                
+                    cnv_tlc_file = [files['telecover']]
+                    converter_cache.store_key(files['telecover'], cache_key)
+                    converter_cache.remove_outputs(prs_out, meas_type = 'tlc')
                 else:
                     cnv_ray_file = []
         else:
@@ -143,19 +145,11 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
         cnv_pcb_args = check_cnv(cnv_pcb_args)
         
         os.makedirs(cnv_out, exist_ok = True)
-    
-        if reprocess == True:
-            for file in glob.glob(os.path.join(cnv_out, '*_pcb_ATLAS_*.nc')):
-                os.remove(file)
                 
         # QA files   
         if (os.path.exists(cnv_pcb_args['pcb_cal_p45_folder']) and \
             os.path.exists(cnv_pcb_args['pcb_cal_m45_folder'])) or \
                 os.path.exists(cnv_pcb_args['pcb_cal_stc_folder']):
-                    
-            cnv_pcb_file = glob.glob(os.path.join(cnv_out, '*_pcb_ATLAS_*.nc'))        
-            if len(cnv_pcb_file) > 1:
-                raise Exception(f'More than one polarization calibration files detected in folder {cnv_out}. Please make sure that only one polarization calibration file exists in that folder ')         
     
             cnv_ray_file = glob.glob(os.path.join(cnv_out, '*_ray_ATLAS_*.nc'))
             if len(cnv_ray_file) > 1:
@@ -166,12 +160,20 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
             else:
                 raise Exception(f'Rayleigh file not found inside {cnv_out}. A Rayleigh measurement is mandatory for the pol. calibration test. Consider reprocessing with --quick_run deactivated ')
         
+            # The ones with outdated inputs (including the rayleigh QA file) are removed
+            cache_key = converter_cache.cache_key(cnv_pcb_args, meas_type = 'pcb', version = __version__)
+            cnv_pcb_file = converter_cache.clean(cnv_out, meas_type = 'pcb', key = cache_key, reprocess = reprocess)
+            if len(cnv_pcb_file) > 1:
+                raise Exception(f'More than one polarization calibration files detected in folder {cnv_out}. Please make sure that only one polarization calibration file exists in that folder ')         
+    
             # Ececute scc_converter
             if len(cnv_pcb_file) == 0 and processing['pcb'] == True:
                 view_cnv(cnv_pcb_args)
                 files = __scc_converter__(cnv_pcb_args, __version__ = __version__)
                 if files['polarization_calibration'] != None:
                     cnv_pcb_file = [files['polarization_calibration']]
+                    converter_cache.store_key(files['polarization_calibration'], cache_key)
+                    converter_cache.remove_outputs(prs_out, meas_type = 'pcb')
                 else:
                     cnv_pcb_file = []
         else:
@@ -190,14 +192,11 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
         cnv_drk_args = check_cnv(cnv_drk_args)
     
         os.makedirs(cnv_out, exist_ok = True)
-    
-        if reprocess == True:
-            for file in glob.glob(os.path.join(cnv_out, '*_drk_ATLAS_*.nc')):
-                os.remove(file)
                 
-        # QA files
-        if os.path.exists(cnv_drk_args['dark_folder']):                    
-            cnv_drk_file = glob.glob(os.path.join(cnv_out, '*_drk_ATLAS_*.nc'))
+        # QA files - the ones with outdated inputs are removed
+        if os.path.exists(cnv_drk_args['dark_folder']):
+            cache_key = converter_cache.cache_key(cnv_drk_args, meas_type = 'drk', version = __version__)
+            cnv_drk_file = converter_cache.clean(cnv_out, meas_type = 'drk', key = cache_key, reprocess = reprocess)
             if len(cnv_drk_file) > 1:
                 raise Exception(f'More than one rayleigh fit files detected in folder {cnv_out}. Please make sure that only one rayleigh file exists in that folder ')
            
@@ -207,6 +206,8 @@ def converter(mst_args, mst_cfg, cnv_out, processing, reprocess = True):
                 files = __scc_converter__(cnv_drk_args, __version__ = __version__)
                 if files['dark'] != None:
                     cnv_drk_file = [files['dark']]
+                    converter_cache.store_key(files['dark'], cache_key)
+                    converter_cache.remove_outputs(prs_out, meas_type = 'drk')
                 else:
                     cnv_drk_file = []
         else:
@@ -237,6 +238,9 @@ def preprocessor(mst_args, mst_cfg, cnv_files, prs_out, quicklook, processing, i
     prs_qck_pcb_file = []
     prs_qck_drk_file = []
 
+    # Preprocessor jobs that are executed after all the arguments are set
+    prs_jobs = dict()
+
     # Preprocessor arguments
     if (processing['ray'] == True and len(cnv_files['ray']) == 1) or \
         (processing['tlc'] == True and len(cnv_files['tlc']) == 1) or \
@@ -283,10 +287,7 @@ def preprocessor(mst_args, mst_cfg, cnv_files, prs_out, quicklook, processing, i
        
         # Excecute ATLAS preprocessor
         if len(prs_ray_file) == 0 and processing['ray'] == True:
-            view_prs(prs_ray_args)
-            files = __preprocessor__(prs_ray_args, __version__)
-            prs_ray_file = files['ray']
-            prs_qck_ray_file = files['qck'] 
+            prs_jobs['ray'] = prs_ray_args
 
     else:
         # Preprocessed files - shoulde be zero if reprocess is True
@@ -331,10 +332,7 @@ def preprocessor(mst_args, mst_cfg, cnv_files, prs_out, quicklook, processing, i
                 glob.glob(os.path.join(prs_out, f'{meas_ID}*_qck_tlc_ATLAS_*_prepro.nc'))
     
         if len(prs_tlc_file) == 0 and processing['tlc'] == True:
-            view_prs(prs_tlc_args)
-            files = __preprocessor__(prs_tlc_args, __version__)
-            prs_tlc_file = files['tlc']
-            prs_qck_tlc_file = files['qck']
+            prs_jobs['tlc'] = prs_tlc_args
 
     else:
         # Preprocessed files - shoulde be zero if reprocess is True
@@ -381,10 +379,7 @@ def preprocessor(mst_args, mst_cfg, cnv_files, prs_out, quicklook, processing, i
                 glob.glob(os.path.join(prs_out, f'{meas_ID}*_qck_pcb_ATLAS_*_prepro.nc'))
     
         if len(prs_pcb_file) == 0 and processing['pcb'] == True:
-            view_prs(prs_pcb_args)
-            files = __preprocessor__(prs_pcb_args, __version__)
-            prs_pcb_file = files['pcb']
-            prs_qck_pcb_file = files['qck']
+            prs_jobs['pcb'] = prs_pcb_args
 
     else:
         # Preprocessed files - shoulde be zero if reprocess is True
@@ -437,10 +432,7 @@ def preprocessor(mst_args, mst_cfg, cnv_files, prs_out, quicklook, processing, i
        
         # Excecute ATLAS preprocessor
         if len(prs_drk_file) == 0 and processing['drk'] == True:
-            view_prs(prs_drk_args)
-            files = __preprocessor__(prs_drk_args, __version__)
-            prs_drk_file = files['drk']
-            prs_qck_drk_file = files['qck'] 
+            prs_jobs['drk'] = prs_drk_args
 
     else:
         # Preprocessed files - shoulde be zero if reprocess is True
@@ -454,6 +446,26 @@ def preprocessor(mst_args, mst_cfg, cnv_files, prs_out, quicklook, processing, i
             meas_ID = os.path.basename(prs_drk_file[0])[:15]
             prs_qck_drk_file = \
                 glob.glob(os.path.join(prs_out, f'{meas_ID}*_qck_drk_ATLAS_*_prepro.nc'))
+
+    # Excecute ATLAS preprocessor - independent jobs can run in parallel
+    if len(prs_jobs) > 0:
+        files = preprocessor_pool.run(jobs = prs_jobs, 
+                                      version = __version__,
+                                      workers = prs_args['workers'],
+                                      memory_limit = prs_args['memory_limit'])
+        
+        if 'ray' in files.keys():
+            prs_ray_file = files['ray']['ray']
+            prs_qck_ray_file = files['ray']['qck']
+        if 'tlc' in files.keys():
+            prs_tlc_file = files['tlc']['tlc']
+            prs_qck_tlc_file = files['tlc']['qck']
+        if 'pcb' in files.keys():
+            prs_pcb_file = files['pcb']['pcb']
+            prs_qck_pcb_file = files['pcb']['qck']
+        if 'drk' in files.keys():
+            prs_drk_file = files['drk']['drk']
+            prs_qck_drk_file = files['drk']['qck']
    
     files_out = {'ray' : prs_ray_file, 
                  'tlc' : prs_tlc_file, 
@@ -10,6 +10,7 @@ import xarray as xr
 import numpy as np
 import pandas as pd
 from processor.readers.read_files import short_reader
+from processor.export import debug_store
 import netCDF4 as nc
 import os, glob
 from visualizer.tools.smoothing import sliding_average_2D_bin_fast, sliding_average_2D_fast
@@ -34,7 +35,8 @@ def check_options(options, ranges = None):
                         channels = True,
                         colorscale = False,
                         statistics_range = True,
-                        custom_label = False)
+                        custom_label = False,
+                        debug_stage = True)
     
     option_type = dict(netcdf_folder = [str],
                        plot_folder = [str],
@@ -47,7 +49,8 @@ def check_options(options, ranges = None):
                        channels = [str],
                        colorscale = [str],
                        statistics_range = [int, float],
-                       custom_label = [str])
+                       custom_label = [str],
+                       debug_stage = [str])
     
     option_shape = dict(netcdf_folder = 'scalar',
                         plot_folder = 'scalar',
@@ -60,7 +63,8 @@ def check_options(options, ranges = None):
                         channels = 'list',
                         colorscale = 'scalar',
                         statistics_range = 'list',
-                        custom_label = 'scalar')
+                        custom_label = 'scalar',
+                        debug_stage = 'scalar')
     
     
     check_none(options = options, none_allowed = none_allowed)
@@ -74,7 +78,7 @@ def check_options(options, ranges = None):
             
     check_channel_format(options)
         
-    allowed_signal_types = ['raw', 'rangecor']
+    allowed_signal_types = ['raw', 'rangecor', 'debug']
     allowed_mtypes = ['ray', 'tlc', 'pcb', 'drk']
     colorbar = ['sequential', 'discrete']
     check_allowed_values(options = options,
@@ -157,6 +161,14 @@ def check_conflicts(options):
     if not options['background_range'] == None and options['signal_type'] == 'rangecor':
         print("--Warning: Background correction is not supported for rangecorrected signals. The provided background_range will be ignored")
     
+    if options['signal_type'] == 'debug':
+        if options['debug_stage'] == None:
+            raise Exception("--Error: The debug_stage option must be provided for debug signals, e.g. 'sig_bgc'")
+        
+        for key in ['smoothing_window', 'normalization_range', 'background_range', 'statistics_range']:
+            if not options[key] == None:
+                print(f"--Warning: The debug signals are plotted per bin. The provided {key} will be ignored")
+    
     return()
     
 
@@ -392,6 +404,54 @@ def get_prepro_signals(fpath, options):
 
     return(sig, ranges, date_info, stats)
 
+def get_debug_fpaths(preprocessor_folder, mtype, stage): 
+    
+    pattern = f"{mtype}_*_{stage}.nc"
+    files = glob.glob(os.path.join(debug_store.folder_path(preprocessor_folder), pattern))
+    
+    if len(files) == 0:
+        raise Exception(f"--Warning: No debug files matching the given patern {pattern} were detected!")
+
+    return(files)
+
+def get_debug_signals(fpath, options):
+    
+    channels = options['channels']
+    timescale = options['timescale']
+  
+    if os.path.exists(fpath):
+        # Only the header is read here, the selected channels are loaded below
+        with xr.open_dataarray(fpath) as data:
+            all_channels = data.channel.values
+        
+        channels = check_channels(channels, all_channels)
+        
+        sig = debug_store.load(fpath = fpath, 
+                               channels = channels)
+        
+        start = pd.to_datetime(sig.time.values[0])
+        end = pd.to_datetime(sig.time.values[-1])
+        
+        date_info = dict()
+        date_info['start_date'] = start.strftime('%Y%m%d')
+        date_info['start_time'] = start.strftime('%H%M%S')
+        date_info['end_time'] = end.strftime('%H%M%S')
+        
+        # The snapshots are plotted per bin
+        ranges = xr.DataArray(np.tile(sig.bins.values, (sig.channel.size, 1)),
+                              dims = sig.dims[1:3], 
+                              coords = [sig.channel, sig.bins])
+       
+        sig = time_averaging(sig = sig, 
+                             timescale = timescale)
+        
+        stats = None
+                    
+    else:
+        raise Exception("-- Error: Debug file not found")
+
+    return(sig, ranges, date_info, stats)
+
 def bin_to_range(sig, zero_bin, range_resolution):
     
     channels = sig.copy().channel.values
@@ -661,7 +721,7 @@ def multi_line_plot_bokeh(signal, signal_type, ranges = [], channels = None,
             p.extra_x_ranges = {"x2": Range1d(start = x_range_2[0], end = x_range_2[1])}
             p.add_layout(LinearAxis(x_range_name = "x2", axis_label = x_label_2), 'above')
 
-        if not statistics_range == None:
+        if not statistics_range == None and not type(stats) == type(None):
             if signal_type == 'raw':
                 box_llim = np.where(ranges_ch >= statistics_range[0])[0][0]
                 box_ulim = np.where(ranges_ch <= statistics_range[1])[0][-1]
@@ -764,8 +824,13 @@ def make_labels(signal_type, channel_mode):
         y_label = 'RC Signal'
         x_label_1 = 'Range [km]'
         x_label_2 = ''
+    elif signal_type == 'debug':
+        y_units = 'AU'
+        y_label = 'Debug Signal'
+        x_label_1 = 'Bins'
+        x_label_2 = ''
     else:
-        raise Exception(f"-- Error: The provided stype ({signal_type}) was not recognize. Please select one of: ['rangecor','raw']")
+        raise Exception(f"-- Error: The provided stype ({signal_type}) was not recognize. Please select one of: ['rangecor','raw','debug']")
     
     return(x_label_1, x_label_2, y_label, y_units)
 
@@ -791,8 +856,14 @@ def find_x_limits(signal_type, bins, ranges):
         x_ulim_1 = x_vals_1[-1] + buffer_bins * range_resolution # in km
         x_range_1 = (x_llim_1, x_ulim_1)
         x_range_2 = []
+    elif signal_type == 'debug':
+        x_vals_1 = bins
+        x_llim_1 = x_vals_1[0] - buffer_bins # in bins
+        x_ulim_1 = x_vals_1[-1] + buffer_bins # in bins
+        x_range_1 = (x_llim_1, x_ulim_1)
+        x_range_2 = []
     else:
-        raise Exception(f"-- Error: The provided stype ({signal_type}) was not recognize. Please select one of: ['rangecor','raw']")
+        raise Exception(f"-- Error: The provided stype ({signal_type}) was not recognize. Please select one of: ['rangecor','raw','debug']")
        
     return(x_vals_1, x_range_1, x_range_2)
 
@@ -8,7 +8,7 @@ Created on Wed Aug 10 10:48:11 2022
 
 import warnings, os, sys
 from .readers.parse_args import call_parser, check_parser
-from .readers import read_files
+from .readers import read_files, qa_cache
 from .lidar_processing import short_prepro
 from .arc import atmosphere
 from .export import nc_dataset
@@ -28,15 +28,33 @@ def main(args, __version__):
     print('-----------------------------------------')
     print('Start reading the QA file(s)...')
     
+    qa_cache.set_max_size(args['cache_size'])
+    
+    # Parsed QA files and dark profiles are shared by all the preprocessor 
+    # calls of the same run (e.g. the rayleigh file of a pcb measurement)
+    read_options = dict(exclude_telescope_type = args['exclude_telescope_type'], 
+                        exclude_channel_type = args['exclude_channel_type'], 
+                        exclude_acquisition_mode = args['exclude_acquisition_mode'], 
+                        exclude_channel_subtype = args['exclude_channel_subtype'], 
+                        use_channels = args['channels'])
+    
+    dark_options = {key : args[key] for key in ['skip_dead_time_correction',
+                                                'vertical_trimming',
+                                                'vertical_limit', 'debug']}
+    
+    qa_key = qa_cache.file_key(args['input_file']) + (str(read_options),)
+    
+    # In the chunked quicklook mode the signals are read later in blocks
+    chunked = args['chunked_quicklook'] and args['quicklook'] and \
+        not args['debug']
+    
     system_info, channel_info, time_info, time_info_d, \
         sig_raw, sig_raw_d, shots, shots_d = \
-            read_files.short_reader(
-                args['input_file'],
-                exclude_telescope_type = args['exclude_telescope_type'], 
-                exclude_channel_type = args['exclude_channel_type'], 
-                exclude_acquisition_mode = args['exclude_acquisition_mode'], 
-                exclude_channel_subtype = args['exclude_channel_subtype'], 
-                use_channels = args['channels'])
+            qa_cache.cached(qa_key + ('qa', not chunked), 
+                            read_files.short_reader,
+                            args['input_file'],
+                            read_signal = not chunked,
+                            **read_options)
             
 
     print(f'Lidar: {system_info.Lidar_Name}')
@@ -54,15 +72,14 @@ def main(args, __version__):
         ray_path = os.path.join(os.path.dirname(args['input_file']),  
                                 system_info['Rayleigh_File_Name'])
         
+        qa_key_r = qa_cache.file_key(ray_path) + (str(read_options),)
+        
         system_info_r, channel_info_r, time_info_r, time_info_dr, \
             sig_raw_r, sig_raw_dr, shots_r, shots_dr = \
-                read_files.short_reader(
-                    ray_path,
-                    exclude_telescope_type = args['exclude_telescope_type'], 
-                    exclude_channel_type = args['exclude_channel_type'], 
-                    exclude_acquisition_mode = args['exclude_acquisition_mode'], 
-                    exclude_channel_subtype = args['exclude_channel_subtype'], 
-                    use_channels = args['channels'])
+                qa_cache.cached(qa_key_r + ('qa', True), 
+                                read_files.short_reader,
+                                ray_path,
+                                **read_options)
         
         if all([ch in channel_info_r.index.values 
                 for ch in channel_info.index.values]):
@@ -77,27 +94,44 @@ def main(args, __version__):
     
     print('-----------------------------------------')
     print("")
+    
+    if chunked:
+        qck_file = nc_dataset.quicklook_path(system_info = system_info, 
+                                             version = __version__, 
+                                             meas_type = meas_type, 
+                                             dir_out = args['output_folder'])
+    else:
+        qck_file = None
+    
+    # The unit converted and dead time corrected signals of the measurement 
+    # are passed on to the quicklook. In debug mode the quicklook repeats 
+    # all the stages so that their snapshots are stored
+    keep_cor = args['quicklook'] and not chunked and not args['debug']
 
     if meas_type != 'drk' and not isinstance(sig_raw_d, list):
         drk, drk_pack, time_info_d = \
-            short_prepro.dark(sig_raw = sig_raw_d, 
-                              shots = shots_d, 
-                              system_info = system_info, 
-                              channel_info = channel_info, 
-                              time_info = time_info_d,
-                              external_info = args)
+            qa_cache.cached(qa_key + ('drk', str(dark_options)),
+                            short_prepro.dark,
+                            sig_raw = sig_raw_d, 
+                            shots = shots_d, 
+                            system_info = system_info, 
+                            channel_info = channel_info, 
+                            time_info = time_info_d,
+                            external_info = args)
         sig_drk = drk_pack['sig_bgc']
     else:
         sig_drk = []
     
     if meas_type != 'drk' and 'Rayleigh_File_Name' in system_info.keys() and not isinstance(sig_raw_d, list):
         drk_r, drk_pack_r, time_info_dr = \
-            short_prepro.dark(sig_raw = sig_raw_dr, 
-                              shots = shots_dr, 
-                              system_info = system_info_r, 
-                              channel_info = channel_info_r, 
-                              time_info = time_info_dr,
-                              external_info = args)
+            qa_cache.cached(qa_key_r + ('drk', str(dark_options)),
+                            short_prepro.dark,
+                            sig_raw = sig_raw_dr, 
+                            shots = shots_dr, 
+                            system_info = system_info_r, 
+                            channel_info = channel_info_r, 
+                            time_info = time_info_dr,
+                            external_info = args)
         sig_drk_r = drk_pack_r['sig_bgc']
     else:
         sig_drk_r = []
@@ -105,14 +139,18 @@ def main(args, __version__):
     if meas_type == 'ray':
                 
         ray, ray_pack, time_info_ray = \
-            short_prepro.standard(sig_raw = sig_raw, 
-                                  shots = shots, 
-                                  system_info = system_info, 
-                                  channel_info = channel_info, 
-                                  time_info = time_info,
-                                  external_info = args,
-                                  meas_type = meas_type,
-                                  sig_drk = sig_drk)
+            _preprocess(meas_type = meas_type, 
+                        sig_raw = sig_raw, 
+                        shots = shots, 
+                        system_info = system_info, 
+                        channel_info = channel_info, 
+                        time_info = time_info,
+                        external_info = args,
+                        sig_drk = sig_drk,
+                        qck_file = qck_file,
+                        keep_cor = keep_cor)
+        
+        sig_cor = ray_pack.pop('sig_cor', None)
         
         molec, molec_info, meteo = \
             atmosphere.short_molec(heights = ray_pack['heights'],
@@ -138,14 +176,18 @@ def main(args, __version__):
     if meas_type == 'tlc':
         
         tlc, tlc_pack, time_info_tlc = \
-            short_prepro.standard(sig_raw = sig_raw, 
-                                  shots = shots, 
-                                  system_info = system_info, 
-                                  channel_info = channel_info, 
-                                  time_info = time_info,
-                                  external_info = args,
-                                  meas_type = meas_type,
-                                  sig_drk = sig_drk)
+            _preprocess(meas_type = meas_type, 
+                        sig_raw = sig_raw, 
+                        shots = shots, 
+                        system_info = system_info, 
+                        channel_info = channel_info, 
+                        time_info = time_info,
+                        external_info = args,
+                        sig_drk = sig_drk,
+                        qck_file = qck_file,
+                        keep_cor = keep_cor)
+        
+        sig_cor = tlc_pack.pop('sig_cor', None)
     
         output_files['tlc'] = \
             nc_dataset.telecover(sig = tlc, 
@@ -160,24 +202,28 @@ def main(args, __version__):
     if meas_type == 'pcb':
                 
         pcb, pcb_pack, time_info_pcb = \
-            short_prepro.standard(sig_raw = sig_raw, 
-                                  shots = shots, 
-                                  system_info = system_info, 
-                                  channel_info = channel_info, 
-                                  time_info = time_info,
-                                  external_info = args,
-                                  meas_type = meas_type,
-                                  sig_drk = sig_drk)
+            _preprocess(meas_type = meas_type, 
+                        sig_raw = sig_raw, 
+                        shots = shots, 
+                        system_info = system_info, 
+                        channel_info = channel_info, 
+                        time_info = time_info,
+                        external_info = args,
+                        sig_drk = sig_drk,
+                        qck_file = qck_file,
+                        keep_cor = keep_cor)
+        
+        sig_cor = pcb_pack.pop('sig_cor', None)
         
         ray, ray_pack, time_info_ray = \
-            short_prepro.standard(sig_raw = sig_raw_r, 
-                                  shots = shots_r, 
-                                  system_info = system_info_r, 
-                                  channel_info = channel_info_r, 
-                                  time_info = time_info_r,
-                                  external_info = args,
-                                  meas_type = 'ray',
-                                  sig_drk = sig_drk_r)
+            _preprocess(meas_type = 'ray', 
+                        sig_raw = sig_raw_r, 
+                        shots = shots_r, 
+                        system_info = system_info_r, 
+                        channel_info = channel_info_r, 
+                        time_info = time_info_r,
+                        external_info = args,
+                        sig_drk = sig_drk_r)
         
         molec, molec_info, meteo = \
             atmosphere.short_molec(heights = ray_pack['heights'],
@@ -211,13 +257,17 @@ def main(args, __version__):
     if meas_type == 'drk':
         args['vertical_trimming'] = False
         drk, drk_pack, time_info_drk = \
-            short_prepro.standard(sig_raw = sig_raw, 
-                                  shots = shots, 
-                                  system_info = system_info, 
-                                  channel_info = channel_info, 
-                                  time_info = time_info,
-                                  external_info = args,
-                                  meas_type = 'drk')
+            _preprocess(meas_type = 'drk', 
+                        sig_raw = sig_raw, 
+                        shots = shots, 
+                        system_info = system_info, 
+                        channel_info = channel_info, 
+                        time_info = time_info,
+                        external_info = args,
+                        qck_file = qck_file,
+                        keep_cor = keep_cor)
+        
+        sig_cor = drk_pack.pop('sig_cor', None)
         sig_drk = []
 
         output_files['drk'] = \
@@ -230,17 +280,42 @@ def main(args, __version__):
                             version = __version__,
                             dir_out = args['output_folder'])
 
-    if args['quicklook']:
+    if args['quicklook'] and chunked:
+        
+        # The signals were written in blocks during the preprocessing of 
+        # the measurement, only the metadata are missing
+        if meas_type == 'ray':
+            output_files['qck'] = \
+                nc_dataset.quicklook_append(fpath = qck_file, 
+                                            system_info = system_info, 
+                                            channel_info = channel_info, 
+                                            time_info = time_info, 
+                                            version = __version__,
+                                            meas_type = meas_type,
+                                            molec = molec,
+                                            meteo = meteo,
+                                            molec_info = molec_info)
+        else:
+            output_files['qck'] = \
+                nc_dataset.quicklook_append(fpath = qck_file, 
+                                            system_info = system_info, 
+                                            channel_info = channel_info, 
+                                            time_info = time_info, 
+                                            version = __version__,
+                                            meas_type = meas_type)
+    
+    elif args['quicklook']:
                 
         qck, qck_pack, time_info_qck = \
-            short_prepro.standard(sig_raw = sig_raw, 
-                                  shots = shots, 
-                                  system_info = system_info, 
-                                  channel_info = channel_info, 
-                                  time_info = time_info,
-                                  external_info = args,
-                                  meas_type = 'qck',
-                                  sig_drk = sig_drk)
+            _preprocess(meas_type = 'qck', 
+                        sig_raw = sig_raw, 
+                        shots = shots, 
+                        system_info = system_info, 
+                        channel_info = channel_info, 
+                        time_info = time_info,
+                        external_info = args,
+                        sig_drk = sig_drk,
+                        sig_cor = sig_cor)
             
         if meas_type == 'ray':
             output_files['qck'] = \
@@ -274,6 +349,41 @@ def main(args, __version__):
     return(output_files)
     
         
+def _preprocess(meas_type, sig_raw, shots, system_info, channel_info, 
+                time_info, external_info, sig_drk = [], qck_file = None, 
+                sig_cor = None, keep_cor = False):
+    
+    """ Runs the signal preprocessing of a measurement type with the staged 
+    short_prepro.standard chain. The unit converted and dead time corrected 
+    signals are kept in the returned pack (sig_cor) if keep_cor is True and 
+    are reused if sig_cor is provided, so the quicklook does not repeat 
+    these stages after the measurement output. In the chunked quicklook 
+    mode the signals are not read in memory (sig_raw is an empty list) and 
+    short_prepro.chunked processes them in blocks, writing the quicklook 
+    signals to qck_file on the way"""
+    
+    if isinstance(sig_raw, list):
+        return(short_prepro.chunked(fpath = external_info['input_file'], 
+                                    shots = shots, 
+                                    system_info = system_info, 
+                                    channel_info = channel_info, 
+                                    external_info = external_info, 
+                                    time_info = time_info, 
+                                    meas_type = meas_type, 
+                                    qck_file = qck_file,
+                                    sig_drk = sig_drk))
+    
+    return(short_prepro.standard(sig_raw = sig_raw, 
+                                 shots = shots, 
+                                 system_info = system_info, 
+                                 channel_info = channel_info, 
+                                 time_info = time_info,
+                                 external_info = external_info,
+                                 meas_type = meas_type,
+                                 sig_drk = sig_drk,
+                                 sig_cor = sig_cor,
+                                 keep_cor = keep_cor))
+        
 if __name__ == '__main__':
     sys.path.append('../')
     from version import __version__
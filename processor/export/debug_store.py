@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: N. Siomos
+
+Scratch storage of the intermediate preprocessing stages in debug mode
+
+Each snapshot is written as soon as the stage is complete to a compressed
+netCDF file in the debug subfolder of the preprocessor output folder. The
+file is chunked per block of timeframes and per channel so single channels
+or time ranges can be read back without loading the whole cube. Only the
+file path is kept in the pack_out of the preprocessing, the memory needed in
+debug mode is then the same as in a normal run
+"""
+
+import os
+import numpy as np
+import xarray as xr
+
+# Number of timeframes per chunk of the snapshot files
+time_chunk = 64
+
+def folder(external_info):
+
+    """ Returns the folder of the debug snapshots and creates it if needed"""
+
+    dir_out = folder_path(external_info['output_folder'])
+
+    os.makedirs(dir_out, exist_ok = True)
+
+    return(dir_out)
+
+def folder_path(output_folder):
+
+    """ Returns the folder of the debug snapshots of a preprocessor 
+    output_folder"""
+
+    return(os.path.join(output_folder, 'debug'))
+
+def label(sig, meas_type, fpath):
+
+    """ Returns the label of the debug snapshots of a measurement, made of the
+    measurement type, the name of the source QA file (fpath), and the first
+    timeframe of the raw signal. The same dark is stored in every QA file, so 
+    the source name keeps the snapshots of the dark of different QA files 
+    (and of different measurements of the same run) apart"""
+
+    source = os.path.splitext(os.path.basename(fpath))[0]
+
+    start = np.datetime_as_string(sig.time.values[0], unit = 's')\
+        .replace('-', '').replace(':', '')
+
+    return(f'{meas_type}_{source}_{start}')
+
+def snapshot(sig, stage, label, external_info):
+
+    """ Writes the signal of a preprocessing stage to the debug folder and
+    returns the path of the file"""
+
+    fpath = os.path.join(folder(external_info), f'{label}_{stage}.nc')
+
+    chunks = tuple([min(size, time_chunk) if dim == 'time' else
+                    1 if dim == 'channel' else size
+                    for dim, size in zip(sig.dims, sig.shape)])
+
+    encoding = {stage : dict(zlib = True, complevel = 1, shuffle = True,
+                             chunksizes = chunks)}
+
+    sig.to_dataset(name = stage)\
+        .to_netcdf(path = fpath, mode = 'w', engine = 'netcdf4',
+                   encoding = encoding)
+
+    return(fpath)
+
+def load(fpath, channels = None, time = None):
+
+    """ Reads a debug snapshot. Only the provided channels (list of channel
+    names) and time range (slice of timestamps) are loaded in memory"""
+
+    with xr.open_dataarray(fpath, engine = 'netcdf4') as sig:
+
+        if channels is not None:
+            sig = sig.sel(channel = channels)
+
+        if time is not None:
+            sig = sig.sel(time = time)
+
+        sig = sig.load()
+
+    return(sig)
@@ -395,6 +395,99 @@ def quicklook(sig, system_info, channel_info, time_info,
     nc_file = sig.to_dataset(name = 'Range_Corrected_Signals')\
         .fillna(netCDF4.default_fillvals['f8'])
         
+    nc_file = quicklook_metadata(nc_file = nc_file, 
+                                 system_info = system_info, 
+                                 channel_info = channel_info, 
+                                 time_info = time_info, 
+                                 version = version, 
+                                 molec = molec, 
+                                 meteo = meteo, 
+                                 molec_info = molec_info)
+                
+    nc_file['Height_levels'] = heights   
+
+    nc_file['Range_levels'] = ranges
+    
+    fpath = quicklook_path(system_info = system_info, 
+                           version = version, 
+                           meas_type = meas_type, 
+                           dir_out = dir_out)
+    
+    nc_file.to_netcdf(path = fpath, mode = 'w')
+    
+    print(f'-- Quicklook ({meas_type}) ATLAS file succesfully created!')
+    print('-----------------------------------------')
+    print('')
+
+    return([fpath])
+
+def quicklook_block(sig, time, offset, fpath, heights, ranges):
+
+    """ Writes a block of timeframes of the range corrected signals to the 
+    quicklook file fpath, starting at the timeframe offset. The first block 
+    (offset = 0) creates the file with the time coordinate of all the 
+    timeframes (time) and the heights and ranges. Used by the chunked 
+    quicklook preprocessing, the rest of the metadata are appended with 
+    quicklook_append once all the blocks are written"""
+    
+    if offset == 0:
+        coords = sig.isel(time = 0, drop = True)\
+            .expand_dims(time = time, axis = 0).coords
+        
+        nc_file = xr.Dataset(coords = coords)
+        
+        nc_file['Height_levels'] = heights   
+
+        nc_file['Range_levels'] = ranges
+        
+        nc_file.to_netcdf(path = fpath, mode = 'w')
+        
+        with netCDF4.Dataset(fpath, mode = 'a') as file:
+            file.createVariable('Range_Corrected_Signals', 'f8', 
+                                ('time', 'channel', 'bins'), 
+                                fill_value = np.nan)
+    
+    values = sig.transpose('time', 'channel', 'bins')\
+        .fillna(netCDF4.default_fillvals['f8']).values
+    
+    with netCDF4.Dataset(fpath, mode = 'a') as file:
+        file['Range_Corrected_Signals'][offset:offset + values.shape[0]] = values
+    
+    return()
+
+def quicklook_append(fpath, system_info, channel_info, time_info, 
+                     version, meas_type, 
+                     molec = [], meteo = [], molec_info = []):
+
+    """ Completes the quicklook file of quicklook_block with the metadata"""
+    
+    print('-----------------------------------------')
+    print('Start exporting to a Quicklook ATLAS file...')
+    print('-----------------------------------------')
+    
+    nc_file = quicklook_metadata(nc_file = xr.Dataset(), 
+                                 system_info = system_info, 
+                                 channel_info = channel_info, 
+                                 time_info = time_info, 
+                                 version = version, 
+                                 molec = molec, 
+                                 meteo = meteo, 
+                                 molec_info = molec_info)
+    
+    nc_file.to_netcdf(path = fpath, mode = 'a')
+    
+    print(f'-- Quicklook ({meas_type}) ATLAS file succesfully created!')
+    print('-----------------------------------------')
+    print('')
+
+    return([fpath])
+
+def quicklook_metadata(nc_file, system_info, channel_info, time_info, 
+                       version, molec = [], meteo = [], molec_info = []):
+    
+    """ Adds the metadata of a quicklook file (apart from the heights and 
+    ranges) to the nc_file dataset"""
+    
     for idx in system_info.index.values:
         nc_file.attrs[idx] = system_info[idx]
     
@@ -419,14 +512,16 @@ def quicklook(sig, system_info, channel_info, time_info,
     if not len(molec_info) == 0: 
         for key in molec_info.index.values:
             nc_file.attrs[key] = molec_info.loc[key]
-                
-    nc_file['Height_levels'] = heights   
-
-    nc_file['Range_levels'] = ranges
     
     nc_file.attrs['version'] = version
 
     nc_file.attrs['processing_software'] = 'ATLAS'
+    
+    return(nc_file)
+
+def quicklook_path(system_info, version, meas_type, dir_out):
+    
+    """ Returns the path of the quicklook file of a measurement"""
 
     station_id = system_info['Station_ID'].lower()
     start_date = system_info['RawData_Start_Date']
@@ -445,13 +540,8 @@ def quicklook(sig, system_info, channel_info, time_info,
     fname = "_".join([part for part in parts if len(part) > 0]) + ".nc"
     
     fpath = os.path.join(dir_out, fname)
-    nc_file.to_netcdf(path = fpath, mode = 'w')
     
-    print(f'-- Quicklook ({meas_type}) ATLAS file succesfully created!')
-    print('-----------------------------------------')
-    print('')
-
-    return([fpath])
+    return(fpath)
 
 def dark(sig, system_info, channel_info, time_info, 
          heights, ranges, version, dir_out):
@@ -55,4 +55,48 @@ def detect_overflows(sig, dead_time, daq_range):
             if (sig.loc[ch_d].values >= max_mV).any():
                 print(f"-- Warning: Channel {ch} - Analog signal mV values above the 95% of the data acqusition range were detected! ")   
 
-    return()
\ No newline at end of file
+    return()
+
+def detect_countrate_overflows(sig_max, dead_time, dead_time_cor_type):
+
+    """
+    General:
+        Reports the issues of the dead time correction from the maximum 
+        countrate per channel. It is used when the signals are corrected in 
+        blocks of timeframes (fused_correction), so that each warning is 
+        printed once for all the blocks
+        
+    Input:
+        sig_max: 
+            A 1D xarray with the maximum signal value per channel after the 
+            unit conversion. It should include the following dimension: 
+            (channel)
+            
+        dead_time: 
+            A pandas series with the dead time per channel in nanoseconds. 
+            The index should correspond to the channel dimension of sig_max
+
+        dead_time_cor_type:
+            A pandas series with the dead time correction type per channel
+            (0 for non paralyzable or 1 for non paralyzable)
+            The index should correspond to the channel dimension of sig_max
+            
+    """
+    
+    channels = sig_max.channel.values
+    
+    if (dead_time_cor_type.loc[channels].values == 1).any():
+        print('-- Warning: A Dead time correction for Paralyzable system not implemented yet!')
+        print('--> Applying Dead time correction for non- Paralyzable system intead...')
+    
+    for ch in channels:
+        
+        if ch[6] == 'p': #7th digit of channel name is the acquisition mode (a or p)
+            
+            with np.errstate(divide = 'ignore'):
+                max_countrate = 1000. / np.float64(dead_time[ch])
+            
+            if sig_max.loc[dict(channel = ch)].values > max_countrate:
+                print(f"-- Warning: Channel {ch} - A countrate value above the maximum allowed value was detected! Consider revising the input file ")
+
+    return()
@@ -2,10 +2,15 @@
 @authors: N. Siomos & P. Paschou
 """
 
+import numpy as np
+import xarray as xr
 from ..lidar_processing import signal, diagnose
+from ..readers import read_files
+from ..export import debug_store, nc_dataset
  
 def standard(sig_raw, shots, system_info, channel_info, 
-             external_info, time_info, meas_type, sig_drk = []):
+             external_info, time_info, meas_type, sig_drk = [], 
+             sig_cor = None, keep_cor = False):
     '''
     Perform the signal preprocessing for the rayleigh fit in the following order
     
@@ -46,10 +51,42 @@ def standard(sig_raw, shots, system_info, channel_info,
          
          -- bgr(background per averaged timeframe and channel)
         
-        and also the signal in all preprocessing stages if the debug argument 
-        is set to True
+        and also the paths to the debug snapshots of the signal in all 
+        preprocessing stages if the debug argument is set to True
+    
+    The stages share a single working buffer. The unit conversion allocates 
+    it from sig_raw (which is not modified) and each following stage either 
+    corrects it in place or replaces it when the shape changes (averaging, 
+    trigger correction). If the debug argument is set to True, snapshots of 
+    the buffer are written to compressed netCDF files in the debug folder 
+    (see debug_store) and only their paths are stored in pack_out. The 
+    ranges and heights in pack_out are shared with the rest of the 
+    processing and must not be modified
+
+    If the fused_preprocessing argument is set to True, the quicklook 
+    preprocessing (no temporal averaging) is delegated to fused, unless the 
+    debug argument is set to True
+
+    The unit conversion and the dead time correction are the only stages 
+    applied per timeframe before the averaging, so they are the same for 
+    all the outputs of a QA file. If keep_cor is set to True, their result 
+    is also stored in pack_out (sig_cor). It can then be passed as sig_cor 
+    to the preprocessing of another output of the same signals (e.g. the 
+    quicklook after the rayleigh), which skips these stages. sig_cor is 
+    not modified by the following stages
             
     '''   
+    
+    if meas_type == 'qck' and external_info['fused_preprocessing'] and \
+        not external_info['debug']:
+        return(fused(sig_raw = sig_raw, 
+                     shots = shots, 
+                     system_info = system_info, 
+                     channel_info = channel_info, 
+                     external_info = external_info, 
+                     time_info = time_info, 
+                     sig_drk = sig_drk,
+                     sig_cor = sig_cor))
         
     meas_label = {'ray' : 'Rayleigh', 
                   'tlc' : 'Telecover',
@@ -62,81 +99,95 @@ def standard(sig_raw, shots, system_info, channel_info,
     print(f'Start the {meas_label[meas_type]} signal preprocessing...')
     print('-----------------------------------------')
     
-    isdk = external_info['skip_dark_subtraction']
     isdt = external_info['skip_dead_time_correction']
-    itrv = external_info['vertical_trimming']
     itrc = external_info['cloud_trimming'] 
 
     # iflt = external_info['signal_smoothing']
     
-    alt_lim = external_info['vertical_limit']
-    bg_low = channel_info.Background_Low_Bin
-    bg_high = channel_info.Background_High_Bin
     daq_range = channel_info.DAQ_Range
     dead_time = channel_info.Dead_Time
     dead_time_cor_type = channel_info.Dead_Time_Correction_Type
-    ground_alt = system_info.Altitude_meter_asl
     resol = channel_info.Raw_Data_Range_Resolution
-    trd_bins = channel_info.DAQ_Trigger_Offset
-    zenith_angle = system_info.Laser_Pointing_Angle
 
     # timescale = external_info['timescale']
     # sm_hwin = external_info['smoothing_window']
     # sm_sbin = external_info['smoothing_sbin']    
     # sm_ebin = external_info['smoothing_ebin']
     
-    sig = sig_raw.copy()
-    
     pack_out = dict()
-
-    # --------------------------------------------------
-    # Unit conversion - raw counts to MHz for the photon channels
-    # --------------------------------------------------
-    sig = signal.unit_conv_counts_to_MHz(sig = sig.copy(), 
-                                         shots = shots.copy(), 
-                                         resol = resol)
-    # from matplotlib import pyplot as plt
-    # import numpy as np
-    # for j in range(sig.channel.size):
-    #     sig[:,j,3033:3043].plot.line(hue = 'time',add_legend=False)
-    #     plt.savefig(f'/home/nikos/Nextcloud4/pot/83_232_784_202300907/trg_{sig.channel.values[j]}.png')
-    #     plt.xticks(np.arange(3034,3044))
-    #     plt.show()
-    # raise Exception
-
-    if external_info['debug']: pack_out['sig_puc'] = sig.copy()
     
-    print('-- Unit conversion from raw counts to MHz for the pc channels complete!')
-
-    # --------------------------------------------------
-    # Detect saturation and potential clipping
-    # --------------------------------------------------
-    diagnose.detect_overflows(sig = sig.copy(), 
-                              dead_time = dead_time, 
-                              daq_range = daq_range)
-
-    # # --------------------------------------------------
-    # # Detect and screen sharp clouds 
-    # # --------------------------------------------------    
-    # if itrc:
-    #     sig = signal.trim_clouds(sig = sig.copy(),
-    #                              daq_trigger_offset = trd_bins)
-
-    # --------------------------------------------------
-    # Dead time correction on photon counting channels 
-    # --------------------------------------------------
-    if not isdt:
-        sig = signal.dead_time_correction(sig = sig.copy(), 
-                                          dead_time = dead_time, 
-                                          dead_time_cor_type = dead_time_cor_type)
+    dbg_label = None
+    
+    if external_info['debug']:
+        dbg_label = debug_store.label(sig = sig_raw, meas_type = meas_type,
+                                      fpath = external_info['input_file'])
 
-        if external_info['debug']: pack_out['sig_dtc'] = sig.copy()
+    if sig_cor is not None:
+        sig = sig_cor
+        
+        print('-- Unit conversion and dead time correction already applied, the stored signals are used!')
+    
+    else:
+        # --------------------------------------------------
+        # Unit conversion - raw counts to MHz for the photon channels
+        # --------------------------------------------------
+        sig = signal.unit_conv_counts_to_MHz_vec(sig = sig_raw, 
+                                                 shots = shots, 
+                                                 resol = resol)
+        # from matplotlib import pyplot as plt
+        # import numpy as np
+        # for j in range(sig.channel.size):
+        #     sig[:,j,3033:3043].plot.line(hue = 'time',add_legend=False)
+        #     plt.savefig(f'/home/nikos/Nextcloud4/pot/83_232_784_202300907/trg_{sig.channel.values[j]}.png')
+        #     plt.xticks(np.arange(3034,3044))
+        #     plt.show()
+        # raise Exception
+
+        if external_info['debug']:
+            pack_out['sig_puc'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_puc', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
+    
+        print('-- Unit conversion from raw counts to MHz for the pc channels complete!')
+
+        # --------------------------------------------------
+        # Detect saturation and potential clipping
+        # --------------------------------------------------
+        diagnose.detect_overflows(sig = sig, 
+                                  dead_time = dead_time, 
+                                  daq_range = daq_range)
+
+        # # --------------------------------------------------
+        # # Detect and screen sharp clouds 
+        # # --------------------------------------------------    
+        # if itrc:
+        #     sig = signal.trim_clouds(sig = sig.copy(),
+        #                              daq_trigger_offset = trd_bins)
+
+        # --------------------------------------------------
+        # Dead time correction on photon counting channels 
+        # --------------------------------------------------
+        if not isdt:
+            sig = signal.dead_time_correction_vec(sig = sig, 
+                                                  dead_time = dead_time, 
+                                                  dead_time_cor_type = dead_time_cor_type,
+                                                  inplace = True)
+
+            if external_info['debug']:
+                pack_out['sig_dtc'] = debug_store.snapshot(sig = sig, 
+                                                           stage = 'sig_dtc', 
+                                                           label = dbg_label, 
+                                                           external_info = external_info)
 
         
-        print('-- Dead time correction for pc channels complete!')
+            print('-- Dead time correction for pc channels complete!')
         
-    else:
-        print('-- Warning: Dead time correction for pc channels deactivated!')
+        else:
+            print('-- Warning: Dead time correction for pc channels deactivated!')
+        
+        if keep_cor:
+            pack_out['sig_cor'] = sig
 
     # --------------------------------------------------
     # Temporal averaging 
@@ -144,7 +195,7 @@ def standard(sig_raw, shots, system_info, channel_info,
     if meas_type == 'ray' or meas_type == 'drk':
 
         sig, time_info = \
-            signal.average_by_time(sig = sig.copy(),
+            signal.average_by_time(sig = sig,
                                    time_info = time_info,
                                    timescale = -1,
                                    start_time = 'Raw_Data_Start_Time',
@@ -154,141 +205,402 @@ def standard(sig_raw, shots, system_info, channel_info,
     
     elif meas_type == 'tlc':
         sig, time_info = \
-            signal.average_by_group(sig = sig.copy(),
+            signal.average_by_group(sig = sig,
                                     time_info = time_info,
                                     start_time = 'Raw_Data_Start_Time',
                                     stop_time = 'Raw_Data_Stop_Time',
                                     grouper = 'sector')
     
-        if external_info['debug']: pack_out['sig_avg'] = sig.copy()
+        if external_info['debug']:
+            pack_out['sig_avg'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_avg', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
     
         print('-- Temporal averaging complete! Averaging by group (sector) has been performed')            
 
     elif meas_type == 'pcb':
         sig, time_info = \
-            signal.average_by_group(sig = sig.copy(),
+            signal.average_by_group(sig = sig,
                                     time_info = time_info,
                                     start_time = 'Raw_Data_Start_Time',
                                     stop_time = 'Raw_Data_Stop_Time',
                                     grouper = 'calibrator_position')
     
-        if external_info['debug']: pack_out['sig_avg'] = sig.copy()
+        if external_info['debug']:
+            pack_out['sig_avg'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_avg', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
     
         print('-- Temporal averaging complete! Averaging by group (calibrator_position) has been performed')            
-   
 
-    # --------------------------------------------------
-    # Solar backsground signal calculation
-    # --------------------------------------------------
-    bgr = signal.background_calculation(sig = sig.copy(), 
-                                        lower_bin = bg_low,
-                                        upper_bin = bg_high)
+    sig, pack_out = _profile_corrections(sig = sig, 
+                                         pack_out = pack_out, 
+                                         system_info = system_info, 
+                                         channel_info = channel_info, 
+                                         external_info = external_info, 
+                                         sig_drk = sig_drk, 
+                                         dbg_label = dbg_label)
 
-    pack_out['bgr'] = bgr.copy()
+    print('-----------------------------------------')
+    print('')
+    
+    return(sig, pack_out, time_info)
 
-    print('-- Solar background succesfully calculated!')
+def fused(sig_raw, shots, system_info, channel_info, external_info, 
+          time_info, sig_drk = [], sig_cor = None):
+    '''
+    Perform the quicklook signal preprocessing with the fused engine. The 
+    per channel parameters are calculated first:
+        
+     -- trim_vertically: The bins kept below the maximum altitude
+     
+     -- range calculation: Calculates the range values per bin and channel
+     
+     -- height_calculation: Calculates the height values per bin and channel
+     
+    and then fused_correction applies the unit conversion, dead time 
+    correction, background calculation, trigger correction, vertical 
+    trimming, background correction, dark correction, and range correction 
+    in a single pass over blocks of timeframes. The results are identical to 
+    the ones of standard with meas_type = 'qck'. No intermediate stages are 
+    stored, use standard with the debug argument set to True for them
     
+    If sig_cor is provided (the unit converted and dead time corrected 
+    signals stored by standard, see keep_cor), the pass starts from it and 
+    skips these two stages and the overflow diagnostics
     
-    # --------------------------------------------------
-    # Remove the pre-triggering region (or correct triger delays)
-    # --------------------------------------------------
-    sig = signal.trigger_correction(sig = sig.copy(), 
-                               daq_trigger_offset = trd_bins)
+    Returns:
+        
+    - sig:
+        A 3D xarray with dimensions (time, channel, bins) containing the
+        signal profiles after preprocessing
+    
+    - pack_out:
+        A dictionary that contains the following:
+            
+         -- ranges (range per bin and channel)
+            
+         -- heights(range per bin and channel)
+         
+         -- bgr(background per timeframe and channel)
+         
+         -- sig_rnc(the signal profiles after preprocessing)
+            
+    '''   
     
-    if external_info['debug']: pack_out['sig_trc'] = sig.copy()
+    print('-----------------------------------------')
+    print('Start the Quicklook signal preprocessing (fused engine)...')
+    print('-----------------------------------------')
 
-    print('-- Triggering correction complete!')
+    isdk = external_info['skip_dark_subtraction']
+    isdt = external_info['skip_dead_time_correction']
+    itrv = external_info['vertical_trimming']
+    
+    alt_lim = external_info['vertical_limit']
+    ground_alt = system_info.Altitude_meter_asl
+    resol = channel_info.Raw_Data_Range_Resolution
+    zenith_angle = system_info.Laser_Pointing_Angle
+    
+    pack_out = dict()
 
     # --------------------------------------------------
-    # Trim signal up to an upper altitude limit
+    # Per channel parameters - output bins, ranges, and heights
     # --------------------------------------------------
+    bins = sig_raw.bins
+    
     if itrv:
-        sig = signal.trim_vertically(sig = sig.copy(), 
-                                     ground_alt = ground_alt,
-                                     zenith_angle = zenith_angle, 
-                                     alt_lim = 1E3 * alt_lim,
-                                     resol = resol)
+        bins = signal.trim_vertically(sig = bins, 
+                                      ground_alt = ground_alt,
+                                      zenith_angle = zenith_angle, 
+                                      alt_lim = 1E3 * alt_lim,
+                                      resol = resol)
+
+    ranges = signal.range_calculation(bins = bins.values, 
+                                      resol = resol)
     
-        if external_info['debug']: pack_out['sig_trm'] = sig.copy()
+    heights = signal.height_calculation(bins = bins.values, 
+                                        resol = resol,
+                                        zenith_angle = zenith_angle)
+
+    if isdk or isinstance(sig_drk,list):
+        sig_drk = []
         
+    # --------------------------------------------------
+    # Single pass correction
+    # --------------------------------------------------
+    sig, bgr, sig_max = \
+        signal.fused_correction(sig = sig_raw if sig_cor is None else sig_cor, 
+                                shots = shots, 
+                                resol = resol, 
+                                dead_time = channel_info.Dead_Time, 
+                                dead_time_cor_type = channel_info.Dead_Time_Correction_Type, 
+                                lower_bin = channel_info.Background_Low_Bin, 
+                                upper_bin = channel_info.Background_High_Bin, 
+                                daq_trigger_offset = channel_info.DAQ_Trigger_Offset, 
+                                ranges = ranges, 
+                                drk = sig_drk, 
+                                skip_dead_time_correction = isdt,
+                                converted = sig_cor is not None)
+    
+    if sig_cor is None:
+        diagnose.detect_overflows(sig = sig_max, 
+                                  dead_time = channel_info.Dead_Time, 
+                                  daq_range = channel_info.DAQ_Range)
+    
+    if isdt:
+        print('-- Warning: Dead time correction for pc channels deactivated!')
+    
+    if itrv:
         print(f'-- Range bins sucessfully trimmed above {alt_lim}km distance!')
+        
+    if not isinstance(sig_drk,list):
+        print('-- Dark signal structure succesfully removed!')
+        
+    print('-- Unit conversion, dead time, background, trigger, and range corrections complete!')
+    
+    pack_out['bgr'] = bgr
+    pack_out['ranges'] = ranges
+    pack_out['heights'] = heights
+    pack_out['sig_rnc'] = sig
 
-    # --------------------------------------------------
-    # Calculation of the signals ranges
-    # --------------------------------------------------
-    ranges = signal.range_calculation(bins = sig.copy().bins.values, 
-                                      resol = resol)
+    print('-----------------------------------------')
+    print('')
     
-    pack_out['ranges'] = ranges.copy()
+    return(sig, pack_out, time_info)
 
+def chunked(fpath, shots, system_info, channel_info, external_info, 
+            time_info, meas_type, qck_file, sig_drk = []):
+    '''
+    Perform the quicklook signal preprocessing out of core, in blocks of 
+    timeframes with bounded memory. The quantities that depend on all the 
+    timeframes are prepared first, without reading the signals:
         
-    print('-- Ranges calculated per signal bin and channel!')
+     -- trim_vertically: The bins kept below the maximum altitude
+     
+     -- range calculation: Calculates the range values per bin and channel
+     
+     -- height_calculation: Calculates the height values per bin and channel
+     
+     -- dark profile: sig_drk is preprocessed beforehand from the dark 
+        signals, which are read in memory (see dark)
+     
+    and then each block of timeframes (external_info['chunk_size'] MB of 
+    raw signals) is read from the QA file (fpath), unit converted and dead 
+    time corrected, and added to the sums of the temporal averaging of 
+    meas_type. The rest of the quicklook corrections are applied on the 
+    block with fused_correction and the result is written to the 
+    quicklook file (qck_file). The overflow diagnostics are applied once 
+    on the maxima of all the blocks. After the last block the averaged 
+    signals get the corrections that follow the averaging in standard. 
+    The quicklook file is completed with nc_dataset.quicklook_append. The 
+    signals and the quicklook file are identical to the ones of standard, 
+    no intermediate stages are stored
+    
+    Returns:
+        
+    - sig:
+        A 3D xarray with dimensions (time, channel, bins) containing the
+        averaged signal profiles of meas_type after preprocessing
+    
+    - pack_out:
+        A dictionary that contains the following:
+            
+         -- ranges (range per bin and channel)
+            
+         -- heights(range per bin and channel)
+         
+         -- bgr(background per averaged timeframe and channel)
+         
+         -- sig_rnc(the averaged signal profiles after preprocessing)
+    
+    - time_info_out:
+        The time_info of the averaged timeframes
+            
+    '''   
+    
+    print('-----------------------------------------')
+    print('Start the Quicklook signal preprocessing (chunked)...')
+    print('-----------------------------------------')
 
+    isdk = external_info['skip_dark_subtraction']
+    isdt = external_info['skip_dead_time_correction']
+    itrv = external_info['vertical_trimming']
+    
+    alt_lim = external_info['vertical_limit']
+    chunk_size = external_info['chunk_size']
+    ground_alt = system_info.Altitude_meter_asl
+    resol = channel_info.Raw_Data_Range_Resolution
+    zenith_angle = system_info.Laser_Pointing_Angle
+    
+    groupers = {'tlc' : 'sector', 
+                'pcb' : 'calibrator_position'}
+    
+    grouper = groupers.get(meas_type, None)
+    
+    # The timeframes are processed in increasing time, as in short_reader
+    order = np.argsort(time_info.index.values, kind = 'stable')
+    
+    time = time_info.index.values[order]
+    
     # --------------------------------------------------
-    # Calculation of the signals heights
+    # Per channel parameters - output bins, ranges, and heights
     # --------------------------------------------------
-    heights = signal.height_calculation(bins = sig.copy().bins.values, 
+    sig_raw = read_files.signal_block(fpath = fpath, 
+                                      time_info = time_info, 
+                                      channel_info = channel_info, 
+                                      time_ind = order[:1])
+    
+    bins = sig_raw.bins
+    
+    if itrv:
+        bins = signal.trim_vertically(sig = bins, 
+                                      ground_alt = ground_alt,
+                                      zenith_angle = zenith_angle, 
+                                      alt_lim = 1E3 * alt_lim,
+                                      resol = resol)
+
+    ranges = signal.range_calculation(bins = bins.values, 
+                                      resol = resol)
+    
+    heights = signal.height_calculation(bins = bins.values, 
                                         resol = resol,
                                         zenith_angle = zenith_angle)
 
-    pack_out['heights'] = heights.copy()
-
-        
-    print('-- Height calculated per signal bin and channel!')
+    if isdk or isinstance(sig_drk,list):
+        sig_drk = []
+    
+    # Timeframes per block, a multiple of the summation step of the 
+    # averaging so that the averages do not depend on the block size
+    step = signal.accumulation_step(sig_raw)
     
+    frame_size = sig_raw.channel.size * sig_raw.bins.size * 8. / 2**20
+    
+    block = step * max(1, int(chunk_size / (frame_size * step)))
     
     # --------------------------------------------------
-    # Solar backsground signal calculation
+    # Block by block correction, export, and averaging
     # --------------------------------------------------
-    sig = signal.background_correction(sig = sig.copy(), bgr = bgr.copy())
+    sig_sum = None
     
-    if external_info['debug']: pack_out['sig_bgc'] = sig.copy()
-    
-    print('-- Solar background subtraction complete!')
+    nan_count = None
     
+    sig_max = []
     
-    # --------------------------------------------------
-    # Dark correction
-    # --------------------------------------------------
-    if not isdk and not isinstance(sig_drk,list):
+    for t0 in range(0, time.size, block):
         
-        sig = signal.dark_correction(sig = sig.copy(), 
-                                     drk = sig_drk.copy())
-            
-        if external_info['debug']: pack_out['sig_drc'] = sig.copy()
+        t_s = slice(t0, min(t0 + block, time.size))
         
-        print('-- Dark signal structure succesfully removed!')
+        sig_raw = read_files.signal_block(fpath = fpath, 
+                                          time_info = time_info, 
+                                          channel_info = channel_info, 
+                                          time_ind = order[t_s])
         
-
+        # The stages of standard before the temporal averaging
+        sig = signal.unit_conv_counts_to_MHz_vec(sig = sig_raw, 
+                                                 shots = shots.isel(time = t_s), 
+                                                 resol = resol)
+        
+        sig_max.append(sig.max(dim = ['time', 'bins']))
+        
+        if not isdt:
+            sig = signal.dead_time_correction_vec(sig = sig, 
+                                                  dead_time = channel_info.Dead_Time, 
+                                                  dead_time_cor_type = channel_info.Dead_Time_Correction_Type,
+                                                  inplace = True,
+                                                  verbose = False)
+        
+        sig_sum, nan_count = \
+            signal.accumulate_by_segment(sig = sig, 
+                                         time_info = time_info, 
+                                         offset = t0, 
+                                         sig_sum = sig_sum, 
+                                         nan_count = nan_count, 
+                                         grouper = grouper)
+        
+        qck, _, _ = \
+            signal.fused_correction(sig = sig, 
+                                    shots = shots.isel(time = t_s), 
+                                    resol = resol, 
+                                    dead_time = channel_info.Dead_Time, 
+                                    dead_time_cor_type = channel_info.Dead_Time_Correction_Type, 
+                                    lower_bin = channel_info.Background_Low_Bin, 
+                                    upper_bin = channel_info.Background_High_Bin, 
+                                    daq_trigger_offset = channel_info.DAQ_Trigger_Offset, 
+                                    ranges = ranges, 
+                                    drk = sig_drk, 
+                                    skip_dead_time_correction = isdt,
+                                    verbose = False,
+                                    converted = True)
+        
+        nc_dataset.quicklook_block(sig = qck, 
+                                   time = time, 
+                                   offset = t0, 
+                                   fpath = qck_file,
+                                   heights = heights,
+                                   ranges = ranges)
+        
+        print(f'-- Timeframes {t_s.start + 1}-{t_s.stop} of {time.size} preprocessed and exported!')
+    
+    sig_max = xr.concat(sig_max, dim = 'block').max(dim = 'block')
+    
+    diagnose.detect_overflows(sig = sig_max, 
+                              dead_time = channel_info.Dead_Time, 
+                              daq_range = channel_info.DAQ_Range)
+    
+    if not isdt:
+        diagnose.detect_countrate_overflows(sig_max = sig_max, 
+                                            dead_time = channel_info.Dead_Time, 
+                                            dead_time_cor_type = channel_info.Dead_Time_Correction_Type)
+    else:
+        print('-- Warning: Dead time correction for pc channels deactivated!')
+    
+    print('-- Quicklook signals preprocessed and exported!')
+    
     # --------------------------------------------------
-    # Range correction
+    # Temporal averaging of the measurement
     # --------------------------------------------------
-    sig = signal.range_correction(sig = sig, ranges = ranges)
-    
-    pack_out['sig_rnc'] = sig.copy()
+    # Only the averaged timeframes are taken from the shots
+    if grouper is None:
+        shots_avg, time_info_out = \
+            signal.average_by_time(sig = shots,
+                                   time_info = time_info,
+                                   timescale = -1,
+                                   start_time = 'Raw_Data_Start_Time',
+                                   stop_time = 'Raw_Data_Stop_Time')
+        
+        print('-- Temporal averaging complete! All timeframes have been used')            
     
-    print('-- Range correction complete!')
+    else:
+        shots_avg, time_info_out = \
+            signal.average_by_group(sig = shots,
+                                    time_info = time_info,
+                                    start_time = 'Raw_Data_Start_Time',
+                                    stop_time = 'Raw_Data_Stop_Time',
+                                    grouper = grouper)
 
+        print(f'-- Temporal averaging complete! Averaging by group ({grouper}) has been performed')            
     
-    # # --------------------------------------------------
-    # # Smoothing
-    # # --------------------------------------------------
-    # if iflt:
-    #     sig = signal.smoothing(sig = sig, 
-    #                            smoothing_window = sm_hwin,
-    #                            smoothing_sbin = sm_sbin,
-    #                            smoothing_ebin = sm_ebin)
-            
-    #     pack_out['sig_flt'] = sig.copy()
-        
-    #     print('-- Signal smoothing complete!')
-        
+    sig_avg = signal.mean_by_segment(sig_sum = sig_sum, 
+                                     nan_count = nan_count, 
+                                     time_info = time_info, 
+                                     grouper = grouper)
+    
+    sig = sig.isel(time = 0, drop = True)\
+        .expand_dims(time = shots_avg.time.values, axis = 0).copy(data = sig_avg)
+    
+    sig, pack_out = _profile_corrections(sig = sig, 
+                                         pack_out = dict(), 
+                                         system_info = system_info, 
+                                         channel_info = channel_info, 
+                                         external_info = external_info, 
+                                         sig_drk = sig_drk)
 
     print('-----------------------------------------')
     print('')
     
-    return(sig, pack_out, time_info)
-
+    return(sig, pack_out, time_info_out)
 
 def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     '''
@@ -327,8 +639,8 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
          
          -- bgr(background per averaged timeframe and channel)
         
-        and also the signal in all preprocessing stages if the debug argument 
-        is set to True
+        and also the paths to the debug snapshots of the signal in all 
+        preprocessing stages if the debug argument is set to True
             
     '''   
         
@@ -353,15 +665,23 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     sig = sig_raw.copy()
     
     pack_out = dict()
+    
+    if external_info['debug']:
+        dbg_label = debug_store.label(sig = sig_raw, meas_type = 'drk',
+                                      fpath = external_info['input_file'])
 
     # --------------------------------------------------
     # Unit conversion - raw counts to MHz for the photon channels
     # --------------------------------------------------
-    sig = signal.unit_conv_counts_to_MHz(sig = sig.copy(), 
-                                         shots = shots.copy(), 
-                                         resol = resol)
+    sig = signal.unit_conv_counts_to_MHz_vec(sig = sig.copy(), 
+                                             shots = shots.copy(), 
+                                             resol = resol)
     
-    if external_info['debug']: pack_out['sig_puc'] = sig.copy()
+    if external_info['debug']:
+        pack_out['sig_puc'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_puc', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
     
     
     print('-- Unit conversion from raw counts to MHz for the pc channels complete!')
@@ -378,11 +698,15 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     # Dead time correction on photon counting channels 
     # --------------------------------------------------
     if not isdt:
-        sig = signal.dead_time_correction(sig = sig.copy(), 
-                                          dead_time = dead_time, 
-                                          dead_time_cor_type = dead_time_cor_type)
+        sig = signal.dead_time_correction_vec(sig = sig.copy(), 
+                                              dead_time = dead_time, 
+                                              dead_time_cor_type = dead_time_cor_type)
 
-        if external_info['debug']: pack_out['sig_dtc'] = sig.copy()
+        if external_info['debug']:
+            pack_out['sig_dtc'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_dtc', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
 
         
         print('-- Dead time correction for pc channels complete!')
@@ -401,7 +725,11 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
                                start_time = 'Bck_Data_Start_Time',
                                stop_time = 'Bck_Data_Stop_Time')
     
-    if external_info['debug']: pack_out['sig_avg'] = sig.copy()
+    if external_info['debug']:
+        pack_out['sig_avg'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_avg', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
     
     print(f'-- Temporal averaging complete! [..{sig.time.size} averaged timeframe(s)]')            
    
@@ -409,9 +737,9 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     # --------------------------------------------------
     # Solar backsground signal calculation
     # --------------------------------------------------
-    bgr = signal.background_calculation(sig = sig.copy(), 
-                                        lower_bin = bg_low,
-                                        upper_bin = bg_high)
+    bgr = signal.background_calculation_vec(sig = sig.copy(), 
+                                            lower_bin = bg_low,
+                                            upper_bin = bg_high)
 
     pack_out['bgr'] = bgr.copy()
 
@@ -420,10 +748,14 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     # --------------------------------------------------
     # Remove the pre-triggering region (or correct triger delays)
     # --------------------------------------------------
-    sig = signal.trigger_correction(sig = sig.copy(), 
-                               daq_trigger_offset = trd_bins)
+    sig = signal.trigger_correction_vec(sig = sig.copy(), 
+                                        daq_trigger_offset = trd_bins)
     
-    if external_info['debug']: pack_out['sig_trc'] = sig.copy()
+    if external_info['debug']:
+        pack_out['sig_trc'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_trc', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
 
     print('-- Triggering correction complete!')
     
@@ -435,7 +767,11 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
                               smoothing_sbin = 750,
                               smoothing_ebin = -1)
         
-    if external_info['debug']: pack_out['sig_flt'] = sig.copy()
+    if external_info['debug']:
+        pack_out['sig_flt'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_flt', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
     
     print('-- Signal smoothing complete!')
 
@@ -449,7 +785,11 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
                                      alt_lim = 1E3 * alt_lim,
                                      resol = resol)
     
-        if external_info['debug']: pack_out['sig_trm'] = sig.copy()
+        if external_info['debug']:
+            pack_out['sig_trm'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_trm', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
         
         print(f'-- Range bins sucessfully trimmed above {alt_lim}km distance!')
 
@@ -490,7 +830,11 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     # --------------------------------------------------
     sig = signal.range_correction(sig = sig, ranges = ranges)
     
-    if external_info['debug']: pack_out['sig_rnc'] = sig.copy()
+    if external_info['debug']:
+        pack_out['sig_rnc'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_rnc', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
     
     print('-- Range correction complete!')
     
@@ -498,3 +842,146 @@ def dark(sig_raw, shots, system_info, channel_info, external_info, time_info):
     print('')        
     
     return(sig, pack_out, time_info)
+
+def _profile_corrections(sig, pack_out, system_info, channel_info, 
+                         external_info, sig_drk = [], dbg_label = None):
+    
+    # The stages of standard that follow the temporal averaging (background 
+    # calculation, trigger correction, vertical trimming, ranges, heights, 
+    # background, dark, and range correction). They are shared with 
+    # chunked, which averages the signals block by block
+    isdk = external_info['skip_dark_subtraction']
+    itrv = external_info['vertical_trimming']
+    
+    alt_lim = external_info['vertical_limit']
+    bg_low = channel_info.Background_Low_Bin
+    bg_high = channel_info.Background_High_Bin
+    ground_alt = system_info.Altitude_meter_asl
+    resol = channel_info.Raw_Data_Range_Resolution
+    trd_bins = channel_info.DAQ_Trigger_Offset
+    zenith_angle = system_info.Laser_Pointing_Angle
+
+    # --------------------------------------------------
+    # Solar backsground signal calculation
+    # --------------------------------------------------
+    bgr = signal.background_calculation_vec(sig = sig, 
+                                            lower_bin = bg_low,
+                                            upper_bin = bg_high)
+
+    pack_out['bgr'] = bgr
+
+    print('-- Solar background succesfully calculated!')
+    
+    
+    # --------------------------------------------------
+    # Remove the pre-triggering region (or correct triger delays)
+    # --------------------------------------------------
+    sig = signal.trigger_correction_vec(sig = sig, 
+                                        daq_trigger_offset = trd_bins)
+    
+    if external_info['debug']:
+        pack_out['sig_trc'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_trc', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
+
+    print('-- Triggering correction complete!')
+
+    # --------------------------------------------------
+    # Trim signal up to an upper altitude limit
+    # --------------------------------------------------
+    if itrv:
+        sig = signal.trim_vertically(sig = sig, 
+                                     ground_alt = ground_alt,
+                                     zenith_angle = zenith_angle, 
+                                     alt_lim = 1E3 * alt_lim,
+                                     resol = resol)
+    
+        if external_info['debug']:
+            pack_out['sig_trm'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_trm', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
+        
+        print(f'-- Range bins sucessfully trimmed above {alt_lim}km distance!')
+
+    # --------------------------------------------------
+    # Calculation of the signals ranges
+    # --------------------------------------------------
+    ranges = signal.range_calculation(bins = sig.bins.values, 
+                                      resol = resol)
+    
+    pack_out['ranges'] = ranges
+
+        
+    print('-- Ranges calculated per signal bin and channel!')
+
+    # --------------------------------------------------
+    # Calculation of the signals heights
+    # --------------------------------------------------
+    heights = signal.height_calculation(bins = sig.bins.values, 
+                                        resol = resol,
+                                        zenith_angle = zenith_angle)
+
+    pack_out['heights'] = heights
+
+        
+    print('-- Height calculated per signal bin and channel!')
+    
+    
+    # --------------------------------------------------
+    # Solar backsground signal calculation
+    # --------------------------------------------------
+    sig = signal.background_correction(sig = sig, bgr = bgr, inplace = True)
+    
+    if external_info['debug']:
+        pack_out['sig_bgc'] = debug_store.snapshot(sig = sig, 
+                                                   stage = 'sig_bgc', 
+                                                   label = dbg_label, 
+                                                   external_info = external_info)
+    
+    print('-- Solar background subtraction complete!')
+    
+    
+    # --------------------------------------------------
+    # Dark correction
+    # --------------------------------------------------
+    if not isdk and not isinstance(sig_drk,list):
+        
+        sig = signal.dark_correction_vec(sig = sig, 
+                                         drk = sig_drk,
+                                         inplace = True)
+            
+        if external_info['debug']:
+            pack_out['sig_drc'] = debug_store.snapshot(sig = sig, 
+                                                       stage = 'sig_drc', 
+                                                       label = dbg_label, 
+                                                       external_info = external_info)
+        
+        print('-- Dark signal structure succesfully removed!')
+        
+
+    # --------------------------------------------------
+    # Range correction
+    # --------------------------------------------------
+    sig = signal.range_correction(sig = sig, ranges = ranges, inplace = True)
+    
+    pack_out['sig_rnc'] = sig
+    
+    print('-- Range correction complete!')
+
+    
+    # # --------------------------------------------------
+    # # Smoothing
+    # # --------------------------------------------------
+    # if iflt:
+    #     sig = signal.smoothing(sig = sig, 
+    #                            smoothing_window = sm_hwin,
+    #                            smoothing_sbin = sm_sbin,
+    #                            smoothing_ebin = sm_ebin)
+            
+    #     pack_out['sig_flt'] = sig.copy()
+        
+    #     print('-- Signal smoothing complete!')
+
+    return(sig, pack_out)
@@ -9,12 +9,16 @@ Processing routines for signals
 Signal in 3D xarray dataset with dimensions [time, channel, bin/range]
 
 Fucntions
+ -- accumulate_by_segment: Adds a block of timeframes to the sums of the temporal averaging
+ -- average_by_group: Average signals across the timeframes of each group
  -- average_by_time: Average signals across the timeframes
  -- background_calculation: Calculates the solar background per timeframe and channel 
  -- background_correction: Performs the background correction on signals
  -- dark_correction: Removes the dark signals from the normal ananlog signals
  -- dead time correction: Performs the dead time correction onphoton channels
+ -- fused_correction: Performs all the corrections up to the range correction in a single pass
  -- height_calculation: Calculates the height above the lidar values per bin and channel
+ -- mean_by_segment: Averages from the sums of accumulate_by_segment
  -- range calculation: Calculates the range above the lidar values per bin and channel
  -- range_correction: Performs the range correction on signals
  -- smoothing: Smooths the signals (sliding average)
@@ -22,6 +26,11 @@ Fucntions
  -- trim_vertically: Trim channels up to a maximum altitude
  -- unit_conv_counts_to_MHz: Converts raw counts to MHz for the photon channels
 
+The background_calculation, dark_correction, dead_time_correction, 
+trigger_correction, and unit_conv_counts_to_MHz functions loop over the 
+channels and are kept as a reference. Their *_vec counterparts compute the 
+channel masks once and broadcast the corrections on the signal arrays
+
 """
 
 import numpy as np
@@ -30,11 +39,91 @@ import xarray as xr
 
 import pandas as pd
 
+from . import diagnose
+
+def accumulate_by_segment(sig, time_info, offset, sig_sum = None, 
+                          nan_count = None, grouper = None):
+
+    """
+    General:
+        Adds a block of consecutive timeframes of the lidar signals to the 
+        running sums of the temporal averaging. It is used for the signals 
+        that are processed in blocks of timeframes, mean_by_segment then 
+        returns the averages. They are identical to the ones of 
+        average_by_time (all timeframes) or average_by_group (grouper) if 
+        each block starts at a multiple of accumulation_step
+        
+    Input:
+        sig: 
+            A 3D xarray with a block of the lidar signals, it should include 
+            the following dimensions: (time, channel, bins)
+        
+        time_info : 
+                A pandas Dataframe with all the necessary metadata for each 
+                temporal frame fetched from the QA file (all timeframes)
+                
+        offset: 
+            The index of the first timeframe of the block
+            
+        sig_sum:
+            A numpy array with dimensions (segment, channel, bins) with the 
+            running sums. It is updated in place. Defaults to None (first 
+            block, a new array is allocated)
+            
+        nan_count:
+            A numpy array with the running count of the nan values per 
+            segment, channel, and bin. Defaults to None (no nan values found)
+
+        grouper: 
+            A string with the column name of time_info that contains the 
+            flag used for grouping the data (e.g. telecover sector). 
+            Defaults to None (all the timeframes are averaged)
+              
+    Returns:
+        sig_sum: 
+            The updated running sums
+            
+        nan_count: 
+            The updated count of the nan values (None if no nan values have 
+            been found yet)
+            
+    """
+    
+    sep = _segment_sep(time_info, grouper = grouper)
+    
+    values = sig.transpose('time','channel','bins').values
+    
+    if sig_sum is None:
+        sig_sum = np.zeros((sep.size - 1,) + values.shape[1:])
+    
+    nan_count = _segment_sum(values, sep, offset, sig_sum, nan_count)
+    
+    return(sig_sum, nan_count)
+
+def accumulation_step(sig):
+
+    """
+    General:
+        Returns the number of timeframes summed per step by the temporal 
+        averaging functions for the signals of sig. The blocks added with 
+        accumulate_by_segment must start at a multiple of it
+        
+    Input:
+        sig: 
+            A 3D xarray with the lidar signals (or a block of them), it 
+            should include the following dimensions: (time, channel, bins)
+              
+    """
+    
+    return(_segment_step(sig.channel.size * sig.bins.size))
+
 def average_by_group(sig, time_info, grouper, start_time, stop_time):
 
     """
     General:
-        Averages the lidar signals across the time deminsion 
+        Averages the lidar signals across the time deminsion. The nan values 
+        are excluded and all the groups are averaged in a single 
+        np.add.reduceat pass
         
     Input:
         sig: 
@@ -79,7 +168,7 @@ def average_by_group(sig, time_info, grouper, start_time, stop_time):
 
     start_dt = np.datetime64(sig.time.values[0], 's')
 
-    sep = np.hstack([0, np.where(grp[:-1] != grp[1:])[0] + 1, grp.size])
+    sep = _segment_sep(time_info, grouper = grouper)
 
     group_stime = np.array([stime[sep[i]] for i in range(0,sep.size-1)])
     group_etime = np.array([etime[sep[i]-1] for i in range(1,sep.size)])
@@ -91,12 +180,12 @@ def average_by_group(sig, time_info, grouper, start_time, stop_time):
     
     group_grouper = np.array([grp[sep[i]] for i in range(0,sep.size-1)])
     
-    sig_out = np.nan * sig[dict(time = range(len(group_mtime)))].copy()\
-        .drop("time").assign_coords({'time' : group_mtime})
+    axis = sig.get_axis_num('time')
+    
+    sig_avg = _segment_mean(sig.values, sep, axis = axis)
     
-    for i in range(sep.size-1):
-        t_d = dict(time = slice(sep[i], sep[i+1]))
-        sig_out[dict(time = i)] =  sig[t_d].copy().mean(dim = 'time').values
+    sig_out = sig.isel(time = 0, drop = True)\
+        .expand_dims(time = group_mtime, axis = axis).copy(data = sig_avg)
     
     cols = [start_time, stop_time, grouper, 'Timeframes']
 
@@ -112,7 +201,9 @@ def average_by_time(sig, time_info, timescale, start_time, stop_time):
 
     """
     General:
-        Averages the lidar signals across the time deminsion 
+        Averages the lidar signals across the time deminsion. The nan values 
+        are excluded and all the time slices are averaged in a single 
+        np.add.reduceat pass
         
     Input:
         sig: 
@@ -170,11 +261,13 @@ def average_by_time(sig, time_info, timescale, start_time, stop_time):
                 
         m_time = np.datetime64(time_arr[0] + dt / 2.,'us').item()
         
-        sig_avg = sig.mean(dim = 'time').values
+        axis = sig.get_axis_num('time')
         
-        sig_out = sig.reindex(time = [m_time], fill_value = np.nan)
-
-        sig_out.loc[dict(time = m_time)] = sig_avg
+        sig_avg = _segment_mean(sig.values, np.array([0, time_arr.size]), 
+                                axis = axis)
+        
+        sig_out = sig.isel(time = 0, drop = True)\
+            .expand_dims(time = [m_time], axis = axis).copy(data = sig_avg)
         
         # Creat the time_info object according to the new timescale
         cols = [start_time, stop_time, 'Timeframes']
@@ -200,41 +293,48 @@ def average_by_time(sig, time_info, timescale, start_time, stop_time):
         # Define how many averaged timeframes will be created
         avg_num = int(np.ceil(meas_dur/timescale))
         
+        # Calculate the starting time in the time slice for averaging
+        s_time = time_arr[0] + np.arange(avg_num) * np.timedelta64(timescale_m,'s')
+
+        # Calculate the ending time in the time slice for averaging
+        e_time = s_time + np.timedelta64(timescale_m,'s')
+
         # Calculate the new time index based on the timescale of averaging.
         # -> It is also the middle time in the time slice for averaging
-        m_time = [(time_arr[0] + ii * np.timedelta64(halfscale_m,'s')) 
-                  for ii in range(avg_num)]
+        m_time = s_time + np.timedelta64(halfscale_m,'s')
 
-        # Calculate the starting time in the time slice for averaging
-        s_time = [(time_arr[0] + ii * np.timedelta64(timescale_m,'s')) 
-                  for ii in range(avg_num)]
+        # Index of the first timeframe of each slice, the slices partition 
+        # the time dimension
+        sep = np.hstack([np.searchsorted(time_arr, s_time, side = 'left'), 
+                         time_arr.size])
 
-        # Calculate the ending time in the time slice for averaging
-        e_time = [(time_arr[0] + (ii + 1) * np.timedelta64(timescale_m,'s')) 
-                  for ii in range(avg_num)]        
+        # The slices include their ending time, so a timeframe that falls 
+        # exactly on the edge of two slices is averaged in both of them
+        edge = np.where(sep[1:] < time_arr.size)[0]
+        
+        edge = edge[time_arr[sep[edge + 1]] == e_time[edge]]
 
-        # Create a new xarray with reduced size of time dimension based on number of averaged timeframes
-        sig_out = sig.reindex(time = m_time, fill_value = np.nan)
+        axis = sig.get_axis_num('time')
         
-        count_occur = np.zeros(avg_num)
+        sig_avg = _segment_mean(sig.values, sep, axis = axis, 
+                                edge = edge, edge_ind = sep[edge + 1])
+
+        # Counting the occurences in each slice of timeframe
+        count_occur = np.diff(sep)
         
-        for i in range(avg_num):
-            # Select a slice of timeframes to be averaged in one timeframe
-            tslice = dict(time = slice(s_time[i], e_time[i]))
-            
-            t_idx = dict(time = i)
-            
-            # Counting the occurences in each slice of timeframe
-            count_occur[i] = sig.loc[tslice].time.size
-            
-            # Insert in the new xarray the averaged sig from the sliced timeframes
-            sig_out[t_idx] = sig.loc[tslice].mean(dim='time').values
+        count_occur[edge] += 1
+
+        # Create a new xarray with reduced size of time dimension based on number of averaged timeframes
+        sig_out = sig.isel(time = 0, drop = True)\
+            .expand_dims(time = m_time, axis = axis).copy(data = sig_avg)
             
         # Creat the time_info object according to the new timescale
         cols = [start_time, stop_time, 'Timeframes']
 
-        group_stime = np.array([stime[np.sum(count_occur[:i])] for i in range(0,count_occur.size-1)])
-        group_etime = np.array([etime[np.sum(count_occur[:i])-1] for i in range(1,count_occur.size)])
+        last = np.minimum(sep[:-1] + count_occur - 1, time_arr.size - 1)
+
+        group_stime = stime[np.minimum(sep[:-1], time_arr.size - 1)]
+        group_etime = etime[last]
         
         data = np.array([group_stime, group_etime, count_occur],
                         dtype = object).T
@@ -249,7 +349,7 @@ def average_by_time(sig, time_info, timescale, start_time, stop_time):
         sig_out = sig_out.drop_sel(time = sig_out.time.values[mask_time])
         
         #Drop the timeframes with occurences below the 75% of the max count occurence
-        time_info_out = time_info_out[mask_time,:]
+        time_info_out = time_info_out.loc[~mask_time,:]
 
     return(sig_out, time_info_out)
 
@@ -299,7 +399,61 @@ def background_calculation(sig, lower_bin, upper_bin):
         
     return(bgr)
 
-def background_correction(sig, bgr):
+def background_calculation_vec(sig, lower_bin, upper_bin):
+
+    """
+    General:
+        Vectorized version of background_calculation. The background bin 
+        window of each channel is applied as a mask and the mean is 
+        calculated in a single reduction across the bins
+        
+    Input:
+        sig: 
+            A 3D xarray with the lidar signals, it should include the following
+            dimensions: (time, channel, bins). The photon signals must not be
+            dead time corrected yet
+            
+        lower_bin: 
+            A pandas series with the lower bin applied for the background
+            correction. It can be in the pretrigger or at the end of the
+            signal profile. Bin numbering starts at 1            
+
+        upper_bin: 
+            A pandas series with the upper bin applied for the background
+            correction. It can be in the pretrigger or at the end of the
+            signal profile. Bin numbering starts at 1              
+    Returns:
+        
+        bgr: 
+            An xarray with the following dimensions (time, channel) similar to
+            sig. It contains the solar background signal
+            
+    """
+    
+    channels = sig.channel.values
+    
+    bins = _dim_vector(sig, 'bins', sig.bins.values)
+    
+    llim = _dim_vector(sig, 'channel', lower_bin.loc[channels].values.astype(float))
+    
+    ulim = _dim_vector(sig, 'channel', upper_bin.loc[channels].values.astype(float))
+    
+    values = sig.values
+    
+    mask = (bins >= llim) & (bins <= ulim) & ~np.isnan(values)
+    
+    axis = sig.get_axis_num('bins')
+    
+    total = np.sum(values, axis = axis, where = mask)
+    
+    count = mask.sum(axis = axis)
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        bgr = sig.isel(bins = 0, drop = True).copy(data = total / count)
+    
+    return(bgr)
+
+def background_correction(sig, bgr, inplace = False):
     
     """
     General:
@@ -312,6 +466,10 @@ def background_correction(sig, bgr):
         bgr: 
             An xarray with the background signals. It must be the same 
             dimensions as sig, excluding only time
+
+        inplace:
+            If set to True the correction is applied directly on the data of 
+            sig, which is returned, instead of on a copy. Defaults to False
               
     Returns:
         
@@ -321,7 +479,11 @@ def background_correction(sig, bgr):
             
     """
     
-    sig_out = (sig.copy() - bgr.copy()).transpose('time','channel','bins')
+    if inplace:
+        sig_out = sig.transpose('time','channel','bins')
+        sig_out -= bgr
+    else:
+        sig_out = (sig.copy() - bgr.copy()).transpose('time','channel','bins')
     
     return(sig_out)
 
@@ -367,6 +529,55 @@ def dark_correction(sig, drk):
             
     return(sig_out)
 
+def dark_correction_vec(sig, drk, inplace = False): 
+   
+    """
+    General:
+        Vectorized version of dark_correction. The dark mean of the analog 
+        channels is subtracted from all the channels at once (zero offset 
+        for the photon channels)
+        
+    Input:
+        sig: 
+            An xarray with the lidar signals, it should include the 
+            following dimensions: (..., time, channel, ...). 
+            
+        drk: 
+            An xarray with the dark signals, it should include the 
+            following dimensions: (..., time, channel, ...). It should have 
+            the same coordinates as sig with the exception of the time
+            dimension
+
+        inplace:
+            If set to True the correction is applied directly on the data of 
+            sig, which is returned, instead of on a copy. Defaults to False
+
+    Returns:
+        
+        sig_out: 
+            An xarray in the same coordinates as sig with the dark corrected
+            signals
+            
+    """
+    
+    channels = sig.channel.values
+    
+    analog = xr.DataArray(_acquisition_mode(channels) == 'a', 
+                          dims = ['channel'], 
+                          coords = [channels])
+    
+    drk_mean = drk.mean(dim='time', skipna = True).loc[dict(channel = channels)]
+
+    offset = drk_mean.where(analog, 0.)
+
+    if inplace:
+        sig_out = sig
+        sig_out -= offset.sel({dim : sig[dim] for dim in offset.dims})
+    else:
+        sig_out = (sig - offset).transpose(*sig.dims)
+            
+    return(sig_out)
+
 def dead_time_correction(sig, dead_time, dead_time_cor_type):
    
     """
@@ -423,6 +634,321 @@ def dead_time_correction(sig, dead_time, dead_time_cor_type):
             
     return(sig_out)
 
+def dead_time_correction_vec(sig, dead_time, dead_time_cor_type, inplace = False,
+                             verbose = True):
+   
+    """
+    General:
+        Vectorized version of dead_time_correction. The photon and analog 
+        channel masks are computed once and the correction is broadcasted
+        across the channel dimension
+        
+    Input:
+        sig: 
+            A 2D or 3D xarray with the lidar signals, it should include the 
+            following dimensions: (time, channel, ...). 
+            
+        dead_time: 
+            A pandas series with the dead time per channel in nanoseconds. 
+            The index should correspond to the channel dimension of sig            
+
+        dead_time_cor_type: 
+            A pandas series with the dead time correction type per channel 
+            (0 for non paralyzable or 1 for non paralyzable)
+            The index should correspond to the channel dimension of sig
+
+        inplace:
+            If set to True the correction is applied directly on the data of 
+            sig (float), which is returned, instead of on a copy. Defaults to False
+
+        verbose:
+            If set to False the warnings are not printed, e.g. when the 
+            signals are a block of a longer measurement (see 
+            diagnose.detect_countrate_overflows). Defaults to True
+
+    Returns:
+        
+        sig_out: 
+            An xarray in the same shape as sig with the dead time corrected
+            signals
+            
+    """
+    
+    # Check if the Paralyzable Deadtime Correction Type is 1 (Paralyzable)--> if not provide warning and switch to Non Paralyzable (0)
+    if verbose and (dead_time_cor_type.values == 1).any():
+        print('-- Warning: A Dead time correction for Paralyzable system not implemented yet!')
+        print('--> Applying Dead time correction for non- Paralyzable system intead...')
+               
+    channels = sig.channel.values
+    
+    mode = _acquisition_mode(channels)
+    
+    dt = dead_time.loc[channels].values.astype(float)
+    
+    photon = (mode == 'p') & np.isin(dead_time_cor_type.loc[channels].values, [0,1]) 
+
+    sig_out = sig if inplace else sig.astype(float)
+
+    # Channel first views of the signals, the masks select whole channels
+    ch_out = np.moveaxis(sig_out.values, sig.get_axis_num('channel'), 0)
+    
+    if verbose:
+        with np.errstate(divide = 'ignore'):
+            max_rate = np.reshape(1000. / dt[mode == 'p'], (-1,) + (1,) * (sig.ndim - 1))
+        
+        overflow = (ch_out[mode == 'p'] > max_rate)\
+            .any(axis = tuple(range(1, sig.ndim)))
+        
+        for ch in channels[mode == 'p'][overflow]:
+            print(f"-- Warning: Channel {ch} - A countrate value above the maximum allowed value was detected! Consider revising the input file ")
+    
+    dt_p = np.reshape(dt[photon], (-1,) + (1,) * (sig.ndim - 1))
+    
+    # sig / (1. - sig * dt * 1e-3) with a single temporary buffer
+    sig_p = ch_out[photon]
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        denom = sig_p * dt_p
+        denom *= 1e-3
+        np.subtract(1., denom, out = denom)
+        sig_p /= denom
+    
+    ch_out[photon] = sig_p
+    
+    ch_out[~photon & (mode != 'a')] = np.nan
+            
+    return(sig_out)
+
+def fused_correction(sig, shots, resol, dead_time, dead_time_cor_type,
+                     lower_bin, upper_bin, daq_trigger_offset, ranges,
+                     drk = [], skip_dead_time_correction = False,
+                     chunk_size = 8., verbose = True, converted = False):
+
+    """
+    General:
+        Applies the unit conversion, dead time correction, background
+        calculation, trigger correction, vertical trimming, background
+        correction, dark correction, and range correction in a single pass
+        over the signals. The per channel parameters are prepared once and
+        the corrections are applied block by block along the time dimension
+        so that each block stays in the cache between the stages. The
+        results are identical to the ones of the corresponding *_vec
+        kernels applied one after the other. No temporal averaging is
+        performed
+
+    Input:
+        sig:
+            A 3D xarray with the raw lidar signals, it should include the
+            following dimensions: (time, channel, bins). The units of the
+            photon channels must be raw counts
+
+        shots:
+            A 2D xarray with the laser shots per channel and timeframe.
+            It should include the following dimensions: (time, channel)
+
+        resol:
+            A pandas series with the range resolution in m per channel.
+            The index should correspond to the channel dimension of sig
+
+        dead_time:
+            A pandas series with the dead time per channel in nanoseconds.
+            The index should correspond to the channel dimension of sig
+
+        dead_time_cor_type:
+            A pandas series with the dead time correction type per channel
+            (0 for non paralyzable or 1 for non paralyzable)
+            The index should correspond to the channel dimension of sig
+
+        lower_bin:
+            A pandas series with the lower bin applied for the background
+            correction. Bin numbering starts at 1
+
+        upper_bin:
+            A pandas series with the upper bin applied for the background
+            correction. Bin numbering starts at 1
+
+        daq_trigger_offset:
+            A pandas series with the trigger delay bins per channel.
+            Negative values correspond to pretriggering --> shift to the left
+
+        ranges:
+            An xarray with the ranges per channel and bin. Its bins define
+            the bins of the output (vertical trimming). They must be the
+            leading bins of sig
+
+        drk:
+            An xarray with the dark signals, it should include the
+            following dimensions: (time, channel, bins). If it is a list
+            the dark correction is skipped. Defaults to []
+
+        skip_dead_time_correction:
+            If set to True the dead time correction is skipped. Defaults to
+            False
+
+        chunk_size:
+            The size of the time blocks of the raw signals in MB.
+            Defaults to 8
+
+        verbose:
+            If set to False the dead time correction warnings are not 
+            printed, e.g. when the signals are a block of a longer 
+            measurement (see diagnose.detect_countrate_overflows). Defaults 
+            to True
+
+        converted:
+            If set to True the photon signals of sig are already converted 
+            to MHz and dead time corrected (e.g. the signals stored by 
+            short_prepro.standard with keep_cor), so these two stages are 
+            skipped. Defaults to False
+
+    Returns:
+
+        sig_out:
+            An xarray with dimensions (time, channel, bins) with the range
+            corrected signals, trimmed to the bins of ranges
+
+        bgr:
+            An xarray with dimensions (time, channel) with the solar
+            background signal
+
+        sig_max:
+            An xarray with dimension (channel) with the maximum value of the
+            signals after the unit conversion, for the overflow diagnostics
+            (-inf if converted is set to True)
+
+    """
+
+    sig = sig.transpose('time','channel','bins')
+
+    channels = sig.channel.values
+
+    bins = sig.bins.values
+
+    n_time, n_ch, n_bins = sig.shape
+
+    n_out = ranges.bins.size
+
+    mode = _acquisition_mode(channels)
+
+    photon = mode == 'p'
+
+    dt = dead_time.loc[channels].values.astype(float)
+
+    photon_dt = photon & np.isin(dead_time_cor_type.loc[channels].values, [0,1])
+
+    # Per channel parameters, shaped to broadcast on a (time, channel, bins) block
+    sampl_rate = (150. / resol.loc[channels].values.astype(float))[photon, np.newaxis]
+
+    shots_p = shots.loc[dict(channel = channels)]\
+        .transpose('time','channel').values[:, photon, np.newaxis]
+
+    dt_p = dt[photon_dt, np.newaxis]
+
+    llim = lower_bin.loc[channels].values.astype(float)[:, np.newaxis]
+
+    ulim = upper_bin.loc[channels].values.astype(float)[:, np.newaxis]
+
+    shift_bins = daq_trigger_offset.loc[channels].values.astype(int)
+
+    rng_sq = np.power(ranges, 2).loc[dict(channel = channels)]\
+        .transpose('channel','bins').values
+
+    if not isinstance(drk, list):
+        analog = xr.DataArray(mode == 'a', dims = ['channel'], coords = [channels])
+
+        drk_mean = drk.mean(dim='time', skipna = True).loc[dict(channel = channels)]
+
+        offset = drk_mean.where(analog, 0.).sel(bins = ranges.bins.values)\
+            .transpose('channel','bins').values
+    else:
+        offset = None
+
+    raw = sig.values
+
+    values_out = np.empty((n_time, n_ch, n_out))
+
+    bgr = np.empty((n_time, n_ch))
+
+    sig_max = np.full(n_ch, -np.inf)
+
+    step = max(1, int(chunk_size * 2**20 / (8. * n_ch * max(n_bins, 1))))
+
+    for t0 in range(0, n_time, step):
+
+        t_s = slice(t0, min(t0 + step, n_time))
+
+        values = raw[t_s].astype(float)
+
+        # Unit conversion
+        if not converted:
+            sig_p = values[:, photon]
+
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                sig_p *= sampl_rate
+                sig_p /= shots_p[t_s]
+
+            values[:, photon] = sig_p
+
+            values[:, ~photon & (mode != 'a')] = np.nan
+
+            sig_max = np.fmax(sig_max, np.fmax.reduce(values, axis = (0,2)))
+
+        # Dead time correction
+        if not skip_dead_time_correction and not converted:
+            sig_p = values[:, photon_dt]
+
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                denom = sig_p * dt_p
+                denom *= 1e-3
+                np.subtract(1., denom, out = denom)
+                sig_p /= denom
+
+            values[:, photon_dt] = sig_p
+
+            values[:, ~photon_dt & (mode != 'a')] = np.nan
+
+        # Background calculation
+        mask = (bins >= llim) & (bins <= ulim) & ~np.isnan(values)
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            bgr[t_s] = np.sum(values, axis = 2, where = mask) / mask.sum(axis = 2)
+
+        # Trigger correction and vertical trimming, empty bins are nan
+        block = values_out[t_s]
+
+        for j in range(n_ch):
+
+            b0 = max(0, shift_bins[j])
+
+            b1 = max(b0, min(n_out, n_bins + shift_bins[j]))
+
+            block[:, j, :b0] = np.nan
+
+            block[:, j, b1:] = np.nan
+
+            block[:, j, b0:b1] = values[:, j, b0 - shift_bins[j]:b1 - shift_bins[j]]
+
+        # Background, dark, and range correction
+        block -= bgr[t_s, :, np.newaxis]
+
+        if offset is not None:
+            block -= offset
+
+        block *= rng_sq
+
+    sig_out = sig.isel(bins = slice(0, n_out)).copy(data = values_out)
+
+    bgr = sig.isel(bins = 0, drop = True).copy(data = bgr)
+
+    sig_max = xr.DataArray(sig_max, dims = ['channel'], coords = [channels])
+
+    if verbose and not skip_dead_time_correction and not converted:
+        diagnose.detect_countrate_overflows(sig_max = sig_max, 
+                                            dead_time = dead_time, 
+                                            dead_time_cor_type = dead_time_cor_type)
+
+    return(sig_out, bgr, sig_max)
+
 def height_calculation(bins, resol, zenith_angle):
  
     """
@@ -461,6 +987,44 @@ def height_calculation(bins, resol, zenith_angle):
     
     return(heights)
 
+def mean_by_segment(sig_sum, nan_count, time_info, grouper = None):
+
+    """
+    General:
+        Returns the temporal averages from the running sums of 
+        accumulate_by_segment
+        
+    Input:
+        sig_sum:
+            A numpy array with dimensions (segment, channel, bins) with the 
+            sums of all the timeframes. It is divided in place
+            
+        nan_count:
+            A numpy array with the count of the nan values per segment, 
+            channel, and bin (or None)
+            
+        time_info : 
+                A pandas Dataframe with all the necessary metadata for each 
+                temporal frame fetched from the QA file (all timeframes)
+
+        grouper: 
+            A string with the column name of time_info that contains the 
+            flag used for grouping the data. Defaults to None (all the 
+            timeframes are averaged)
+              
+    Returns:
+        sig_avg: 
+            A numpy array with dimensions (segment, channel, bins) with the 
+            averaged signals
+            
+    """
+    
+    sep = _segment_sep(time_info, grouper = grouper)
+    
+    _segment_divide(sig_sum, nan_count, np.diff(sep))
+    
+    return(sig_sum)
+
 def range_calculation(bins, resol):
  
     """
@@ -493,7 +1057,7 @@ def range_calculation(bins, resol):
 
     return(ranges)
 
-def range_correction(sig, ranges):
+def range_correction(sig, ranges, inplace = False):
 
     """
     General:
@@ -507,6 +1071,10 @@ def range_correction(sig, ranges):
         ranges: 
             An xarray with the ranges per channel and bin. It must include at 
             least the following dimensions (channel, bins)
+
+        inplace:
+            If set to True the correction is applied directly on the data of 
+            sig, which is returned, instead of on a copy. Defaults to False
               
     Returns:
         
@@ -516,8 +1084,12 @@ def range_correction(sig, ranges):
             
     """
     
-    sig_out = (sig.copy() * np.power(ranges.copy(), 2))\
-        .transpose('time','channel','bins')
+    if inplace:
+        sig_out = sig.transpose('time','channel','bins')
+        sig_out *= np.power(ranges, 2)
+    else:
+        sig_out = (sig.copy() * np.power(ranges.copy(), 2))\
+            .transpose('time','channel','bins')
     
     return(sig_out)
 
@@ -641,6 +1213,51 @@ def trigger_correction(sig, daq_trigger_offset):
         
     return(sig_out)
 
+def trigger_correction_vec(sig, daq_trigger_offset):
+
+    """
+    General:
+        Vectorized version of trigger_correction. All channels are shifted 
+        with a single gather along the bins using the per channel offsets. 
+        Empty bins are filled with nans
+        
+    Input:
+        sig: 
+            A 3D xarray with the lidar signals, it should include the 
+            following dimensions: (time, channel, bins). 
+            
+        daq_trigger_offset: 
+            A pandas series with the trigger delay bins per channel. 
+            Negative values correspond to pretriggering --> shift to the left
+            The index should correspond to the channel dimension of sig            
+
+    Returns:
+        
+        sig_out: 
+            An xarray in the same shape as sig with the trigger corrected
+            signals
+            
+    """
+
+    channels = sig.channel.values
+    
+    n_bins = sig.bins.size
+    
+    shift_bins = daq_trigger_offset.loc[channels].values.astype(int)
+    
+    # Source bin index of each output bin per channel
+    ind = _dim_vector(sig, 'bins', np.arange(n_bins)) - \
+        _dim_vector(sig, 'channel', shift_bins)
+    
+    values = np.take_along_axis(sig.values, np.clip(ind, 0, n_bins - 1),
+                                axis = sig.get_axis_num('bins'))
+    
+    np.copyto(values, np.nan, where = (ind < 0) | (ind >= n_bins))
+    
+    sig_out = sig.copy(data = values)
+        
+    return(sig_out)
+
 def trim_vertically(sig, ground_alt, zenith_angle, alt_lim, resol):
  
     """
@@ -673,12 +1290,10 @@ def trim_vertically(sig, ground_alt, zenith_angle, alt_lim, resol):
         
         sig_out: 
             An xarray in the same shape as sig with the signals trimmed above
-            the maximum allowed altitude
+            the maximum allowed altitude. It is a view of sig, not a copy
             
     """
        
-    sig_out = np.nan * sig.copy()
-    
     zenith_angle_rad = np.deg2rad(zenith_angle)
 
     rng_lim = (float(alt_lim) - float(ground_alt))/np.cos(zenith_angle_rad)
@@ -694,7 +1309,7 @@ def trim_vertically(sig, ground_alt, zenith_angle, alt_lim, resol):
         sig_out = sig.loc[bin_d]
     
     else:
-        sig_out = sig.copy()
+        sig_out = sig
   
     return(sig_out)
 
@@ -747,3 +1362,200 @@ def unit_conv_counts_to_MHz(sig, shots, resol):
             sig_out.loc[ch_d] = sig.loc[ch_d]
     
     return(sig_out) 
+
+def unit_conv_counts_to_MHz_vec(sig, shots, resol):
+    
+    """
+    General:
+        Vectorized version of unit_conv_counts_to_MHz. The sampling rate of 
+        the photon channels is broadcasted across the channel dimension and
+        the shots across the time and channel dimensions
+        
+    Input:
+        sig: 
+            A 2D or 3D xarray with the lidar signals, it should include the 
+            following dimensions: (time, channel, ...). The units of the photon 
+            channels must be raw counts
+            
+        shots: 
+            A 2D xarray with the laser shots per channel and timeframe.
+            It should include the following dimensions: (time, channel, ...) 
+            The index should correspond to the channel dimension of sig            
+
+        resol:
+            A pandas series with the range resolution in m per channel. 
+            The index should correspond to the channel dimension of sig
+            
+    Returns:
+        
+        sig_out: 
+            An xarray in the same shape as sig. The units of the photon 
+            channels are converted from raw counts to MHz
+            
+    """
+    
+    channels = sig.channel.values
+    
+    mode = _acquisition_mode(channels)
+    
+    photon = mode == 'p'
+    
+    sampl_rate = 150. / resol.loc[channels].values.astype(float)
+    
+    sampl_rate = np.reshape(sampl_rate[photon], (-1,) + (1,) * (sig.ndim - 1))
+    
+    shots = shots.loc[dict(channel = channels)]\
+        .transpose('channel', *[dim for dim in sig.dims 
+                                if dim in shots.dims and dim != 'channel'])
+    
+    shots = np.expand_dims(shots.values[photon], 
+                           axis = tuple(range(shots.ndim, sig.ndim)))
+    
+    # Channel first views of the signals, the masks select whole channels
+    values_out = sig.values.astype(float)
+    
+    ch_out = np.moveaxis(values_out, sig.get_axis_num('channel'), 0)
+    
+    sig_p = ch_out[photon]
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        sig_p *= sampl_rate
+        sig_p /= shots
+
+    ch_out[photon] = sig_p
+
+    ch_out[~photon & (mode != 'a')] = np.nan
+    
+    sig_out = sig.copy(data = values_out)
+    
+    return(sig_out)
+
+def _acquisition_mode(channels):
+    
+    # 7th digit of channel name is the acquisition mode (a or p)
+    mode = np.array([ch[6] for ch in channels])
+    
+    return(mode)
+
+def _segment_mean(values, sep, axis, edge = [], edge_ind = [], 
+                  chunk_size = 8.):
+    
+    # Mean of values along axis for the consecutive index segments 
+    # [sep[i], sep[i+1]), empty segments are nan. The edge segments also 
+    # include the element at the respective edge_ind
+    values = np.moveaxis(values, axis, 0)
+    
+    seg_len = np.diff(sep)
+    
+    sig_avg = np.zeros((seg_len.size,) + values.shape[1:])
+    
+    nan_count = _segment_sum(values, sep, 0, sig_avg, None, 
+                             chunk_size = chunk_size)
+    
+    if len(edge) > 0:
+        
+        seg_len[edge] += 1
+        
+        block = values[edge_ind]
+        
+        nan = np.isnan(block)
+        
+        if nan.any():
+            if nan_count is None:
+                nan_count = np.zeros(sig_avg.shape, dtype = int)
+            
+            nan_count[edge] += nan
+            
+            block = np.where(nan, 0., block)
+        
+        sig_avg[edge] += block
+    
+    _segment_divide(sig_avg, nan_count, seg_len)
+    
+    return(np.moveaxis(sig_avg, 0, axis))
+
+def _segment_sum(values, sep, offset, sig_sum, nan_count, chunk_size = 8.):
+    
+    # Adds values (the elements offset, offset + 1, ... along axis 0) to the 
+    # sums of their segments [sep[i], sep[i+1]) in sig_sum. The segments are 
+    # summed with np.add.reduceat over blocks of chunk_size MB so that the 
+    # nan filling works on small temporaries. The blocks are aligned to 
+    # offset, so the sums do not depend on how the elements are split in 
+    # calls as long as offset is a multiple of _segment_step. The nan values 
+    # are counted separately and the count array is only allocated (and 
+    # returned) if nans are found
+    n = values.shape[0]
+    
+    seg_id = np.searchsorted(sep, np.arange(offset, offset + n), 
+                             side = 'right') - 1
+    
+    step = _segment_step(values[:1].size, chunk_size = chunk_size)
+    
+    for t0 in range(0, n, step):
+        
+        t1 = min(t0 + step, n)
+        
+        block = values[t0:t1]
+        
+        # First index of each (partial) segment inside the block
+        sep_b = sep[(sep > t0 + offset) & (sep < t1 + offset)] - offset
+        
+        loc = np.unique(np.hstack([t0, sep_b])) - t0
+        
+        seg = seg_id[loc + t0]
+        
+        nan = np.isnan(block)
+        
+        if nan.any():
+            if nan_count is None:
+                nan_count = np.zeros(sig_sum.shape, dtype = int)
+            
+            nan_count[seg] += np.add.reduceat(nan, loc, axis = 0, dtype = int)
+            
+            block = np.where(nan, 0., block)
+        
+        sig_sum[seg] += np.add.reduceat(block, loc, axis = 0)
+    
+    return(nan_count)
+
+def _segment_divide(sig_sum, nan_count, seg_len):
+    
+    # Divides in place the segment sums by the number of non nan elements
+    count = np.reshape(seg_len, (-1,) + (1,) * (sig_sum.ndim - 1))
+    
+    if nan_count is not None:
+        np.subtract(count, nan_count, out = nan_count)
+        count = nan_count
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        sig_sum /= count
+    
+    return()
+
+def _segment_step(size, chunk_size = 8.):
+    
+    # Number of elements of the given size in a block of chunk_size MB
+    return(max(1, int(chunk_size * 2**20 / (8. * max(size, 1)))))
+
+def _segment_sep(time_info, grouper = None):
+    
+    # Index of the first timeframe of each averaging segment followed by the 
+    # number of timeframes. A single segment (all timeframes) if grouper is 
+    # None, otherwise a new segment starts each time the group changes
+    if grouper is None:
+        return(np.array([0, time_info.index.size]))
+    
+    grp = time_info.loc[:,grouper].values
+    
+    sep = np.hstack([0, np.where(grp[:-1] != grp[1:])[0] + 1, grp.size])
+    
+    return(sep)
+
+def _dim_vector(sig, dim, values):
+    
+    # Reshapes a 1D array so that it broadcasts along the dim axis of sig
+    shape = [1] * sig.ndim
+    
+    shape[sig.get_axis_num(dim)] = -1
+    
+    return(np.reshape(values, shape))
@@ -37,7 +37,7 @@ def call_parser():
     parser.add_argument('-d', '--debug', metavar = 'debug',
                         type = bool, default = False, 
                         action = argparse.BooleanOptionalAction,
-                        help = 'If called then debugging files will be generated in ./results/debug folder. These included the metadata gathered from the configuration file, the licel header, and the combination of the two. Default to False ')
+                        help = 'If called then debugging files will be generated in ./results/debug folder. These included the metadata gathered from the configuration file, the licel header, and the combination of the two. The signals of the intermediate preprocessing stages are written to compressed netCDF files in the debug subfolder of the output folder. Default to False ')
 
     parser.add_argument('-q', '--quicklook', metavar = 'quicklook', 
                         type = bool, default = False, 
@@ -88,6 +88,32 @@ def call_parser():
                         type = float, nargs = '?', default = 21.,
                         help = "The maximum distance from the laser in km above which no calculations will be performed. Solar background calculations are performed prior to vertical signal trimming to enable background calculations up to the maximum signal altitude. Defaults to 20km ")                                                                                                        
     
+    parser.add_argument('--cache_size', metavar = 'cache_size', 
+                        type = float, nargs = '?', default = 512.,
+                        help = "The memory cap in MB of the in-process cache of the parsed QA files and the preprocessed dark profiles. The cache is shared by all preprocessor calls of the same run so that e.g. the rayleigh QA file of a polarization calibration is parsed only once. Use 0 to disable caching. Defaults to 512MB ")
+
+    parser.add_argument('--fused_preprocessing', metavar = 'fused_preprocessing', 
+                        type = bool,  default = False, 
+                        action = argparse.BooleanOptionalAction,
+                        help = 'If called then the quicklook signals will be preprocessed in a single pass over blocks of timeframes instead of one pass per preprocessing stage. The results are identical. It is ignored in debug mode because the intermediate stages are not stored. ')
+
+    parser.add_argument('--workers', metavar = 'workers', 
+                        type = int, nargs = '?', default = 1,
+                        help = "The number of processes used to preprocess the measurements of a processing chain run concurrently. The polarization calibration always runs after the rayleigh fit in the same process because it depends on the rayleigh QA file. Use 1 to preprocess the measurements one after the other. Defaults to 1 ")
+
+    parser.add_argument('--memory_limit', metavar = 'memory_limit', 
+                        type = float, nargs = '?', default = 0.,
+                        help = "The memory budget in MB of the concurrent preprocessor processes. A measurement waits for a running one to finish if its estimated memory does not fit in the budget. Only used if workers is larger than 1. Use 0 for no limit. Defaults to 0 ")
+
+    parser.add_argument('--chunked_quicklook', metavar = 'chunked_quicklook', 
+                        type = bool,  default = False, 
+                        action = argparse.BooleanOptionalAction,
+                        help = 'If called then the signals of the measurement will not be read in memory at once. They are read, preprocessed, and written to the quicklook file in blocks of timeframes, and the averaged signals are accumulated block by block. The results are identical. Only used if quicklook is called and ignored in debug mode. ')
+
+    parser.add_argument('--chunk_size', metavar = 'chunk_size', 
+                        type = float, nargs = '?', default = 256.,
+                        help = "The size in MB of the raw signals of a block of timeframes in the chunked quicklook mode. Only used if chunked_quicklook is called. Defaults to 256MB ")
+
     args = vars(parser.parse_args())
 
     return(args)
@@ -116,6 +142,18 @@ def check_parser(args):
     elif not os.path.exists(args['output_folder']):
         raise Exception(f"The provided output folder {args['output_folder']} does not exist! Please use an existing folder or don't provide one and let the the parser create the default output folder ") 
     
+    if args['cache_size'] < 0:
+        raise Exception(f"-- Error: The provided cache_size ({args['cache_size']}) must be a non-negative number (in MB). Use 0 to disable caching")
+
+    if args['workers'] < 1:
+        raise Exception(f"-- Error: The provided number of workers ({args['workers']}) must be a positive integer")
+
+    if args['memory_limit'] < 0:
+        raise Exception(f"-- Error: The provided memory_limit ({args['memory_limit']}) must be a non-negative number (in MB). Use 0 for no limit")
+
+    if args['chunk_size'] <= 0:
+        raise Exception(f"-- Error: The provided chunk_size ({args['chunk_size']}) must be a positive number (in MB)")
+
     return(args)
 
 def view_parser(args):
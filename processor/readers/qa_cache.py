@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: N. Siomos
+
+In-process LRU cache of the parsed QA file contents and of the preprocessed
+dark profiles
+
+The cache lives at module level so all the preprocessor calls of the same
+python process (e.g. the ray, tlc, pcb, and drk calls of one __master__ run)
+share it. Entries are keyed by the absolute path, size, and modification time
+of the QA file plus the options that affect the cached result. The least
+recently used entries are dropped once the total size of the cached arrays
+exceeds the memory cap. Cached arrays are flagged as read-only so a consumer
+that writes in place on them fails instead of silently corrupting the cache
+"""
+
+import os
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Memory cap of the cache in MB, 0 disables caching
+max_size = 512.
+
+_entries = OrderedDict()
+
+_sizes = dict()
+
+def set_max_size(size):
+
+    """ Sets the memory cap of the cache in MB and drops the least recently
+    used entries that no longer fit"""
+
+    global max_size
+
+    max_size = float(size)
+
+    _evict()
+
+    return()
+
+def file_key(path):
+
+    """ Returns the part of a cache key that identifies the current version of
+    a file (absolute path, size, and modification time)"""
+
+    stat = os.stat(path)
+
+    return((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+
+def cached(key, func, *args, **kwargs):
+
+    """ Returns the cached result of func for the given key. On a miss
+    func(*args, **kwargs) is called and its result is stored if it fits in
+    the memory cap"""
+
+    if key in _entries:
+        _entries.move_to_end(key)
+        return(_entries[key])
+
+    result = func(*args, **kwargs)
+
+    size = _nbytes(result) / 1E6
+
+    if size <= max_size:
+        _freeze(result)
+        _entries[key] = result
+        _sizes[key] = size
+        _evict()
+
+    return(result)
+
+def clear():
+
+    """ Drops all the cached entries"""
+
+    _entries.clear()
+
+    _sizes.clear()
+
+    return()
+
+def _evict():
+
+    while len(_entries) > 0 and sum(_sizes.values()) > max_size:
+        key, _ = _entries.popitem(last = False)
+        del _sizes[key]
+
+    return()
+
+def _nbytes(obj):
+
+    if isinstance(obj, (xr.DataArray, np.ndarray)):
+        size = obj.nbytes
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        size = obj.memory_usage(deep = True)
+        size = size.sum() if isinstance(size, pd.Series) else size
+    elif isinstance(obj, dict):
+        size = sum([_nbytes(item) for item in obj.values()])
+    elif isinstance(obj, (list, tuple)):
+        size = sum([_nbytes(item) for item in obj])
+    else:
+        size = 0
+
+    return(size)
+
+def _freeze(obj):
+
+    if isinstance(obj, xr.DataArray):
+        obj.values.flags.writeable = False
+    elif isinstance(obj, dict):
+        for item in obj.values():
+            _freeze(item)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            _freeze(item)
+
+    return()
@@ -12,7 +12,7 @@ import netCDF4 as nc
 # Read measurement
 def short_reader(fpath, exclude_telescope_type, exclude_channel_type, 
                  exclude_acquisition_mode, exclude_channel_subtype, 
-                 use_channels):
+                 use_channels, read_signal = True):
     
     """
     General:
@@ -41,6 +41,11 @@ def short_reader(fpath, exclude_telescope_type, exclude_channel_type,
         use_channels:
             Channel IDs to include for the calculations
             
+        read_signal:
+            If set to False the signals of the measurement are not read and 
+            signal is an empty list. They can be read later in blocks of 
+            timeframes with signal_block. The dark signals are always read. 
+            Defaults to True
             
     Returns:
         
@@ -115,6 +120,9 @@ def short_reader(fpath, exclude_telescope_type, exclude_channel_type,
         raise Exception('-- Error: The provided channel filtering arguments are too strict and exclude all channels. Please revide the following arguments: exclude_telescope_type, exclude_channel_type, exclude_acquisition_mode, exclude_channel_subtype, channels')
     
     valid_channels = channels[mask]
+    
+    # Only the selected channels are read from the netcdf file
+    channel_ind = np.where(mask)[0]
 
     # Read lidar metadata
     system_info = lidar_metadata(file)
@@ -125,23 +133,27 @@ def short_reader(fpath, exclude_telescope_type, exclude_channel_type,
         time_info_d = time_metadata_d(file, system_info)
 
     # Reading the licel signals
-    signal = signals(file, time_info = time_info, channel_info = channel_info)
-    signal = signal.copy().loc[dict(channel = valid_channels)]
+    if read_signal:
+        signal = signals(file, time_info = time_info, 
+                         channel_info = channel_info,
+                         channel_ind = channel_ind)
     if 'Background_Profile' in file.data_vars: 
         signal_d = signals(file, time_info = time_info_d, 
-                           channel_info = channel_info, isdark = True)
-        signal_d = signal_d.copy().loc[dict(channel = valid_channels)]
+                           channel_info = channel_info, isdark = True,
+                           channel_ind = channel_ind)
 
 
     # Reading the laser shots
-    shots = laser_shots(file, time_info = time_info, channel_info = channel_info)
-    shots = shots.copy().loc[dict(channel = valid_channels)]
+    shots = laser_shots(file, time_info = time_info, 
+                        channel_info = channel_info, channel_ind = channel_ind)
     if 'Background_Profile' in file.data_vars: 
         shots_d = laser_shots(file, time_info = time_info_d, 
-                              channel_info = channel_info, isdark = True)
-        shots_d = shots_d.copy().loc[dict(channel = valid_channels)]
+                              channel_info = channel_info, isdark = True,
+                              channel_ind = channel_ind)
 
     channel_info = channel_info.loc[valid_channels,:]
+    
+    file.close()
 
     return(system_info, channel_info, time_info, time_info_d,
            signal, signal_d, shots, shots_d)
@@ -433,7 +445,8 @@ def time_array(sdate, stime, start_t):
     
     return(timeframes)
 
-def laser_shots(file, time_info, channel_info, isdark = False):
+def laser_shots(file, time_info, channel_info, isdark = False, 
+                channel_ind = None):
 
     """
     General:
@@ -454,6 +467,9 @@ def laser_shots(file, time_info, channel_info, isdark = False):
 
         isdark :
             A boolean value. If set to Treu, the dark signals are read instead
+
+        channel_ind :
+            The indexes of the channels to read. Defaults to None (all)
             
     Returns:
         
@@ -465,24 +481,31 @@ def laser_shots(file, time_info, channel_info, isdark = False):
 
     timeframes =  time_info.index.values
     
-    channels = channel_info.index.values
+    if channel_ind is None:
+        channel_ind = np.arange(channel_info.index.size)
+    
+    channels = channel_info.index.values[channel_ind]
     
     if not isdark:
-        shots_arr = file.Laser_Shots.values
+        var = file.Laser_Shots
     else:
-        shots_arr = file.Background_Shots.values
+        var = file.Background_Shots
         
+    # Only the selected channels are read from the netcdf file
+    shots_arr = var.isel({var.dims[1] : channel_ind}).values
     
     shots = xr.DataArray(shots_arr, 
                          dims = ['time', 'channel'],
                          coords = [timeframes, channels])
 
-    # Sort by time
-    shots = shots.copy().sortby('time')
+    # Sort by time (skipped if already sorted)
+    if not time_info.index.is_monotonic_increasing:
+        shots = shots.sortby('time')
 
     return(shots)
 
-def signals(file, time_info, channel_info, isdark = False):
+def signals(file, time_info, channel_info, isdark = False, 
+            channel_ind = None, time_ind = None):
  
     """
     General:
@@ -503,6 +526,13 @@ def signals(file, time_info, channel_info, isdark = False):
         
         isdark :
             A boolean value. If set to Treu, the dark signals are read instead
+
+        channel_ind :
+            The indexes of the channels to read. Defaults to None (all)
+
+        time_ind :
+            The indexes of the timeframes to read (increasing), time_info 
+            must then contain only these timeframes. Defaults to None (all)
             
     Returns:
         
@@ -512,13 +542,26 @@ def signals(file, time_info, channel_info, isdark = False):
     
     """
     if not isdark:
-        signal_arr = file.Raw_Lidar_Data.values
+        var = file.Raw_Lidar_Data
     else:
-        signal_arr = file.Background_Profile.values
+        var = file.Background_Profile
+    
+    if channel_ind is None:
+        channel_ind = np.arange(channel_info.index.size)
         
-    bins = np.arange(0., signal_arr.shape[-1])
+    if time_ind is None:
+        time_ind = slice(None)
+        
+    # Only the selected timeframes and channels are read from the netcdf file
+    signal_arr = var.isel({var.dims[0] : time_ind,
+                           var.dims[1] : channel_ind}).values
     
-    channels = channel_info.index.values
+    # Mask the fill values in place
+    signal_arr[signal_arr == nc.default_fillvals['f8']] = np.nan
+        
+    bins = np.arange(0., var.shape[-1])
+    
+    channels = channel_info.index.values[channel_ind]
 
     timeframes =  time_info.index.values
     
@@ -526,9 +569,54 @@ def signals(file, time_info, channel_info, isdark = False):
                        dims = ['time', 'channel', 'bins'],
                        coords = [timeframes, channels, bins])
     
-    # Sort by time
-    signal = signal.copy().sortby('time')
-    signal = signal.copy().where(signal != nc.default_fillvals['f8'])
+    # Sort by time (skipped if already sorted)
+    if not time_info.index.is_monotonic_increasing:
+        signal = signal.sortby('time')
+    
+    return(signal)
+
+def signal_block(fpath, time_info, channel_info, time_ind):
+    
+    """
+    General:
+        Reads a block of timeframes of the signals of the QA file. It is used 
+        to process long measurements in blocks with bounded memory
+        
+    Input:
+        fpath: 
+            The path to the input QA netcdf file (string)
+
+        time_info : 
+            A pandas Dataframe with all the necessary metadata for each 
+            measurement timeframe fetched from the QA file (all timeframes)
+
+        channel_info : 
+            A pandas Dataframe with all the necessary metadata for each 
+            channel to read (e.g. the channel_info returned by short_reader)
+            
+        time_ind :
+            The indexes of the timeframes to read in the QA file (any order)
+            
+    Returns:
+        
+        signal : 
+            A 3D xarray Dataarray with the measured signals of the timeframes 
+            sorted by time. The dimensions should be (time, channel, bins)
+    
+    """
+    
+    time_ind = np.sort(time_ind)
+    
+    with xr.open_dataset(fpath) as file:
+        
+        channel_info_f = channel_metadata(file)
+        
+        channel_ind = np.where(np.isin(channel_info_f.index.values, 
+                                       channel_info.index.values))[0]
+        
+        signal = signals(file, time_info = time_info.iloc[time_ind], 
+                         channel_info = channel_info_f,
+                         channel_ind = channel_ind, time_ind = time_ind)
     
     return(signal)
 
@@ -3,7 +3,8 @@
 
 Main algorithm for pre-processing the raw signals and retrieve the optical products
 """
-import warnings, os, sys
+import warnings, os, sys, io, contextlib, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from .readers.parse_args import call_parser, check_parser
 from .tools import process, automate
 
@@ -42,31 +43,128 @@ def main(args, __version__, dry_run = False):
                     'dark' : None,
                     'radiosonde' : None} 
     
-    # Call all the processors sequentially
+    # The measurement types to process
+    mtypes = [mtype for mtype in allowed_types if mtype in meas_type and 
+              (args['mode'] == 'A' or args['mode'] == modes[mtype])]
+    
     for mtype in allowed_types: 
-        if mtype in meas_type and (args['mode'] == 'A' or args['mode'] == modes[mtype]):
+        if mtype not in meas_type and args['mode'] == 'A':
+            print(f"--Warning: No {mtype} files were processed!")
+            print("")
             
-            print(f"Processing {mtype} measurement")
+        elif mtype not in meas_type and args['mode'] == modes[mtype]:
+            print(f"--Warning: No {mtype} folder was detected despite the provided mode ({modes[mtype]})!")
+    
+    # The dark measurement is read and prepared once and shared by all types
+    if len(mtypes) > 0:
+        dark = process.prepare_dark(args)
+    else:
+        dark = None
+    
+    # The polarization calibration needs the rayleigh QA file, the other types are independent
+    stages = [[mtype for mtype in mtypes if mtype != 'polarization_calibration'],
+              [mtype for mtype in mtypes if mtype == 'polarization_calibration']]
+    
+    for stage in stages:
+        
+        nc_fnames = run_stage(processors = processors, mtypes = stage, 
+                              args = args, version = __version__, dark = dark)
+    
+        for mtype in stage:
             
-            nc_fname = processors[mtype](args, version = __version__)
+            nc_fname = nc_fnames[mtype]
             
             if nc_fname[0] != None:
                 if mtype == 'rayleigh':
+                    # The batch slicing (rayleigh_windows) returns one QA file per window. The first one is used for the polarization calibration
+                    if isinstance(nc_fname[0], list):
+                        nc_fname = [nc_fname[0][0], nc_fname[1][0]]
+                        output_files['rayleigh'] = nc_fnames[mtype][0]
+                        output_files['radiosonde'] = nc_fnames[mtype][0]
+                    else:
+                        output_files['rayleigh'] = nc_fname[0]
+                        output_files['radiosonde'] = nc_fname[0]
                     args['rayleigh_filename'] = os.path.basename(nc_fname[0])
                     args['radiosonde_filename'] = os.path.basename(nc_fname[1])
-                    output_files['rayleigh'] = nc_fname[0]
-                    output_files['radiosonde'] = nc_fname[0]
+                    args['radiosonde'] = os.path.basename(nc_fname[1])
                 else:
                     output_files[mtype] = nc_fname[0]
+    
+    return(output_files)
+
+def run_stage(processors, mtypes, args, version, dark):
+    
+    """Calls the processors of the mtypes measurement types and returns their
+    output filenames per type. If more than one worker is available the types
+    are processed concurrently by a process pool (the processing and the 
+    netcdf writing do not release the GIL) and the reading workers are split
+    among them. The output of each type is then captured and printed as a 
+    whole once the type finishes. Otherwise the types are processed 
+    sequentially"""
+    
+    nc_fnames = dict()
+    
+    workers = min(args['workers'], len(mtypes))
+    
+    if workers <= 1:
+        for mtype in mtypes:
+            print(f"Processing {mtype} measurement")
+            nc_fnames[mtype] = processors[mtype](args, version = version, dark = dark)
+    
+    else:
+        print(f"Processing the {', '.join(mtypes)} measurements with {workers} workers")
         
-        elif mtype not in meas_type and args['mode'] == 'A':
-            print(f"--Warning: No {mtype} files were processed!")
-            print("")
+        # Each type receives its own copy of the arguments
+        args_w = args.copy()
+        args_w['workers'] = max(args['workers'] // len(mtypes), 1)
+        
+        errors = []
+        
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = {pool.submit(run_processor, processors[mtype], mtype,
+                                   args_w.copy(), version, dark) : mtype
+                       for mtype in mtypes}
             
-        elif mtype not in meas_type and args['mode'] == modes[mtype]:
-            print(f"--Warning: No {mtype} folder was detected despite the provided mode ({modes[mtype]})!")
+            for future in as_completed(futures):
+                
+                mtype = futures[future]
+                
+                nc_fname, log, error = future.result()
+                
+                print(log, end = '')
+                
+                if error is not None:
+                    errors.append((mtype, error))
+                else:
+                    nc_fnames[mtype] = nc_fname
+        
+        if len(errors) > 0:
+            failed = '; '.join([f'{mtype}: {exc}' for mtype, exc in errors])
+            raise Exception(f"-- Error: The processing of the {', '.join([mtype for mtype, _ in errors])} measurements failed ({failed})") from errors[0][1]
     
-    return(output_files)
+    return(nc_fnames)
+
+def run_processor(processor, mtype, args, version, dark):
+    
+    """Calls the processor of the mtype measurement type in a worker process
+    and returns its output filenames, the captured log, and the raised 
+    exception (or None). The traceback of the exception is added to the log"""
+    
+    nc_fname = None
+    
+    error = None
+    
+    log = io.StringIO()
+    
+    with contextlib.redirect_stdout(log):
+        print(f"Processing {mtype} measurement")
+        try:
+            nc_fname = processor(args, version = version, dark = dark)
+        except Exception as exc:
+            print(traceback.format_exc(), end = '')
+            error = exc
+    
+    return(nc_fname, log.getvalue(), error)
 
 if __name__ == '__main__':
     
@@ -0,0 +1,158 @@
+"""
+@author: N. Siomos
+
+Persistent header index for raw lidar folders
+
+The index is a sidecar csv file stored inside each raw folder. It holds one
+row per raw file with the information that can be retrieved from the file
+header alone (start and end time, shots, channel layout). Each row is keyed by
+the filename, the file size, and the modification time, so only new or
+modified files have to be scanned again. The readers use it to select the
+files that will be decoded before any range bin is read.
+"""
+import os
+import numpy as np
+import pandas as pd
+from .workers import run
+from ..tools.modify import get_time_window, low_shots_mask
+
+index_fname = '.atlas_header_index.csv'
+
+columns = ['size', 'mtime', 'start_time', 'end_time',
+           'shots', 'channels', 'bins']
+
+def update(dir_meas, mfiles, read_header_info, workers = 1):
+
+    """ Loads the header index of the dir_meas folder and scans the headers
+    of the files in mfiles that are not in the index or that have changed
+    since they were indexed (different size or modification time). Entries
+    of files that no longer exist are dropped. The updated index is written
+    back to the folder and returned with one row per file in mfiles
+    (same order), indexed by the filename.
+
+    read_header_info is the format specific function that reads only the
+    header of a file and returns a dictionary with the start_time, end_time,
+    shots, channels, and bins of the file"""
+
+    path = os.path.join(dir_meas, index_fname)
+
+    filename = [os.path.basename(file) for file in mfiles]
+
+    stats = [os.stat(file) for file in mfiles]
+
+    size = np.array([stat.st_size for stat in stats])
+
+    mtime = np.array([stat.st_mtime_ns for stat in stats])
+
+    index = load(path)
+
+    index = index.loc[index.index.isin(filename)]
+
+    known = index.reindex(filename)
+
+    mask_scan = (known['size'].values != size) | \
+        (known['mtime'].values != mtime)
+
+    ind_scan = np.where(mask_scan)[0]
+
+    if len(ind_scan) > 0:
+        print(f'-- Header index: scanning the headers of {len(ind_scan)} new or modified file(s)')
+
+        rows = len(ind_scan) * [None]
+
+        def scan(k):
+            rows[k] = read_header_info(mfiles[ind_scan[k]])
+
+        run(scan, n_files = len(ind_scan), workers = workers)
+
+        scanned = pd.DataFrame(rows, index = np.array(filename)[ind_scan])
+        scanned['size'] = size[ind_scan]
+        scanned['mtime'] = mtime[ind_scan]
+
+        index = pd.concat([index.loc[~index.index.isin(scanned.index)],
+                           scanned.loc[:,columns]])
+
+        save(index, path)
+
+    index = index.loc[filename]
+
+    return(index)
+
+def load(path):
+
+    """ Reads the header index from the disk. An empty index is returned if
+    the file does not exist or cannot be parsed"""
+
+    index = pd.DataFrame(columns = columns)
+
+    if os.path.exists(path):
+        try:
+            index = pd.read_csv(path, index_col = 0,
+                                keep_default_na = False,
+                                dtype = {'channels' : str,
+                                         'bins' : str,
+                                         'shots' : str})
+            index['start_time'] = pd.to_datetime(index['start_time'])
+            index['end_time'] = pd.to_datetime(index['end_time'])
+            index['shots'] = pd.Series([np.array(shots.split(), dtype = float)
+                                        for shots in index['shots']],
+                                       index = index.index, dtype = object)
+        except Exception:
+            print(f'-- Warning: The header index {path} could not be parsed and will be rebuilt')
+            index = pd.DataFrame(columns = columns)
+
+    return(index)
+
+def save(index, path):
+
+    """ Writes the header index to the disk. The shots are stored as space
+    separated strings. Folders without writing permissions are skipped with a
+    warning, the index is then rebuilt in every run"""
+
+    index = index.copy()
+
+    index['shots'] = [' '.join(str(val) for val in shots)
+                      for shots in index['shots']]
+
+    try:
+        index.to_csv(path)
+    except OSError:
+        print(f'-- Warning: The header index could not be written in {os.path.dirname(path)}. Please check the folder permissions')
+
+    return()
+
+def select_files(index, slice_reg = [None, None]):
+
+    """ Returns a boolean mask (one element per file of the index) that is
+    True for the files that will be decoded. The files whose end time lies
+    outside of the slice_reg window are excluded. The window is calculated
+    exactly as in modify.slice_in_time"""
+
+    mask = np.ones(index.index.size, dtype = bool)
+
+    end_time = pd.DatetimeIndex(index['end_time'])
+
+    s_dt, e_dt = get_time_window(time = end_time.sort_values(),
+                                 slice_reg = slice_reg)
+
+    if s_dt != None and e_dt != None:
+        mask = (end_time >= s_dt) & (end_time <= e_dt)
+
+    return(np.asarray(mask))
+
+def skip_body_mask(index):
+
+    """ Returns a boolean mask (one element per file of the index) that is
+    True for the files whose body does not have to be decoded because all
+    of their channels would be screened out by modify.screen_low_shots.
+    No file is skipped if the channel layout is not the same in all files"""
+
+    mask = np.zeros(index.index.size, dtype = bool)
+
+    if index.index.size > 0 and index['channels'].nunique() == 1:
+
+        shots = np.vstack(index['shots'].values)
+
+        mask = low_shots_mask(shots).all(axis = 1)
+
+    return(mask)
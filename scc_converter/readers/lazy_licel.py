@@ -0,0 +1,163 @@
+"""
+@author: N. Siomos
+
+Lazy signal cube for the licel readers
+
+The raw files are memory-mapped and only the requested files, channels, and
+bins are decoded. The cube is wrapped in an xarray lazily indexed array so
+that any selection (sortby, slice_in_time, trim_channels) is just recorded
+and the decoding happens once, when the values are requested.
+"""
+import os, mmap
+import numpy as np
+from xarray.backends import BackendArray
+from xarray.core import indexing
+from .workers import run
+
+class LicelArray(BackendArray):
+
+    """ Array-like view of the (time, channel, bins) signal cube of a set of
+    licel files. Each file is identified by its path and the position of the
+    header separator (sep). All files share the channel layout of the first
+    file of the folder, as in read_body. Files flagged in skip_body and bins
+    beyond the range of each channel are returned as nans without reading
+    (0 for integer dtypes)"""
+
+    def __init__(self, mfiles, seps, bins, skip_body, workers = 1, 
+                 dtype = float):
+
+        self.mfiles = mfiles
+
+        self.seps = np.asarray(seps, dtype = int)
+
+        self.bins = np.asarray(bins, dtype = int)
+
+        self.skip_body = np.asarray(skip_body, dtype = bool)
+
+        self.workers = workers
+
+        # Offset of each channel block relative to the header separator
+        self.offsets = 4 + np.hstack([0, np.cumsum(4 * self.bins + 2)[:-1]])
+
+        self.shape = (len(mfiles), len(self.bins), int(self.bins.max()))
+
+        self.dtype = np.dtype(dtype)
+
+        self.fill_value = np.nan if self.dtype == float else 0
+
+    def __getitem__(self, key):
+
+        return(indexing.explicit_indexing_adapter(key, self.shape,
+                                                  indexing.IndexingSupport.OUTER,
+                                                  self._raw_indexing_method))
+
+    def _raw_indexing_method(self, key):
+
+        """ Decodes the outer selection given by key. Each element of key is
+        an integer, a slice, or an integer array for the respective axis"""
+
+        ind = [np.arange(self.shape[i])[key[i]] for i in range(3)]
+
+        squeeze = tuple(i for i in range(3) if np.ndim(ind[i]) == 0)
+
+        t_ind, c_ind, b_ind = [np.atleast_1d(arr) for arr in ind]
+
+        sig_arr = np.full((t_ind.size, c_ind.size, b_ind.size), 
+                          self.fill_value, dtype = self.dtype)
+
+        def decode(i):
+
+            k = t_ind[i]
+
+            if not self.skip_body[k]:
+                sig_arr[i, :, :] = self.read_file(k, c_ind, b_ind)
+
+        run(decode, n_files = t_ind.size, workers = self.workers)
+
+        return(np.squeeze(sig_arr, axis = squeeze))
+
+    def read_file(self, k, c_ind, b_ind):
+
+        """ Decodes the selected channels and bins of the k-th file from a
+        memory map of the file"""
+
+        sig_arr = np.full((c_ind.size, b_ind.size), self.fill_value, 
+                          dtype = self.dtype)
+
+        offsets = self.seps[k] + self.offsets
+
+        with open(self.mfiles[k], 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        if offsets[-1] + 4 * self.bins[-1] > len(buffer):
+            buffer.close()
+            raise Exception(f"-- Error: The licel file {self.mfiles[k]} is shorter than expected from the number of bins reported in its header. The file might be corrupted!")
+
+        for j in range(c_ind.size):
+
+            bins = self.bins[c_ind[j]]
+
+            mask = b_ind < bins
+
+            if mask.any():
+
+                b_min = b_ind[mask].min()
+
+                b_max = b_ind[mask].max() + 1
+
+                block = np.frombuffer(buffer, dtype = '<u4',
+                                      count = b_max - b_min,
+                                      offset = offsets[c_ind[j]] + 4 * b_min)
+
+                sig_arr[j, mask] = block[b_ind[mask] - b_min]
+
+                # Release the memory map before closing it
+                del block
+
+        buffer.close()
+
+        return(sig_arr)
+
+def recorded(mfiles, seps, channel_info, end_time):
+
+    """ Returns a mask of the licel files to read in lazy mode. The newest
+    files that are shorter than expected from their header are probably 
+    still being recorded (e.g. an append run during the measurement). They 
+    are skipped with a warning so that the next run reads them. Incomplete 
+    files recorded before a complete one are kept and raise an error when
+    they are decoded"""
+
+    bins = channel_info.bins.values.astype(int)
+
+    size = np.array([os.path.getsize(mfile) for mfile in mfiles])
+
+    # End of the last channel block (without its trailing separator)
+    complete = np.asarray(seps) + 2 + np.sum(4 * bins + 2) <= size
+
+    end_time = np.asarray(end_time)
+
+    if complete.any():
+        keep = complete | (end_time <= max(end_time[complete])).astype(bool)
+    else:
+        keep = complete
+
+    for k in np.where(~keep)[0]:
+        print(f'---- Warning! The licel file {mfiles[k]} is shorter than expected from the number of bins reported in its header. It is probably still being recorded and it is skipped, the next run will read it')
+
+    return(keep)
+
+def signal_cube(mfiles, seps, channel_info, skip_body, workers = 1, 
+                dtype = float):
+
+    """ Returns the lazily indexed signal cube of the provided licel files.
+    It can be used directly as the data of an xarray DataArray. The dtype
+    is either float or np.uint32 (compact reading)"""
+
+    array = LicelArray(mfiles = list(mfiles),
+                       seps = seps,
+                       bins = channel_info.bins.values,
+                       skip_body = skip_body,
+                       workers = workers,
+                       dtype = dtype)
+
+    return(indexing.LazilyIndexedArray(array))
@@ -15,6 +15,7 @@ Returns:
 
 import argparse
 import os
+import re
 
 def call_parser():
         
@@ -160,6 +161,42 @@ def call_parser():
                         type=str, nargs='*', default = [None, None],
                         help='Provide temporal limits for the processing of the normal measurement. Use the following format: HHMM for the limits. For example use: --slice_rayleigh 2300, 0130 to slice between 23:00 UTC and 01:30 UTC (the next day) Defaults to: None, None ')            
 
+    parser.add_argument('--rayleigh_windows', metavar='rayleigh_windows', 
+                        type=str, nargs='*', default = None,
+                        help='Provide several temporal windows for a batch slicing of a long rayleigh measurement (e.g. a campaign folder). The raw files are decoded once and one rayleigh QA file is produced per window that contains timeframes. Each window is either recurring, with HHMM limits applied to every date of the measurement, or absolute, with YYYYMMDDHHMM limits. For example use: --rayleigh_windows 2000-2200 to produce one QA file per night between 20:00 UTC and 22:00 UTC or --rayleigh_windows 202403122300-202403130130 202403132300-202403140130 for two specific windows. It cannot be combined with the slice_rayleigh and append options. Defaults to: None ')            
+
+    parser.add_argument('--workers', metavar='workers', 
+                        type=int, nargs='?', default = 1,
+                        help='The number of workers used to decode the raw files of each measurement folder concurrently. Folders with only a few files are always read serially. If more than one worker is provided, the independent measurement types (rayleigh, telecover, dark) are also processed concurrently and the workers are split among them. The output does not depend on the number of workers. Defaults to: 1 (serial reading) ')            
+
+    parser.add_argument('--header_index', metavar = 'header_index',
+                        type = bool, default = False, 
+                        action = argparse.BooleanOptionalAction,
+                        help = 'If called then a header index (.atlas_header_index.csv) will be created and incrementally updated inside each raw measurement folder. It is used to skip files outside of the slice_rayleigh limits and to avoid decoding files with low shots in all channels. Currently supported only for the licel and licel_old2rack formats. Defaults to False ')
+
+    parser.add_argument('--lazy_read', metavar = 'lazy_read',
+                        type = bool, default = False, 
+                        action = argparse.BooleanOptionalAction,
+                        help = 'If called then the raw signals of the rayleigh and dark measurements are memory-mapped and only the channels selected in the configuration file are decoded. It reduces the peak memory for long measurements with many channels. Currently supported only for the licel and licel_old2rack formats. Defaults to False ')
+
+    parser.add_argument('--compact_read', metavar = 'compact_read',
+                        type = bool, default = False, 
+                        action = argparse.BooleanOptionalAction,
+                        help = 'If called then the raw signals are kept as 32bit unsigned integers (their native width in the raw files) instead of floats until the conversion of the analog channels to mV. It halves the memory of the raw signals for long measurements. The QA files are not affected. Currently supported only for the licel and licel_old2rack formats. Defaults to False ')
+
+    parser.add_argument('--append', metavar = 'append',
+                        type = bool, default = False, 
+                        action = argparse.BooleanOptionalAction,
+                        help = 'If called then the rayleigh QA file is created with an unlimited time dimension and each later run on the same rayleigh folder decodes only the raw files recorded after the last timeframe of the existing QA file and appends them to it. Overflow and low shot screening are applied to the new timeframes only. Intended for repeated conversions during an ongoing measurement. Defaults to False ')
+
+    parser.add_argument('--nc_compression_level', metavar = 'nc_compression_level',
+                        type = int, nargs = '?', default = 0, 
+                        help = 'The zlib compression level (0-9) of the signal variables (Raw_Lidar_Data, Background_Profile) of the QA files. The shuffle filter is applied together with the compression. Higher levels produce smaller files but take longer to write. Defaults to: 0 (no compression) ')
+
+    parser.add_argument('--nc_chunking', metavar = 'nc_chunking',
+                        type = str, nargs = '?', default = None, 
+                        help = 'The chunk shape of the signal variables of the QA files. Choose one of: a) profile: one chunk per time frame and channel, efficient for both time frame and channel reads, b) frame: one chunk per time frame with all channels, c) channel: one chunk per channel with all time frames. Defaults to: profile if nc_compression_level > 0, otherwise the signals are stored contiguously ')
+
     args = vars(parser.parse_args())
     
     return(args)
@@ -265,6 +302,36 @@ def check_parser(args):
     if args['rsonde_column_units'][3] not in hum_units:
         raise Exception(f"-- Error: The value of the rsonde_column_units corresponding to the humidity array of the radiosonde file ({args['rsonde_column_units'][3]}) is not recognized! Please select one of: {hum_units}")
                
+    if args['header_index'] not in [True, False]:
+        raise Exception(f"-- Error: header_index field should be boolean. Please use one of {[True, False]} with: --header_index")
+
+    if args['lazy_read'] not in [True, False]:
+        raise Exception(f"-- Error: lazy_read field should be boolean. Please use one of {[True, False]} with: --lazy_read")
+
+    if args['compact_read'] not in [True, False]:
+        raise Exception(f"-- Error: compact_read field should be boolean. Please use one of {[True, False]} with: --compact_read")
+
+    if args['append'] not in [True, False]:
+        raise Exception(f"-- Error: append field should be boolean. Please use one of {[True, False]} with: --append")
+
+    if not isinstance(args['nc_compression_level'], int) or args['nc_compression_level'] not in range(0, 10):
+        raise Exception(f"-- Error: The provided nc_compression_level {args['nc_compression_level']} is not correct. Please provide an integer between 0 and 9 with: --nc_compression_level <nc_compression_level>")
+
+    if args['nc_chunking'] not in [None, 'profile', 'frame', 'channel']:
+        raise Exception(f"-- Error: The provided nc_chunking {args['nc_chunking']} is not supported. Please use one of {['profile', 'frame', 'channel']} with: --nc_chunking <nc_chunking>")
+
+    if args['rayleigh_windows'] != None:
+        for window in args['rayleigh_windows']:
+            if not re.fullmatch(r'\d{4}-\d{4}|\d{12}-\d{12}', window):
+                raise Exception(f"-- Error: The provided rayleigh window {window} is not correct. Please use either the HHMM-HHMM (recurring) or the YYYYMMDDHHMM-YYYYMMDDHHMM (absolute) format with: --rayleigh_windows <rayleigh_windows>")
+        if any([lim != None for lim in args['slice_rayleigh']]):
+            raise Exception("-- Error: The rayleigh_windows and slice_rayleigh options cannot be combined. Please provide the slice_rayleigh limits as a single window with: --rayleigh_windows <rayleigh_windows>")
+        if args['append']:
+            raise Exception("-- Error: The rayleigh_windows and append options cannot be combined. Please use only one of them")
+
+    if not isinstance(args['workers'], int) or args['workers'] < 1:
+        raise Exception(f"-- Error: The provided number of workers {args['workers']} is not correct. Please provide a positive integer with: --workers <workers>")
+
     if args['operation_mode'] not in ['labeling', 'testing']:
         raise Exception(f"The provided operation_mode {args['operation_mode']} is not correct. Please use one of {['labeling', 'testing']} ")
 
@@ -0,0 +1,197 @@
+"""
+@author: N. Siomos
+
+Persistent catalog of a radiosonde archive folder
+
+The catalog is a sidecar csv file stored inside the radiosonde folder. It
+holds the launch time of each radiosonde file, as decoded from its filename,
+so the filenames are validated only once. The catalog is sorted by launch
+time and the nearest radiosonde to a measurement is found with a binary
+search. The parsed and unit-converted profiles are cached in a compact binary
+(npz) form inside a sidecar folder and are reused as long as the source file
+and the parsing options do not change.
+"""
+import os, glob, re, hashlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+catalog_fname = '.atlas_radiosonde_catalog.csv'
+
+cache_dname = '.atlas_radiosonde_cache'
+
+def update(finput_rs):
+
+    """ Loads the catalog of the finput_rs folder and adds the radiosonde
+    files that are not yet included. Entries of files that no longer exist
+    are dropped. Only the filenames of the new files are validated. The
+    updated catalog is written back to the folder and returned sorted by
+    launch time, indexed by the filename"""
+
+    path = os.path.join(finput_rs, catalog_fname)
+
+    bname = [os.path.basename(path) for path in
+             glob.glob(os.path.join(finput_rs,'*_*.txt'))]
+
+    if len(bname) == 0:
+        raise Exception(f"-- Error: No txt file was found in the radiosonde folder: {finput_rs} Please make sure that the radiosonde files are in txt format")
+
+    catalog = load(path)
+
+    mask_known = catalog.index.isin(bname)
+
+    new = [name for name in bname if name not in catalog.index]
+
+    if len(new) > 0 or not mask_known.all():
+
+        catalog = catalog.loc[mask_known]
+
+        if len(new) > 0:
+
+            print(f'-- Radiosonde catalog: indexing {len(new)} new file(s)')
+
+            launch_time = check_filenames(new)
+
+            catalog = pd.concat([catalog,
+                                 pd.DataFrame({'launch_time' : launch_time},
+                                              index = new)])
+
+        catalog = catalog.sort_values('launch_time', kind = 'stable')
+
+        save(catalog, path)
+
+    return(catalog)
+
+def check_filenames(bname):
+
+    """ Validates the radiosonde filenames (they should start with
+    'yyyymmdd_hhmm' and end with '.txt') and returns their launch times"""
+
+    bname = np.array(bname)
+
+    bad_length = np.array([len(name) < 14 for name in bname])
+
+    if any(bad_length) :
+        raise Exception(f"-- Error: Radiosonde filename with wrong length detected! Please revise the following files: {bname[bad_length]}. They should start with 'yyyymmdd_hhmm' and end with '.txt' ")
+
+    pattern = "20[0-9]{2}[0-1][0-9][0-3][0-9]_[0-2][0-9][0-5][0-9]"
+    bad_format = np.array([not(bool(re.search(pattern,name))) for name in bname])
+
+    if any(bad_format):
+        raise Exception(f"-- Error: Radiosonde filename with wrong format detected! Please revise the following files: {bname[bad_format]}. They should start with 'yyyymmdd_hhmm' and end with '.txt' ")
+
+    dates = [name[:13].split('_')[0] for name in bname]
+    times = [name[:13].split('_')[1] for name in bname]
+
+    bad_dates = [int(date[:4]) not in np.arange(1960,9999,1) or \
+                 int(date[4:6]) not in np.arange(1,13,1) or \
+                 int(date[6:8]) not in np.arange(1,32,1) for date in dates]
+
+    bad_times = [int(time[:2]) not in np.arange(0,24,1) or \
+                 int(time[2:4]) not in np.arange(0,60,1) for time in times]
+
+    if any(bad_dates):
+        raise Exception(f"-- Error: The date provided in at least one radiosonde filename is not correct. Please revise the following files: {bname[bad_dates]}. It should start with 'yyyymmdd_hhmm' and end with '.txt' ")
+
+    if any(bad_times):
+        raise Exception(f"-- Error: The time provided in at least radiosond filename is not correct. Please revise the following files: {bname[bad_times]}. It should start with 'yyyymmdd_hhmm' and end with '.txt' ")
+
+    launch_time = np.array([datetime.strptime(date + time,'%Y%m%d%H%M')
+                            for date, time in zip(dates, times)],
+                           dtype = 'datetime64[s]')
+
+    return(launch_time)
+
+def nearest(catalog, mtime):
+
+    """ Returns the filename of the radiosonde launched nearest in time to
+    mtime and the time difference in hours. The catalog must be sorted by
+    launch time. On ties the earliest launch is selected"""
+
+    launch_time = catalog['launch_time'].values.astype('datetime64[s]')
+
+    mtime = np.datetime64(mtime, 's')
+
+    ind = np.searchsorted(launch_time, mtime)
+
+    candidates = [i for i in [ind - 1, ind] if i >= 0 and i < launch_time.size]
+
+    delta_t = [(launch_time[i] - mtime) / np.timedelta64(1, 'h')
+               for i in candidates]
+
+    ind_rs = candidates[int(np.argmin(np.abs(delta_t)))]
+
+    # Equal launch times are resolved by the order of the catalog
+    ind_rs = np.searchsorted(launch_time, launch_time[ind_rs])
+
+    delta_t = (launch_time[ind_rs] - mtime) / np.timedelta64(1, 'h')
+
+    return(catalog.index[ind_rs], delta_t)
+
+def profile(path, options, parse):
+
+    """ Returns the parsed profile of the radiosonde file in path. parse is
+    the function that reads and converts the file and options is a dictionary
+    with all the arguments that affect the parsing. The result is cached next
+    to the file and is reused as long as the file (size and modification
+    time) and the options do not change"""
+
+    stat = os.stat(path)
+
+    key = repr(sorted(options.items())) + f'{stat.st_size}_{stat.st_mtime_ns}'
+
+    key = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+    cache_dir = os.path.join(os.path.dirname(path), cache_dname)
+
+    cache_path = os.path.join(cache_dir, f'{os.path.basename(path)}.{key}.npz')
+
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            data = cached['data']
+            parameters = list(cached['parameters'])
+
+    else:
+        data, parameters = parse(path, **options)
+
+        try:
+            os.makedirs(cache_dir, exist_ok = True)
+
+            # Drop the previous versions of the same file
+            for fname in glob.glob(os.path.join(cache_dir, f'{glob.escape(os.path.basename(path))}.*.npz')):
+                os.remove(fname)
+
+            np.savez(cache_path, data = data, parameters = np.array(parameters))
+
+        except OSError:
+            print(f'-- Warning: The radiosonde cache could not be written in {cache_dir}. Please check the folder permissions')
+
+    return(data, parameters)
+
+def load(path):
+
+    """ Reads the catalog from the disk. An empty catalog is returned if the
+    file does not exist or cannot be parsed"""
+
+    catalog = pd.DataFrame({'launch_time' : np.array([], dtype = 'datetime64[s]')})
+
+    if os.path.exists(path):
+        try:
+            catalog = pd.read_csv(path, index_col = 0,
+                                  parse_dates = ['launch_time'])
+        except Exception:
+            print(f'-- Warning: The radiosonde catalog {path} could not be parsed and will be rebuilt')
+
+    return(catalog)
+
+def save(catalog, path):
+
+    """ Writes the catalog to the disk. Folders without writing permissions
+    are skipped with a warning, the catalog is then rebuilt in every run"""
+
+    try:
+        catalog.to_csv(path)
+    except OSError:
+        print(f'-- Warning: The radiosonde catalog could not be written in {os.path.dirname(path)}. Please check the folder permissions')
+
+    return()
@@ -1,46 +1,53 @@
 """
 @author: Peristera
 """
-import os, sys, glob
+import os, sys
 import numpy as np
 from ..readers import read_licel, read_polly_xt, read_licel_matlab, read_polly_xt_first, read_licel_old2rack
+from ..readers import radiosonde_catalog as rs_catalog
+from ..readers.workers import run
 import xarray as xr
 import pandas as pd
-from datetime import datetime
-import re
 
-def rayleigh(finput_ray, file_format):
+# Raw file formats that support the persistent header index
+header_index_formats = ['licel', 'licel_old2rack']
+
+lazy_formats = ['licel', 'licel_old2rack']
+
+compact_formats = ['licel', 'licel_old2rack']
+
+# Reader module of each supported raw file format
+readers = {'polly_xt' : read_polly_xt,
+           'polly_xt_first' : read_polly_xt_first,
+           'licel' : read_licel,
+           'licel_matlab' : read_licel_matlab,
+           'licel_old2rack' : read_licel_old2rack}
+
+def rayleigh(finput_ray, file_format, workers = 1, header_index = False, 
+             slice_reg = [None, None], lazy = False, compact = False):
     
     """Extracts the raw signal, shots, and rest metadata information out of the 
     raw input files. The default format is currently licel. The signal units
-    are always mV for analog and counts for photon channels"""
+    are always mV for analog and counts for photon channels. The workers 
+    argument sets the number of files that are decoded concurrently. If 
+    header_index is True the header index of the folders is used to select
+    the files to decode (only for the formats in header_index_formats). If
+    lazy is True the signal is returned as a lazy memory-mapped cube that is
+    decoded only when its values are requested (only for the formats in 
+    lazy_formats). If compact is True the raw signal is kept in its native
+    integer width until the unit conversion (only for the formats in 
+    compact_formats)"""
     
     # Reading
     print('-----------------------------------------')
     print('Start reading Rayleigh signals...')
     print('-----------------------------------------')
     
-    # Select reader based on the file format
-    if file_format == 'polly_xt':
-        system_info, channel_info, time_info, sig, shots = \
-            read_polly_xt.dtfs(dir_meas = finput_ray, meas_type = 'ray')
-            
-    elif file_format == 'polly_xt_first':
-        system_info, channel_info, time_info, sig, shots = \
-            read_polly_xt_first.dtfs(dir_meas = finput_ray)
-            
-    elif file_format == 'licel':
-        system_info, channel_info, time_info, sig, shots = \
-            read_licel.dtfs(dir_meas = finput_ray)
-            
-    elif file_format == 'licel_matlab':
-        system_info, channel_info, time_info, sig, shots = \
-            read_licel_matlab.dtfs(dir_meas = finput_ray)
-
-    elif file_format == 'licel_old2rack':
-        system_info, channel_info, time_info, sig, shots = \
-            read_licel_old2rack.dtfs(dir_meas = finput_ray)
-
+    system_info, channel_info, time_info, sig, shots = \
+        read_folder(path = finput_ray, file_format = file_format, 
+                    meas_type = 'ray', workers = workers, 
+                    header_index = header_index, slice_reg = slice_reg, 
+                    lazy = lazy, compact = compact)
 
     print('Reading Rayleigh signals complete!')
     print('-----------------------------------------')
@@ -49,68 +56,34 @@ def rayleigh(finput_ray, file_format):
     return(sig, shots, system_info, channel_info, time_info)
 
 def telecover(finput_sec, finput_rin, file_format, 
-              files_per_sector = None, files_per_ring = None):
+              files_per_sector = None, files_per_ring = None, workers = 1,
+              header_index = False, compact = False):
     
     """Extracts the raw signal, shots, and rest metadata information out of the 
     raw input files. The default format is currently licel. The signal units
-    are always mV for analog and counts for photon channels"""
+    are always mV for analog and counts for photon channels. The workers 
+    argument sets the number of files that are decoded concurrently. If 
+    header_index is True the header index of the folders is used to select
+    the files to decode (only for the formats in header_index_formats). All
+    sector and ring folders are read concurrently when workers > 1. If 
+    compact is True the raw signal is kept in its native integer width until
+    the unit conversion (only for the formats in compact_formats)"""
     
     # Reading
     print('-----------------------------------------')
     print('Start reading telecover signals...')
     print('-----------------------------------------')
     
-    sig_sec = []
-    sector_sec = []
-    shots_sec = []
-    time_info_sec = []
-    
-    sig = []
-    shots = []
-    time_info = []
-    channel_info = []
-    system_info = []
+    folders = []
+    labels = []
     
     if files_per_sector == None:
         if os.path.exists(finput_sec): 
             if os.listdir(finput_sec):
                 for sector in ['north', 'east', 'south', 'west']:
-                    path = os.path.join(finput_sec, sector)
                     print(f'-- Reading {sector} sector..')           
-
-                    # Select reader based on the file format
-                    if file_format == 'polly_xt':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_polly_xt.dtfs(dir_meas = path, meas_type = 'tlc')
-                    
-                    elif file_format == 'polly_xt_first':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_polly_xt_first.dtfs(dir_meas = path)
-                          
-                    elif file_format == 'licel':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_licel.dtfs(dir_meas = path)
-                            
-                    elif file_format == 'licel_matlab':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_licel_matlab.dtfs(dir_meas = path)
-
-                    elif file_format == 'licel_old2rack':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_licel_old2rack.dtfs(dir_meas = path)
-
-                    sector = folder_to_sector(folder = time_info['folder'].values)
-    
-                    time_info['sector'] = sector
-                        
-                    sig_sec.append(sig)
-                    shots_sec.append(shots)
-                    sector_sec.append(sector)
-                    time_info_sec.append(time_info)
-                
-                sig = xr.concat(sig_sec, dim = 'time').sortby('time')
-                shots = xr.concat(shots_sec, dim = 'time').sortby('time')
-                time_info = pd.concat(time_info_sec).sort_index()
+                    folders.append(os.path.join(finput_sec, sector))
+                    labels.append(lambda time_info: folder_to_sector(folder = time_info['folder'].values))
             else:
                 print(f'-- Warning: Folder {finput_sec} is empty! No files to read ')
                 
@@ -118,83 +91,18 @@ def telecover(finput_sec, finput_rin, file_format,
         if os.path.exists(finput_sec):
             if os.listdir(finput_sec):
                 print('-- Reading sectors..')           
-                
-                # Select reader based on the file format
-                if file_format == 'polly_xt':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_polly_xt.dtfs(dir_meas = finput_sec, meas_type = 'tlc')
-                          
-                elif file_format == 'polly_xt_first':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_polly_xt_first.dtfs(dir_meas = finput_sec)
-                        
-                elif file_format == 'licel':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_licel.dtfs(dir_meas = finput_sec)
-                
-                elif file_format == 'licel_matlab':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_licel_matlab.dtfs(dir_meas = finput_sec)
-                        
-                elif file_format == 'licel_old2rack':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_licel_old2rack.dtfs(dir_meas = finput_sec)
-                    
-                sector = time_to_sector(folder = time_info['folder'], 
-                                        files_per_sector = files_per_sector)
-                
-                time_info['sector'] = sector
-    
-                sig_sec.append(sig)
-                shots_sec.append(shots)
-                sector_sec.append(sector)
-                time_info_sec.append(time_info)
-    
-                sig = xr.concat(sig_sec, dim = 'time').sortby('time')
-                shots = xr.concat(shots_sec, dim = 'time').sortby('time')
-                time_info = pd.concat(time_info_sec).sort_index()
+                folders.append(finput_sec)
+                labels.append(lambda time_info: time_to_sector(folder = time_info['folder'], files_per_sector = files_per_sector))
             else:
                 print(f'-- Warning: Folder {finput_sec} is empty! No files to read ')
                 
-
     if files_per_ring == None:
         if os.path.exists(finput_rin):
             if os.listdir(finput_rin):
                 for ring in ['inner', 'outer']:
-                    path = os.path.join(finput_rin, ring)
                     print(f'-- Reading {ring} rings..')           
-                    # Select reader based on the file format
-                    if file_format == 'polly_xt':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_polly_xt.dtfs(dir_meas = path, meas_type = 'tlc')
-                          
-                    elif file_format == 'polly_xt_first':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_polly_xt_first.dtfs(dir_meas = path)
-                            
-                    elif file_format == 'licel':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_licel.dtfs(dir_meas = path)
-                            
-                    elif file_format == 'licel_matlab':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_licel_matlab.dtfs(dir_meas = path)
-                            
-                    elif file_format == 'licel_old2rack':
-                        system_info, channel_info, time_info, sig, shots = \
-                            read_licel_old2rack.dtfs(dir_meas = path)
-                
-                    ring = folder_to_sector(folder = time_info['folder'].values)
-                    time_info['sector'] = ring
-                        
-                    sig_sec.append(sig)
-                    shots_sec.append(shots)
-                    sector_sec.append(ring)
-                    time_info_sec.append(time_info)
-        
-                sig = xr.concat(sig_sec, dim = 'time').sortby('time')
-                shots = xr.concat(shots_sec, dim = 'time').sortby('time')
-                time_info = pd.concat(time_info_sec).sort_index()
+                    folders.append(os.path.join(finput_rin, ring))
+                    labels.append(lambda time_info: folder_to_sector(folder = time_info['folder'].values))
             else:
                 print(f'-- Warning: Folder {finput_rin} is empty! No files to read ')
         
@@ -202,43 +110,16 @@ def telecover(finput_sec, finput_rin, file_format,
         if os.path.exists(finput_rin):
             if os.listdir(finput_rin):
                 print('-- Reading rings..')    
-                
-                if file_format == 'polly_xt':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_polly_xt.dtfs(dir_meas = finput_rin, meas_type = 'tlc')
-
-                elif file_format == 'polly_xt_first':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_polly_xt_first.dtfs(dir_meas = finput_rin)
-                        
-                elif file_format == 'licel':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_licel.dtfs(dir_meas = finput_rin)
-                
-                elif file_format == 'licel_matlab':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_licel_matlab.dtfs(dir_meas = finput_rin)
-                        
-                elif file_format == 'licel_old2rack':
-                    system_info, channel_info, time_info, sig, shots = \
-                        read_licel_old2rack.dtfs(dir_meas = finput_rin)                        
-                        
-                ring = time_to_ring(folder = time_info['folder'], 
-                                    files_per_ring = files_per_ring)
-            
-                time_info['sector'] = ring
-        
-                sig_sec.append(sig)
-                shots_sec.append(shots)
-                sector_sec.append(ring)
-                time_info_sec.append(time_info)
-    
-                sig = xr.concat(sig_sec, dim = 'time').sortby('time')
-                shots = xr.concat(shots_sec, dim = 'time').sortby('time')
-                time_info = pd.concat(time_info_sec).sort_index()
-
+                folders.append(finput_rin)
+                labels.append(lambda time_info: time_to_ring(folder = time_info['folder'], files_per_ring = files_per_ring))
             else:
                 print(f'-- Warning: Folder {finput_rin} is empty! No files to read ')
+    
+    sig, shots, system_info, channel_info, time_info = \
+        read_subfolders(folders = folders, labels = labels, column = 'sector',
+                        file_format = file_format, meas_type = 'tlc', 
+                        workers = workers, header_index = header_index,
+                        compact = compact)
         
     print('Reading telecover signals complete!')
     print('-----------------------------------------')
@@ -246,264 +127,59 @@ def telecover(finput_sec, finput_rin, file_format,
 
     return(sig, shots, system_info, channel_info, time_info)
 
-def polarization_calibration(finput_ray, finput_p45, finput_m45, finput_stc, file_format):
+def polarization_calibration(finput_ray, finput_p45, finput_m45, finput_stc, file_format, workers = 1, header_index = False, compact = False):
     
     """Extracts the raw signal, shots, and rest metadata information out of the 
     raw input files. The default format is currently licel. The signal units
-    are always mV for analog and counts for photon channels"""
+    are always mV for analog and counts for photon channels. The workers 
+    argument sets the number of files that are decoded concurrently. If 
+    header_index is True the header index of the folders is used to select
+    the files to decode (only for the formats in header_index_formats). The
+    static, -45, and +45 folders are read concurrently when workers > 1. If 
+    compact is True the raw signal is kept in its native integer width until
+    the unit conversion (only for the formats in compact_formats)"""
     
     # Reading
     print('-----------------------------------------')
     print('Start reading Polarization Calibration signals...')
     print('-----------------------------------------')
             
-    sig_pos = []
-    shots_pos = []
-    position_pos = []
-    time_info_pos = []
-
     sig = []
     shots = []
     time_info = []
     channel_info = []
     system_info = []
     
-    if file_format == 'licel':
-        if os.path.exists(finput_stc):
-            if os.listdir(finput_stc):
-                print('-- Reading static calibration files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel.dtfs(dir_meas = finput_stc)
-            
-                position = np.array(time_info.index.size * [0])
-                time_info['position'] = position
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_stc} is empty! No files to read ')
-                       
-        if os.path.exists(finput_m45):
-            if os.listdir(finput_m45):
-                print('-- Reading -45 files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel.dtfs(dir_meas = finput_m45)
-    
-                position = np.array(time_info.index.size * [1])
-                time_info['position'] = position
-        
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_m45} is empty! No files to read ')
-                    
-
-        if os.path.exists(finput_p45):
-            if os.listdir(finput_p45):
-                print('-- Reading +45 files..')  
-  
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel.dtfs(dir_meas = finput_p45)
-    
-                position = np.array(time_info.index.size * [2])
-                time_info['position'] = position
-                
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_p45} is empty! No files to read ')
-                 
-        sig = xr.concat(sig_pos, dim = 'time').sortby('time')
-        shots = xr.concat(shots_pos, dim = 'time').sortby('time')
-        time_info = pd.concat(time_info_pos).sort_index()
-
-    elif file_format == 'licel_matlab':
-        if os.path.exists(finput_stc):
-            if os.listdir(finput_stc):
-                print('-- Reading static calibration files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel_matlab.dtfs(dir_meas = finput_stc)
-            
-                position = np.array(time_info.index.size * [0])
-                time_info['position'] = position
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_stc} is empty! No files to read ')
-                       
-        if os.path.exists(finput_m45):
-            if os.listdir(finput_m45):
-                print('-- Reading -45 files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel_matlab.dtfs(dir_meas = finput_m45)
-    
-                position = np.array(time_info.index.size * [1])
-                time_info['position'] = position
-        
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_m45} is empty! No files to read ')
-                    
-
-        if os.path.exists(finput_p45):
-            if os.listdir(finput_p45):
-                print('-- Reading +45 files..')  
-  
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel_matlab.dtfs(dir_meas = finput_p45)
-    
-                position = np.array(time_info.index.size * [2])
-                time_info['position'] = position
-                
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_p45} is empty! No files to read ')
-        
-        if len(sig_pos) != 0:        
-            sig = xr.concat(sig_pos, dim = 'time').sortby('time')
-            shots = xr.concat(shots_pos, dim = 'time').sortby('time')
-            time_info = pd.concat(time_info_pos).sort_index()
-
-    elif file_format == 'licel_old2rack':
-        if os.path.exists(finput_stc):
-            if os.listdir(finput_stc):
-                print('-- Reading static calibration files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel_old2rack.dtfs(dir_meas = finput_stc)
-            
-                position = np.array(time_info.index.size * [0])
-                time_info['position'] = position
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_stc} is empty! No files to read ')
-                       
-        if os.path.exists(finput_m45):
-            if os.listdir(finput_m45):
-                print('-- Reading -45 files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel_old2rack.dtfs(dir_meas = finput_m45)
-    
-                position = np.array(time_info.index.size * [1])
-                time_info['position'] = position
-        
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_m45} is empty! No files to read ')
-                    
-    
-        if os.path.exists(finput_p45):
-            if os.listdir(finput_p45):
-                print('-- Reading +45 files..')  
-    
-                system_info, channel_info, time_info, sig, shots = \
-                    read_licel_old2rack.dtfs(dir_meas = finput_p45)
-    
-                position = np.array(time_info.index.size * [2])
-                time_info['position'] = position
-                
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_p45} is empty! No files to read ')
-        
-        if len(sig_pos) != 0:        
-            sig = xr.concat(sig_pos, dim = 'time').sortby('time')
-            shots = xr.concat(shots_pos, dim = 'time').sortby('time')
-            time_info = pd.concat(time_info_pos).sort_index()
-
-    elif file_format == 'polly_xt_first':
-        if os.path.exists(finput_stc):
-            if os.listdir(finput_stc):
-                print('-- Reading static calibration files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_polly_xt_first.dtfs(dir_meas = finput_stc)
-            
-                position = np.array(time_info.index.size * [0])
-                time_info['position'] = position
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_stc} is empty! No files to read ')
-                       
-        if os.path.exists(finput_m45):
-            if os.listdir(finput_m45):
-                print('-- Reading -45 files..')  
-                
-                system_info, channel_info, time_info, sig, shots = \
-                    read_polly_xt_first.dtfs(dir_meas = finput_m45)
-    
-                position = np.array(time_info.index.size * [1])
-                time_info['position'] = position
-        
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_m45} is empty! No files to read ')
-                    
-
-        if os.path.exists(finput_p45):
-            if os.listdir(finput_p45):
-                print('-- Reading +45 files..')  
-  
-                system_info, channel_info, time_info, sig, shots = \
-                    read_polly_xt_first.dtfs(dir_meas = finput_p45)
-    
-                position = np.array(time_info.index.size * [2])
-                time_info['position'] = position
-                
-                sig_pos.append(sig)
-                shots_pos.append(shots)
-                position_pos.append(position)
-                time_info_pos.append(time_info)
-            else:
-                print(f'-- Warning: Folder {finput_p45} is empty! No files to read ')
-        
-        if len(sig_pos) != 0:        
-            sig = xr.concat(sig_pos, dim = 'time').sortby('time')
-            shots = xr.concat(shots_pos, dim = 'time').sortby('time')
-            time_info = pd.concat(time_info_pos).sort_index()
-
-    # Select reader based on the file format
-    elif file_format == 'polly_xt':
+    # The polly_xt calibration positions are stored inside the rayleigh files
+    if file_format == 'polly_xt':
         if os.path.exists(finput_ray):
             if os.listdir(finput_ray):
                 system_info, channel_info, time_info, sig, shots = \
-                    read_polly_xt.dtfs(dir_meas = finput_ray, meas_type = 'pcb')
+                    read_folder(path = finput_ray, file_format = file_format, 
+                                meas_type = 'pcb', workers = workers)
             else:
                 print(f'-- Warning: Folder {finput_ray} is empty! No files to read ')
-                         
+    
+    else:
+        folders = []
+        labels = []
+        
+        for path, name, position in [(finput_stc, 'static calibration', 0),
+                                     (finput_m45, '-45', 1),
+                                     (finput_p45, '+45', 2)]:
+            if os.path.exists(path):
+                if os.listdir(path):
+                    print(f'-- Reading {name} files..')  
+                    folders.append(path)
+                    labels.append(lambda time_info, position = position: np.array(time_info.index.size * [position]))
+                else:
+                    print(f'-- Warning: Folder {path} is empty! No files to read ')
+    
+        sig, shots, system_info, channel_info, time_info = \
+            read_subfolders(folders = folders, labels = labels, 
+                            column = 'position', file_format = file_format, 
+                            meas_type = 'pcb', workers = workers, 
+                            header_index = header_index, compact = compact)
             
     print('Reading Polarization Calibration signals complete!')
     print('-----------------------------------------')
@@ -512,33 +188,31 @@ def polarization_calibration(finput_ray, finput_p45, finput_m45, finput_stc, fil
     return(sig, shots, system_info, channel_info, time_info)
 
 
-def dark(finput_drk, file_format):
+def dark(finput_drk, file_format, workers = 1, header_index = False, 
+         lazy = False, compact = False):
     
     """Extracts the raw signal, shots, and rest metadata information out of the 
     raw input files. The default format is currently licel. The signal units
-    are always mV for analog and counts for photon channels"""
+    are always mV for analog and counts for photon channels. The workers 
+    argument sets the number of files that are decoded concurrently. If 
+    header_index is True the header index of the folders is used to select
+    the files to decode (only for the formats in header_index_formats). If
+    lazy is True the signal is returned as a lazy memory-mapped cube that is
+    decoded only when its values are requested (only for the formats in 
+    lazy_formats). If compact is True the raw signal is kept in its native
+    integer width until the unit conversion (only for the formats in 
+    compact_formats)"""
     
     # Reading
     print('-----------------------------------------')
     print('Start reading dark signals...')
     print('-----------------------------------------')
     
-    # Select reader based on the file format
-    if file_format == 'polly_xt':
-        system_info, channel_info, time_info, sig, shots = \
-            read_polly_xt.dtfs(dir_meas = finput_drk, meas_type = 'drk')
-    elif file_format == 'polly_xt_first':
-        system_info, channel_info, time_info, sig, shots = \
-            read_polly_xt_first.dtfs(dir_meas = finput_drk)
-    elif file_format == 'licel':
-        system_info, channel_info, time_info, sig, shots = \
-            read_licel.dtfs(dir_meas = finput_drk)
-    elif file_format == 'licel_matlab':
-        system_info, channel_info, time_info, sig, shots = \
-            read_licel_matlab.dtfs(dir_meas = finput_drk)
-    elif file_format == 'licel_old2rack':
-        system_info, channel_info, time_info, sig, shots = \
-            read_licel_old2rack.dtfs(dir_meas = finput_drk)
+    system_info, channel_info, time_info, sig, shots = \
+        read_folder(path = finput_drk, file_format = file_format, 
+                    meas_type = 'drk', workers = workers, 
+                    header_index = header_index, lazy = lazy, 
+                    compact = compact)
             
     print('Reading dark signals complete!')
     print('-----------------------------------------')
@@ -546,22 +220,131 @@ def dark(finput_drk, file_format):
   
     return(sig, shots, system_info, channel_info, time_info)
 
+def read_folder(path, file_format, meas_type, workers = 1, 
+                header_index = False, slice_reg = [None, None], lazy = False,
+                compact = False):
+    
+    """Calls the reader of file_format (see the readers registry) for the 
+    path folder. Each reader receives only the options it supports. The 
+    meas_type is used only by the polly_xt reader"""
+    
+    if file_format not in readers.keys():
+        raise Exception(f"-- Error: The provided file_format ({file_format}) is not supported! Please use one of: {list(readers.keys())}")
+    
+    options = dict(dir_meas = path, workers = workers)
+    
+    if file_format == 'polly_xt':
+        options['meas_type'] = meas_type
+        
+    if file_format in header_index_formats:
+        options['header_index'] = header_index
+        options['slice_reg'] = slice_reg
+        
+    if file_format in lazy_formats:
+        options['lazy'] = lazy
+        
+    if file_format in compact_formats:
+        options['compact'] = compact
+        
+    return(readers[file_format].dtfs(**options))
+
+def read_subfolders(folders, labels, column, file_format, meas_type, 
+                    workers = 1, header_index = False, compact = False):
+    
+    """Reads the sub-folders of a telecover or a polarization calibration 
+    measurement and assembles them in a single signal array. labels holds
+    a function per folder that returns the sector or position of each file
+    out of the time_info of the folder. The result is stored in the column 
+    of the time_info. If workers > 1 the folders are read concurrently and 
+    the workers are shared among them. The metadata of the last folder are 
+    returned as in the serial reading. Empty lists are returned if no 
+    folder is provided"""
+    
+    n_folders = len(folders)
+    
+    if n_folders == 0:
+        return([], [], [], [], [])
+    
+    if workers == None or workers < 1:
+        workers = 1
+    
+    folder_workers = min(workers, n_folders)
+    
+    file_workers = max(workers // folder_workers, 1)
+    
+    results = n_folders * [None]
+    
+    def read(k):
+        results[k] = read_folder(path = folders[k], 
+                                 file_format = file_format, 
+                                 meas_type = meas_type,
+                                 workers = file_workers,
+                                 header_index = header_index,
+                                 compact = compact)
+        
+    run(read, n_files = n_folders, workers = folder_workers, min_per_worker = 1)
+    
+    for k in range(n_folders):
+        results[k][2][column] = labels[k](results[k][2])
+        
+    system_info, channel_info = results[-1][:2]
+    
+    # Concatenate only once after all folders are read
+    time_info = pd.concat([result[2] for result in results]).sort_index()
+    sig = xr.concat([result[3] for result in results], dim = 'time').sortby('time')
+    shots = xr.concat([result[4] for result in results], dim = 'time').sortby('time')
+
+    return(sig, shots, system_info, channel_info, time_info)
 
 def radiosonde(finput_rs, delimiter, skip_header, skip_footer, 
                usecols, units, mtime, ground):
 
     """Extracts the meteorological information out of the 
-    raw radiosonde file."""
+    raw radiosonde file. The radiosonde launched nearest in time to mtime is
+    selected from the catalog of the radiosonde folder and its parsed profile
+    is reused from the radiosonde cache when available"""
     
     # Reading
     print('-----------------------------------------')
     print('Start reading radiosonde file...')
     print('-----------------------------------------')
     
-    paths = glob.glob(os.path.join(finput_rs,'*_*.txt'))
+    catalog = rs_catalog.update(finput_rs)
+    
+    bname, delta_t = rs_catalog.nearest(catalog, mtime = mtime)
+    
+    if not np.abs(delta_t) < 24:
+        raise Exception(f"-- Error: The nearest radiosonde in time {bname} was launched with a time difference of {np.round(delta_t,decimals=1)} hours with respect to the middle time of the measurement! Please provide a radiosond file with less than 18 hours temporal difference")
+    else:
+        print(f'-- Selected radiosonde file: {bname}')
+    
+    options = dict(delimiter = delimiter, 
+                   skip_header = skip_header, 
+                   skip_footer = skip_footer, 
+                   usecols = list(usecols), 
+                   units = list(units), 
+                   ground = ground)
+    
+    data, parameters = rs_catalog.profile(os.path.join(finput_rs, bname), 
+                                          options = options,
+                                          parse = parse_radiosonde)
+        
+    alt = data[:,0]
+    
+    atmo = xr.DataArray(data[:,1:], 
+                        coords = [alt, parameters], 
+                        dims = ['height', 'parameters'] )
+    
+    date, time = bname[:13].split('_')
     
-    if len(paths) == 0:
-        raise Exception(f"-- Error: No txt file was found in the radiosonde folder: {finput_rs} Please make sure that the radiosonde files are in txt format")
+    return(date, time, atmo)
+
+def parse_radiosonde(path, delimiter, skip_header, skip_footer, 
+                     usecols, units, ground):
+
+    """Reads a single radiosonde ascii file and converts the columns to 
+    altitude (m asl), pressure (hPa), temperature (K), and relative 
+    humidity (%). Returns the data array and the parameter names"""
     
     lib_delimiter =  {"S": "",
                       "C": ",",
@@ -595,50 +378,6 @@ def radiosonde(finput_rs, delimiter, skip_header, skip_footer,
     
     def fraction_to_percent(x):
         return(100. * x)
-    
-    if len(paths) == 0 :
-        raise Exception("-- Error: No txt file provided in the radiosonde folder! Please provide a single file with the radiosonde data with a filename that starts with 'yyyymmdd_hhmm' and ends with '.txt' ")
-
-    bname = [os.path.basename(path) for path in paths]
-
-    bad_length = [len(name) < 14 for name in bname]
-    
-    if any(bad_length) :
-        raise Exception(f"-- Error: Radiosonde filename with wrong length detected! Please revise the following files: {bname[bad_length]}. They should start with 'yyyymmdd_hhmm' and end with '.txt' ")
-    else:
-        pattern = "20[0-9]{2}[0-1][0-9][0-3][0-9]_[0-2][0-9][0-5][0-9]"
-        bad_format = [not(bool(re.search(pattern,name))) for name in bname]
-
-        if any(bad_format):
-            raise Exception(f"-- Error: Radiosonde filename with wrong format detected! Please revise the following files: {bname[bad_format]}. They should start with 'yyyymmdd_hhmm' and end with '.txt' ")
-        else:
-            dates = [name[:13].split('_')[0] for name in bname]
-            times = [name[:13].split('_')[1] for name in bname]
-
-    bad_dates = [int(date[:4]) not in np.arange(1960,9999,1) or \
-                 int(date[4:6]) not in np.arange(1,13,1) or \
-                 int(date[6:8]) not in np.arange(1,32,1) for date in dates]
-
-    bad_times = [int(time[:2]) not in np.arange(0,24,1) or \
-                 int(time[2:4]) not in np.arange(0,60,1) for time in times]
-        
-    if any(bad_dates):
-        raise Exception(f"-- Error: The date provided in at least one radiosonde filename is not correct. Please revise the following files: {np.array(bname)[bad_dates]}. It should start with 'yyyymmdd_hhmm' and end with '.txt' ")
-
-    if any(bad_times):
-        raise Exception(f"-- Error: The time provided in at least radiosond filename is not correct. Please revise the following files: {np.array(bname)[bad_times]}. It should start with 'yyyymmdd_hhmm' and end with '.txt' ")
-        
-    date_dt = np.array([datetime.strptime(date + time,'%Y%m%d%H%M') 
-                        for date, time in zip(dates, times)])
-    
-    delta_t = np.array([(dt - mtime).total_seconds() /3600. for dt in date_dt])
-
-    ind_rs = np.argmin(np.abs(delta_t))
-    
-    if not any(np.abs(delta_t) < 24):
-        raise Exception(f"-- Error: The nearest radiosonde in time {bname[ind_rs]} was launched with a time difference of {np.round(delta_t[ind_rs],decimals=1)} hours with respect to the middle time of the measurement! Please provide a radiosond file with less than 18 hours temporal difference")
-    else:
-        print(f'-- Selected radiosonde file: {bname[ind_rs]}')
         
     if usecols[3] == None:
         parameters = ['P', 'T']
@@ -647,7 +386,7 @@ def radiosonde(finput_rs, delimiter, skip_header, skip_footer,
     else:
         parameters = ['P', 'T', 'RH']
         
-    data = np.genfromtxt(paths[ind_rs],skip_header = skip_header, 
+    data = np.genfromtxt(path,skip_header = skip_header, 
                          skip_footer = skip_footer,
                          delimiter = lib_delimiter[delimiter], 
                          autostrip = True,
@@ -682,14 +421,8 @@ def radiosonde(finput_rs, delimiter, skip_header, skip_footer,
         
     if units[3] == 'fraction' and len(usecols) == 4:
         data[:,3] = fraction_to_percent(data[:,3])     
-        
-    alt = data[:,0]
-    
-    atmo = xr.DataArray(data[:,1:], 
-                        coords = [alt, parameters], 
-                        dims = ['height', 'parameters'] )
     
-    return(dates[ind_rs], times[ind_rs], atmo)
+    return(data, parameters)
 
 def folder_to_sector(folder):
 
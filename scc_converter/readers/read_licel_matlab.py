@@ -6,11 +6,13 @@ from datetime import datetime as dt
 from datetime import timedelta
 import xarray as xr
 from scipy.io import loadmat
+from .workers import run
 
 # Read measurement
-def dtfs(dir_meas):
+def dtfs(dir_meas, workers = 1):
     
-    """ Reads information from the raw licel files"""
+    """ Reads information from the raw licel files. If workers > 1 the files
+    are decoded concurrently into the preallocated signal array"""
     
     # Setting sig, info, and time as empty lists in the beggining    
     sig_raw = []     
@@ -58,8 +60,8 @@ def dtfs(dir_meas):
             filename = np.empty(len(mfiles), dtype = object)
             folder = np.empty(len(mfiles), dtype = object)
 
-            # Iterate over the files
-            for k in range(len(mfiles)):
+            # Decode a single file and store it at position k
+            def decode(k):
                 
                 filename[k] = os.path.basename(mfiles[k])
                 
@@ -88,6 +90,9 @@ def dtfs(dir_meas):
                 if (mfiles[k]).split(os.sep)[-2] in ['north', 'east', 'south', 'west', 'inner', 'outer', '+45', '-45', 'static']:
                     folder[k] = (mfiles[k]).split(os.sep)[-2]
             
+            # Iterate over the files (serially or with a worker pool)
+            run(decode, n_files = len(mfiles), workers = workers)
+            
             sig_raw = xr.DataArray(sig_arr, 
                                    coords=[end_time_arr, channels, bins_arr],
                                    dims=['time', 'channel', 'bins']) 
@@ -5,11 +5,26 @@ import glob
 from datetime import datetime as dt
 from datetime import timedelta
 import xarray as xr
+from .workers import run
+from . import header_index as hindex
+from .lazy_licel import signal_cube, recorded
 
 # Read measurement
-def dtfs(dir_meas):
+def dtfs(dir_meas, workers = 1, header_index = False, slice_reg = [None, None],
+         lazy = False, compact = False):
     
-    """ Reads information from the raw licel files"""
+    """ Reads information from the raw licel files. If workers > 1 the files
+    are decoded concurrently into the preallocated signal array. If 
+    header_index is True, the header index of the folder is used to skip 
+    files outside of the slice_reg temporal limits and to avoid decoding the
+    body of files that will be screened out due to low shots. If lazy is 
+    True, only the headers are read here and the signal is returned as a 
+    lazy cube backed by memory-mapped files. The selected channels and bins 
+    are decoded only when the signal values are requested. If compact is 
+    True, the raw signals are kept as 32bit unsigned integers (the native 
+    width of the licel files) instead of floats. Bins beyond the range of 
+    each channel and files whose body is not decoded are then 0 instead of 
+    nan and they are masked in modify.unit_conv_bits_to_mV"""
     
     # Setting sig, info, and time as empty lists in the beggining    
     sig_raw = []     
@@ -33,16 +48,26 @@ def dtfs(dir_meas):
         
         mfiles = [file for file in mfiles if os.path.basename(file) != 'temp.dat']
         
+        skip_body = np.zeros(len(mfiles), dtype = bool)
+        
+        # Select the files that will be decoded using only their headers
+        if header_index and len(mfiles) > 0:
+            mfiles, skip_body = select_from_index(dir_meas = dir_meas, 
+                                                  mfiles = mfiles, 
+                                                  slice_reg = slice_reg,
+                                                  workers = workers)
+        
         # for existing directory and files inside it, starts the reading of files     
         if len(mfiles) > 0:
             print(f'-- Folder contains {len(mfiles)} file(s)!')
             
             buffer = read_buffer(mfiles[0])
             sep = find_sep(buffer, mfiles[0])
+            header = read_header(buffer = buffer, sep = sep)
             
             # Reading the licel file metadatas (header) - only for the first file
-            system_info = read_meas(buffer = buffer, sep = sep)
-            channel_info = read_channels(buffer = buffer, sep = sep)
+            system_info = read_meas(header = header)
+            channel_info = read_channels(header = header)
             
             channels = channel_info.index.values
             # bins_arr = np.arange(1., channel_info.bins.max() + 1.)
@@ -52,29 +77,40 @@ def dtfs(dir_meas):
             start_time_arr = np.nan*np.zeros(len(mfiles), dtype = object)
             end_time_arr = np.nan*np.zeros(len(mfiles), dtype = object)
 
-            shots_arr = np.nan*np.zeros((len(mfiles), len(channels)), dtype = object)
-            sig_arr = np.nan*np.zeros((len(mfiles), len(channels), len(bins_arr)), dtype = float)
+            shots_arr = np.nan*np.zeros((len(mfiles), len(channels)), dtype = float)
+            
+            sig_dtype = np.uint32 if compact else float
+            
+            if lazy:
+                seps = np.zeros(len(mfiles), dtype = int)
+            elif compact:
+                sig_arr = np.zeros((len(mfiles), len(channels), len(bins_arr)), dtype = sig_dtype)
+            else:
+                sig_arr = np.nan*np.zeros((len(mfiles), len(channels), len(bins_arr)), dtype = float)
 
             filename = np.empty(len(mfiles), dtype = object)
             folder = np.empty(len(mfiles), dtype = object)
 
-            # Iterate over the files
-            for k in range(len(mfiles)):
+            # Decode a single file and store it at position k
+            def decode(k):
                 
                 filename[k] = os.path.basename(mfiles[k])
 
-                buffer = read_buffer(mfiles[k])
+                buffer = read_buffer(mfiles[k], header_only = skip_body[k] or lazy)
 
                 sep = find_sep(buffer, filename[k])
                 
-                stime, etime = read_time(buffer = buffer, sep = sep)
-
-                shots_arr[k,:] = read_shots(buffer = buffer, sep = sep)
+                header = read_header(buffer = buffer, sep = sep)
                 
-                sig = read_body(channel_info, buffer = buffer, sep = sep)
+                stime, etime = read_time(header = header)
 
+                shots_arr[k,:] = read_shots(header = header)
+                
                 # Store signal, start and end time
-                sig_arr[k, :, :] = sig
+                if lazy:
+                    seps[k] = sep
+                elif not skip_body[k]:
+                    sig_arr[k, :, :] = read_body(channel_info, buffer = buffer, sep = sep, fname = mfiles[k], dtype = sig_dtype)
 
                 start_time_arr[k] = stime
                 
@@ -88,6 +124,34 @@ def dtfs(dir_meas):
                 if (mfiles[k]).split(os.sep)[-2] in ['north', 'east', 'south', 'west', 'inner', 'outer', '+45', '-45', 'static']:
                     folder[k] = (mfiles[k]).split(os.sep)[-2]
             
+            # Iterate over the files (serially or with a worker pool)
+            run(decode, n_files = len(mfiles), workers = workers)
+            
+            # Skip the newest files if they are still being recorded
+            if lazy:
+                keep = recorded(mfiles = mfiles, seps = seps, 
+                                channel_info = channel_info, 
+                                end_time = end_time_arr)
+                
+                mfiles = [mfiles[k] for k in np.where(keep)[0]]
+                seps, skip_body = seps[keep], skip_body[keep]
+                shots_arr = shots_arr[keep]
+                start_time_arr = start_time_arr[keep]
+                end_time_arr = end_time_arr[keep]
+                filename, folder = filename[keep], folder[keep]
+                
+                if len(mfiles) == 0:
+                    print('---- Warning! No completely recorded files in the folder \n'+\
+                          f'---> !! Skip reading measurement files from folder {dir_meas}')
+                    return([], [], [], [], [])
+            
+            if lazy:
+                sig_arr = signal_cube(mfiles = mfiles, seps = seps, 
+                                      channel_info = channel_info,
+                                      skip_body = skip_body, 
+                                      workers = workers,
+                                      dtype = sig_dtype)
+            
             sig_raw = xr.DataArray(sig_arr, 
                                    coords=[end_time_arr, channels, bins_arr],
                                    dims=['time', 'channel', 'bins']) 
@@ -106,7 +170,9 @@ def dtfs(dir_meas):
                                      columns = properties)  
                         
             # Sort by time
-            sig_raw = sig_raw.sortby('time').copy()
+            sig_raw = sig_raw.sortby('time')
+            if not lazy:
+                sig_raw = sig_raw.copy()
             shots = shots.sortby('time').copy()
             time_info = time_info.sort_index()
             
@@ -117,20 +183,47 @@ def dtfs(dir_meas):
     return(system_info, channel_info, time_info, sig_raw, shots)
 
 
-def read_body(channel_info, buffer, sep):
+def read_body(channel_info, buffer, sep, fname, dtype = float):
     
     """ Reads the information from the raw licel files below the header.
-    Blocks are separated by #"""
+    Each channel block is a sequence of little-endian 32bit integers 
+    followed by a 2 byte separator (\r\n). Every block is decoded with a 
+    single numpy call directly from the file buffer. For integer dtypes the
+    bins beyond the range of each channel are 0 instead of nan"""
 
-    data = buffer[sep+4:]
+    offsets, bins = block_offsets(channel_info, sep)
 
     max_bins = int(channel_info.bins.max())
 
     n_channels = len(channel_info.index)
     
-    # Parse data into dataframe    
-    sig_raw_arr = []
+    if offsets[-1] + 4 * bins[-1] > len(buffer):
+        raise Exception(f"-- Error: The licel file {fname} is shorter than expected from the number of bins reported in its header. The file might be corrupted!")
+
+    if dtype == float:
+        sig_raw_arr = np.nan*np.zeros((n_channels, max_bins))
+    else:
+        sig_raw_arr = np.zeros((n_channels, max_bins), dtype = dtype)
+
+    for j in range(n_channels):
+        sig_raw_arr[j,:bins[j]] = np.frombuffer(buffer, dtype = '<u4', 
+                                                count = bins[j], 
+                                                offset = offsets[j])
+    
+    return(sig_raw_arr)
+
+def read_body_ref(channel_info, buffer, sep):
+    
+    """ Reference decoder of the licel body that reads the bins one by one
+    with int.from_bytes. It is slow and kept only to check read_body (see
+    __licel_benchmark__.py)"""
+
+    data = buffer[sep+4:]
+
+    max_bins = int(channel_info.bins.max())
 
+    n_channels = len(channel_info.index)
+    
     nbin_s = 0
     sig_raw_arr = np.nan*np.zeros((n_channels, max_bins))
 
@@ -147,10 +240,34 @@ def read_body(channel_info, buffer, sep):
     
     return(sig_raw_arr)
 
+def block_offsets(channel_info, sep):
+    
+    """ Calculates the byte offset of each channel block inside the licel 
+    file buffer and the respective number of bins. The data start after the
+    header separator (\r\n\r\n) and every block is followed by \r\n"""
+
+    bins = channel_info.bins.values.astype(int)
+
+    offsets = sep + 4 + np.hstack([0, np.cumsum(4 * bins + 2)[:-1]])
+    
+    return(offsets, bins)
+
 def find_sep(buffer, fname):
     
     """ Identifies the location of the header separator field: \r\n\r\n"""
     
+    sep = buffer.find(b"\r\n\r\n")
+    
+    if sep < 0:
+        raise Exception(f"Could not find header/data separator. Is {fname} a licel file?")
+    
+    return(sep)
+
+def find_sep_ref(buffer, fname):
+    
+    """ Reference byte by byte search of the header separator field. It is 
+    kept only to check find_sep (see __licel_benchmark__.py)"""
+    
     search_sequence = bytearray("\r\n\r\n", encoding="utf-8")
     i = 0
     while buffer[i:i+4] != search_sequence:
@@ -161,7 +278,20 @@ def find_sep(buffer, fname):
     
     return(sep)
 
-def read_meas(buffer, sep):
+def read_header(buffer, sep):
+    
+    """ Converts the licel header to text and splits it in lines. The header
+    is parsed only once per file and then shared by all metadata readers"""
+
+    # sep points to the start of search_sequence, AKA end of header
+    header_bytes = buffer[0:sep-1]
+    
+    # Convert header to text
+    header = str(header_bytes, encoding="utf-8").split("\r\n")
+    
+    return(header)
+
+def read_meas(header):
 
     """ Retrieves location and geometry relevant information from 
     the licel header [altitude, latitude, longitude, 
@@ -170,12 +300,6 @@ def read_meas(buffer, sep):
     laser C repetion rate if it exists]"""
     system_info = pd.Series()
      
-    # Now i points to the start of search_sequence, AKA end of header
-    header_bytes = buffer[0:sep-1]
-    
-    # Convert header to text, parse metadata
-    header = str(header_bytes, encoding="utf-8").split("\r\n")
-
     metadata = header[3].split()
 
     system_info['altitude'] = float(metadata[9])    
@@ -189,12 +313,6 @@ def read_meas(buffer, sep):
 #         system_info['azimuth_angle'] = float(metadata[9])
 #     
 
-    # Now i points to the start of search_sequence, AKA end of header
-    header_bytes = buffer[0:sep-1]
-    
-    # Convert header to text, parse metadata
-    header = str(header_bytes, encoding="utf-8").split("\r\n")
-
     metadata = header[4].split()
 
     system_info['laser_A_repetition_rate'] = float(metadata[1])
@@ -211,17 +329,11 @@ def read_meas(buffer, sep):
     
     return(system_info)
 
-def read_time(buffer, sep):
+def read_time(header):
     
     """ Retrieves temporal information from 
     the licel header [start time, stop time]"""
 
-    # Now i points to the start of search_sequence, AKA end of header
-    header_bytes = buffer[0:sep-1]
-    
-    # Convert header to text, parse metadata
-    header = str(header_bytes, encoding="utf-8").split("\r\n")
-
     metadata = header[3].split()
 
     start_date = metadata[1]
@@ -234,7 +346,7 @@ def read_time(buffer, sep):
         
     return(stime, etime)
 
-def read_channels(buffer, sep):
+def read_channels(header):
     
     """ Collects channel specific information from the licel header
     [analog/photon mode (0/1), laser number (A,B,C), number of range bins,
@@ -256,12 +368,6 @@ def read_channels(buffer, sep):
             'analog_to_digital_resolution', 'shots', 'data_acquisition_range',
             'recorder_channel_id']
 
-    # Now i points to the start of search_sequence, AKA end of header
-    header_bytes = buffer[0:sep-1]
-    
-    # Convert header to text, parse metadata
-    header = str(header_bytes, encoding="utf-8").split("\r\n")
-
     # Header rows
     header = np.array([line[1:].split()[:len(cols)] for line in header[5:]], 
                       dtype = object)
@@ -300,7 +406,7 @@ def read_channels(buffer, sep):
 
     return(channel_info)
 
-def read_shots(buffer, sep):
+def read_shots(header):
     
     """ Gets the number of shots for each channel and file"""
 
@@ -316,12 +422,6 @@ def read_shots(buffer, sep):
             'analog_to_digital_resolution', 'shots', 'data_acquisition_range',
             'recorder_channel_id']
 
-    # Now i points to the start of search_sequence, AKA end of header
-    header_bytes = buffer[0:sep-1]
-    
-    # Convert header to text, parse metadata
-    header = str(header_bytes, encoding="utf-8").split("\r\n")
-
     # Header rows
     header = np.array([line[1:].split()[:len(cols)] for line in header[5:]], 
                       dtype = object)
@@ -334,11 +434,72 @@ def read_shots(buffer, sep):
     
     return(shots)
 
-def read_buffer(fname):
+def read_buffer(fname, header_only = False):
        
-    """ Reads the binary file as a single byte sequence (buffer)"""
+    """ Reads the binary file as a single byte sequence (buffer). If 
+    header_only is True, the file is read in chunks only until the header 
+    separator is found"""
     
     with open(fname, 'rb') as f:
-        buffer = f.read()
+        if header_only:
+            buffer = f.read(4096)
+            while buffer.find(b"\r\n\r\n") < 0:
+                chunk = f.read(4096)
+                if len(chunk) == 0:
+                    break
+                buffer = buffer + chunk
+        else:
+            buffer = f.read()
         
-    return(buffer)
\ No newline at end of file
+    return(buffer)
+
+def read_header_info(fname):
+    
+    """ Reads only the header of a licel file and returns the information
+    that is stored in the header index of the folder"""
+    
+    buffer = read_buffer(fname, header_only = True)
+    
+    sep = find_sep(buffer, fname)
+    
+    header = read_header(buffer = buffer, sep = sep)
+    
+    stime, etime = read_time(header = header)
+    
+    if stime == etime: # same convention as in dtfs
+        etime = etime + timedelta(milliseconds = 500)
+
+    channel_info = read_channels(header = header)
+    
+    info = dict(start_time = stime, 
+                end_time = etime,
+                shots = read_shots(header = header),
+                channels = ' '.join(channel_info.index.values),
+                bins = ' '.join(channel_info.bins.values.astype(int).astype(str)))
+    
+    return(info)
+
+def select_from_index(dir_meas, mfiles, slice_reg, workers = 1):
+    
+    """ Updates the header index of the folder and uses it to select the 
+    files within the slice_reg temporal limits. Returns the selected files 
+    and a mask that is True for the selected files whose body does not 
+    need to be decoded because of low shots in all channels"""
+    
+    index = hindex.update(dir_meas = dir_meas, mfiles = mfiles, 
+                          read_header_info = read_header_info,
+                          workers = workers)
+    
+    mask = hindex.select_files(index, slice_reg = slice_reg)
+    
+    if not mask.all():
+        print(f'-- Header index: {np.sum(mask)} out of {len(mfiles)} file(s) are within the temporal limits and will be read')
+    
+    mfiles = [mfiles[k] for k in range(len(mfiles)) if mask[k]]
+    
+    skip_body = hindex.skip_body_mask(index.loc[mask])
+    
+    if skip_body.any():
+        print(f'-- Header index: The body of {np.sum(skip_body)} file(s) with low shots in all channels will not be decoded')
+    
+    return(mfiles, skip_body)
\ No newline at end of file
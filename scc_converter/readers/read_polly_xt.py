@@ -8,9 +8,26 @@ import pandas as pd
 import numpy as np
 import os
 import xarray as xr
+import netCDF4 as nc
+from .workers import run, nc_lock
 
+# Variables read from every file and, additionally, from the first file
+frame_variables = ['raw_signal', 'measurement_shots', 'measurement_time', 
+                   'depol_cal_angle']
 
-def dtfs(dir_meas, meas_type):
+header_variables = ['location_height', 'location_coordinates', 'zenithangle', 
+                    'laser_rep_rate', 'measurement_height_resolution', 
+                    'if_center', 'if_fwhm', 'channel', 'height']
+
+
+def dtfs(dir_meas, meas_type, workers = 1):
+    
+    """ Reads information from the raw polly_xt files. Each file is opened 
+    only once and only the needed variables are read from it (see 
+    open_file). The frame selection, timing, shots, and signals of a file 
+    are read in one go and the file is closed. The signals of all files are 
+    then placed in their time sorted position in a preallocated signal 
+    array. If workers > 1 the files are read concurrently"""
     
     # Setting sig, info, and time as empty lists in the beggining    
     sig_raw = []     
@@ -20,10 +37,6 @@ def dtfs(dir_meas, meas_type):
     system_info = []
     channel_info = []
     
-    list_sig = []
-    list_time = []
-    list_shots = []
-    
     if not(os.path.exists(dir_meas)):
         print('---- Warning : The folder for reading signals does not exist! '+\
               f'Check the input directory! \n Given folder: {dir_meas}')
@@ -36,131 +49,203 @@ def dtfs(dir_meas, meas_type):
         # for existing directory and files inside it, starts the reading of files     
         if len(mfiles) > 0:
             print(f'-- Folder contains {len(mfiles)} file(s)!')
+            
+            parts = len(mfiles) * [None]
+            
+            header = 2 * [None]
+            
+            # Read the selected frames of a single file and close it
+            def scan(k):
+                
+                variables = frame_variables + header_variables * (k == 0)
                 
-            raw_data = xr.open_dataset(mfiles[0])
+                # The netCDF library is not thread safe
+                with nc_lock, open_file(mfiles[k], variables = variables) as raw_data:
+                    
+                    parts[k] = read_frames(raw_data = raw_data, 
+                                           fname = mfiles[k], 
+                                           meas_type = meas_type)
+                    
+                    # Reading the polly_xt file metadatas (header) - only for the first file            
+                    if k == 0:
+                        header[0] = read_meas(raw_data = raw_data)            
+                        header[1] = read_channels(raw_data = raw_data)
             
-            # Reading the polly_xt file metadatas (header) - only for the first file            
-            system_info = read_meas(raw_data = raw_data)            
-            channel_info = read_channels(raw_data = raw_data)
+            # Iterate over the files (serially or with a worker pool)
+            run(scan, n_files = len(mfiles), workers = workers)
+            
+            system_info, channel_info = header
             
             channels = channel_info.index.values
             # bins_arr = np.arange(1., channel_info.bins.max() + 1.)  
             bins_arr = np.arange(0., channel_info.bins.max())  
             
-            for k in range(len(mfiles)):
+            ind_files = [k for k in range(len(mfiles)) if parts[k] != None]
             
-                raw_data = xr.open_dataset(mfiles[k])
-
-                # Mask measurements (normal, +45, -45) according to cal_angle (True:norm or +45 or -45 / False:other)     
-                mask_zer, mask_p45, mask_m45 = \
-                    get_cal_info(pol_cal_angle = raw_data.depol_cal_angle.values, 
-                                 meas_type = meas_type)    
+            if len(ind_files) > 0:
                 
-                filename = np.empty(raw_data.time.size, dtype = object)
-                folder = np.empty(raw_data.time.size, dtype = object)
-                position = np.empty(raw_data.time.size, dtype = object)
+                end_time_arr = np.hstack([parts[k][2] for k in ind_files])
                 
-                filename[:] = os.path.basename(mfiles[k])
+                # Position of each frame in the time sorted arrays
+                order = np.argsort(end_time_arr, kind = 'stable')
                 
-                if meas_type == 'pcb':
-                    mask = (mask_p45) | (mask_m45)
-                    folder[mask_p45] = '+45'
-                    folder[mask_m45] = '-45'
-                    position[mask_p45] = 2
-                    position[mask_m45] = 1                
-                elif meas_type == 'nrm':
-                    mask = mask_zer                    
-                    position[mask_zer] = 0
-                    folder[mask_zer] = 'nrm'
-                else:
-                    mask = mask_zer                    
-                    position[mask_zer] = 0   
-                    
-                if meas_type == 'tlc':
-                    folder[:] = (mfiles[k]).split(os.sep)[-2] 
+                position = np.empty(order.size, dtype = int)
                 
-                if mask.any():
-                    raw_signal = raw_data.raw_signal[mask,:,:].values.astype(float)
-                    raw_shots = raw_data.measurement_shots.values[mask,:]
-                    
-                    position = position[mask]
-                    filename = filename[mask]
-                    folder = folder[mask]
+                position[order] = np.arange(order.size)
+                
+                edges = np.cumsum([0] + [parts[k][2].size for k in ind_files])
+                
+                sig_arr = np.empty((order.size, len(channels), len(bins_arr)), dtype = float)
+                
+                shots_arr = np.concatenate([parts[k][1] for k in ind_files])
+                
+                time_info = pd.concat([parts[k][3] for k in ind_files])
+                
+                # The signals of each file are released once placed
+                for i, k in enumerate(ind_files):
                     
-                    # Convert the time to npdatetime format and mask them
-                    start_time = raw_data.measurement_time
-    
-                    start_time_arr = convert_time_to_npdatetime(start_time) 
+                    sig_arr[position[edges[i]:edges[i+1]],:,:] = parts[k][0]
                     
-                    start_time_arr = start_time_arr[mask]
-    
-                    end_time_arr = start_time_arr + (start_time_arr[1] - start_time_arr[0])
+                    parts[k] = None
                 
-                    # Define signal xarray
-                    sig_f = xr.DataArray(raw_signal, 
-                                       coords=[end_time_arr, bins_arr, channels],
-                                       dims=['time', 'bins', 'channel'])
-                                    
-                    shots_f = xr.DataArray(raw_shots, 
-                                           coords=[end_time_arr, channels],
-                                           dims=['time', 'channel']) 
-    
-                    # Define temporal data pandas Dataframe
-                    if meas_type == 'pcb':
-                        properties = ['folder', 'filename', 
-                                      'start_time', 'end_time', 'position']
-                        tdata = np.array([folder, filename, 
-                                          start_time_arr, end_time_arr, position], 
-                                         dtype = object)
-                        
-                    else:
-                        properties = ['folder', 'filename', 'start_time', 'end_time']
-                        tdata = np.array([folder, filename, 
-                                          start_time_arr, end_time_arr], 
-                                         dtype = object)
-                        
-                    time_info_f = pd.DataFrame(tdata.T,  
-                                               index = end_time_arr,
-                                               columns = properties)  
-                        
-                    # Append the arrays to list in order to concatenate later
-                    list_sig.append(sig_f)
-                    list_shots.append(shots_f)                
-                    list_time.append(time_info_f)
-        
-            if len(list_sig) > 0:
-                # Append in the time dimension all the time frames
-                sig_raw = xr.concat(list_sig, dim='time')
-                shots = xr.concat(list_shots, dim='time')
-                time_info = pd.concat(list_time)
-                
-                # Transpose the dims in [time, channel, bins]            
-                sig_raw = sig_raw.transpose('time','channel','bins')
-                shots = shots.transpose('time','channel')
+                sig_raw = xr.DataArray(sig_arr, 
+                                       coords=[end_time_arr[order], channels, bins_arr],
+                                       dims=['time', 'channel', 'bins'])
+                                
+                shots = xr.DataArray(shots_arr[order,:], 
+                                     coords=[end_time_arr[order], channels],
+                                     dims=['time', 'channel']) 
                 
                 # Sort by time
-                sig_raw = sig_raw.sortby('time').copy()
-                shots = shots.sortby('time').copy()
                 time_info = time_info.sort_index() 
-
+                        
         else:
             print('---- Warning! Folder empty \n'+\
                   f'---> !! Skip reading measurement files from folder {dir_meas}')  
 
     return(system_info, channel_info, time_info, sig_raw, shots)
 
+def open_file(fname, variables):
+    
+    """ Opens a single polly_xt file with only the given variables. The 
+    file is opened once with netCDF4 and wrapped by xarray without the 
+    other variables, so only these are ever read. Use it as a context 
+    manager, the file is closed on exit"""
+    
+    raw_file = nc.Dataset(fname)
+    
+    drop = [var for var in raw_file.variables.keys() if var not in variables]
+    
+    store = xr.backends.NetCDF4DataStore(raw_file)
+    
+    return(xr.open_dataset(store, drop_variables = drop))
+
+def read_frames(raw_data, fname, meas_type):
+    
+    """ Selects the frames of a single polly_xt file that correspond to the 
+    meas_type (normal, +45, -45) and reads their shots and timing. Returns 
+    None if no frame is selected, otherwise the signals (time, channel, 
+    bins), the shots, the end time of each frame, and the temporal 
+    information dataframe"""
+    
+    # Mask measurements (normal, +45, -45) according to cal_angle (True:norm or +45 or -45 / False:other)     
+    mask_zer, mask_p45, mask_m45 = \
+        get_cal_info(pol_cal_angle = raw_data.depol_cal_angle.values, 
+                     meas_type = meas_type)    
+    
+    filename = np.empty(raw_data.time.size, dtype = object)
+    folder = np.empty(raw_data.time.size, dtype = object)
+    position = np.empty(raw_data.time.size, dtype = object)
+    
+    filename[:] = os.path.basename(fname)
+    
+    if meas_type == 'pcb':
+        mask = (mask_p45) | (mask_m45)
+        folder[mask_p45] = '+45'
+        folder[mask_m45] = '-45'
+        position[mask_p45] = 2
+        position[mask_m45] = 1                
+    elif meas_type == 'nrm':
+        mask = mask_zer                    
+        position[mask_zer] = 0
+        folder[mask_zer] = 'nrm'
+    else:
+        mask = mask_zer                    
+        position[mask_zer] = 0   
+        
+    if meas_type == 'tlc':
+        folder[:] = fname.split(os.sep)[-2] 
+    
+    frames = None
+    
+    if mask.any():
+        raw_signal = np.transpose(raw_data.raw_signal[mask,:,:].values, (0, 2, 1))
+        
+        raw_shots = raw_data.measurement_shots.values[mask,:]
+        
+        position = position[mask]
+        filename = filename[mask]
+        folder = folder[mask]
+        
+        # Convert the time to npdatetime format and mask them
+        start_time = raw_data.measurement_time
+
+        start_time_arr = convert_time_to_npdatetime(start_time) 
+        
+        start_time_arr = start_time_arr[mask]
+
+        end_time_arr = start_time_arr + (start_time_arr[1] - start_time_arr[0])
+
+        # Define temporal data pandas Dataframe
+        if meas_type == 'pcb':
+            properties = ['folder', 'filename', 
+                          'start_time', 'end_time', 'position']
+            tdata = np.array([folder, filename, 
+                              start_time_arr, end_time_arr, position], 
+                             dtype = object)
+            
+        else:
+            properties = ['folder', 'filename', 'start_time', 'end_time']
+            tdata = np.array([folder, filename, 
+                              start_time_arr, end_time_arr], 
+                             dtype = object)
+            
+        time_info_f = pd.DataFrame(tdata.T,  
+                                   index = end_time_arr,
+                                   columns = properties)  
+        
+        frames = (raw_signal, raw_shots, end_time_arr, time_info_f)
+        
+    return(frames)
+
 def convert_time_to_npdatetime(time):
+    
+    """ Converts the polly_xt measurement_time array [times, 2] with the 
+    date (yyyymmdd) and the second of day of each frame to numpy datetimes. 
+    The conversion uses array arithmetic for all frames at once and 
+    truncates to full seconds"""
+    
     # meas_time: 2d array : [times, 2], 2: [yyyymmdd, second of day]
-    frames = time.shape[0]
-    time_dt = []
+    time = np.asarray(time)
+    
+    date = time[:,0].astype(int)
+    
+    year = date // 10000
+    month = (date // 100) % 100
+    day = date % 100
+
+    days = (year - 1970).astype('datetime64[Y]') + \
+        (month - 1).astype('timedelta64[M]')
+        
+    days = days.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    
+    hr = np.divide(time[:,1],(60*60)); minute = (hr - np.fix(hr))*60; sec = (minute - np.fix(minute))*60
+    
+    seconds = 3600 * np.fix(hr) + 60 * np.fix(minute) + np.fix(sec)
     
-    for i in range(frames): 
-        temp_str = str(time.values[i][0])
-        hr = np.divide(time.values[i][1],(60*60)); minute = (hr - np.fix(hr))*60; sec = (minute - np.fix(minute))*60
-        date = temp_str[0:4]+'-'+temp_str[4:6]+'-'+temp_str[6:8]+'T'+"%02d" %np.fix(hr)+':'+"%02d" %np.fix(minute)+':'+"%02d" %np.fix(sec)
-        time_dt.append(np.datetime64(date))
+    time_dt = days.astype('datetime64[s]') + seconds.astype(int).astype('timedelta64[s]')
     
-    return(np.array(time_dt))
+    return(time_dt)
 
 def read_meas(raw_data):
 
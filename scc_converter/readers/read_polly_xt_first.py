@@ -8,9 +8,21 @@ import pandas as pd
 import numpy as np
 import os
 import xarray as xr
+from .workers import run, nc_lock
+from .read_polly_xt import convert_time_to_npdatetime, open_file, header_variables
 
+# Variables read from every file and, additionally, from the first file
+frame_variables = ['raw_signal', 'measurement_shots', 'measurement_time']
 
-def dtfs(dir_meas):
+
+def dtfs(dir_meas, workers = 1):
+    
+    """ Reads information from the raw polly_xt_first files. Each file is 
+    opened only once and only the needed variables are read from it (see 
+    read_polly_xt.open_file). The timing, shots, and signals of a file are 
+    read in one go and the file is closed. The signals of all files are 
+    then placed in their time sorted position in a preallocated signal 
+    array. If workers > 1 the files are read concurrently"""
     
     # Setting sig, info, and time as empty lists in the beggining    
     sig_raw = []     
@@ -20,10 +32,6 @@ def dtfs(dir_meas):
     system_info = []
     channel_info = []
     
-    list_sig = []
-    list_time = []
-    list_shots = []
-    
     if not(os.path.exists(dir_meas)):
         print('---- Warning : The folder for reading signals does not exist! '+\
               f'Check the input directory! \n Given folder: {dir_meas}')
@@ -36,75 +44,69 @@ def dtfs(dir_meas):
         # for existing directory and files inside it, starts the reading of files     
         if len(mfiles) > 0:
             print(f'-- Folder contains {len(mfiles)} file(s)!')
+            
+            parts = len(mfiles) * [None]
+            
+            header = 2 * [None]
+            
+            # Read all the frames of a single file and close it
+            def scan(k):
+                
+                variables = frame_variables + header_variables * (k == 0)
                 
-            raw_data = xr.open_dataset(mfiles[0])
+                # The netCDF library is not thread safe
+                with nc_lock, open_file(mfiles[k], variables = variables) as raw_data:
+                    
+                    parts[k] = read_frames(raw_data = raw_data, 
+                                           fname = mfiles[k])
+                    
+                    # Reading the polly_xt file metadatas (header) - only for the first file            
+                    if k == 0:
+                        header[0] = read_meas(raw_data = raw_data)            
+                        header[1] = read_channels(raw_data = raw_data)
+            
+            # Iterate over the files (serially or with a worker pool)
+            run(scan, n_files = len(mfiles), workers = workers)
             
-            # Reading the polly_xt file metadatas (header) - only for the first file            
-            system_info = read_meas(raw_data = raw_data)            
-            channel_info = read_channels(raw_data = raw_data)
+            system_info, channel_info = header
             
             channels = channel_info.index.values
             # bins_arr = np.arange(1., channel_info.bins.max() + 1.)  
             bins_arr = np.arange(0., channel_info.bins.max())  
             
-            for k in range(len(mfiles)):
+            end_time_arr = np.hstack([part[2] for part in parts])
             
-                raw_data = xr.open_dataset(mfiles[k])
-                
-                filename = np.empty(raw_data.time.size, dtype = object)
-                folder = np.empty(raw_data.time.size, dtype = object)
-                
-                filename[:] = os.path.basename(mfiles[k])
+            # Position of each frame in the time sorted arrays
+            order = np.argsort(end_time_arr, kind = 'stable')
             
-                raw_signal = raw_data.raw_signal.values.astype(float)
-                raw_shots = raw_data.measurement_shots.values
-                
-                # Convert the time to npdatetime format and mask them
-                start_time = raw_data.measurement_time
-
-                start_time_arr = convert_time_to_npdatetime(start_time) 
-                
-                end_time_arr = start_time_arr + (start_time_arr[1] - start_time_arr[0])
+            position = np.empty(order.size, dtype = int)
             
-                if (mfiles[k]).split(os.sep)[-2] in ['north', 'east', 'south', 'west', 'inner', 'outer', '+45', '-45', 'static']:
-                    folder[k] = (mfiles[k]).split(os.sep)[-2]
+            position[order] = np.arange(order.size)
             
-                # Define signal xarray
-                sig_f = xr.DataArray(raw_signal, 
-                                   coords=[end_time_arr, bins_arr, channels],
-                                   dims=['time', 'bins', 'channel'])
-                                
-                shots_f = xr.DataArray(raw_shots, 
-                                       coords=[end_time_arr, channels],
-                                       dims=['time', 'channel']) 
-
-                # Define temporal data pandas Dataframe
-                tdata = np.array([folder, filename, 
-                                  start_time_arr, end_time_arr], dtype = object)
-                   
-                properties = ['folder', 'filename', 'start_time', 'end_time']
-
-                time_info_f = pd.DataFrame(tdata.T,  
-                                           index = end_time_arr,
-                                           columns = properties)  
-                    
-                # Append the arrays to list in order to concatenate later
-                list_sig.append(sig_f)
-                list_shots.append(shots_f)                
-                list_time.append(time_info_f)
-        
-            # Append in the time dimension all the time frames
-            sig_raw = xr.concat(list_sig, dim='time')
-            shots = xr.concat(list_shots, dim='time')
-            time_info = pd.concat(list_time)
+            edges = np.cumsum([0] + [part[2].size for part in parts])
             
-            # Transpose the dims in [time, channel, bins]            
-            sig_raw = sig_raw.transpose('time','channel','bins')
-            shots = shots.transpose('time','channel')
+            sig_arr = np.empty((order.size, len(channels), len(bins_arr)), dtype = float)
+            
+            shots_arr = np.concatenate([part[1] for part in parts])
+            
+            time_info = pd.concat([part[3] for part in parts])
+            
+            # The signals of each file are released once placed
+            for k in range(len(mfiles)):
+                
+                sig_arr[position[edges[k]:edges[k+1]],:,:] = parts[k][0]
+                
+                parts[k] = None
+            
+            sig_raw = xr.DataArray(sig_arr, 
+                                   coords=[end_time_arr[order], channels, bins_arr],
+                                   dims=['time', 'channel', 'bins'])
+                            
+            shots = xr.DataArray(shots_arr[order,:], 
+                                 coords=[end_time_arr[order], channels],
+                                 dims=['time', 'channel']) 
             
             # Sort by time
-            sig_raw = sig_raw.sortby('time').copy()
-            shots = shots.sortby('time').copy()
             time_info = time_info.sort_index() 
 
         else:
@@ -113,18 +115,43 @@ def dtfs(dir_meas):
 
     return(system_info, channel_info, time_info, sig_raw, shots)
 
-def convert_time_to_npdatetime(time):
-    # meas_time: 2d array : [times, 2], 2: [yyyymmdd, second of day]
-    frames = time.shape[0]
-    time_dt = []
-    
-    for i in range(frames): 
-        temp_str = str(time.values[i][0])
-        hr = np.divide(time.values[i][1],(60*60)); minute = (hr - np.fix(hr))*60; sec = (minute - np.fix(minute))*60
-        date = temp_str[0:4]+'-'+temp_str[4:6]+'-'+temp_str[6:8]+'T'+"%02d" %np.fix(hr)+':'+"%02d" %np.fix(minute)+':'+"%02d" %np.fix(sec)
-        time_dt.append(np.datetime64(date))
-    
-    return(np.array(time_dt))
+def read_frames(raw_data, fname):
+    
+    """ Reads the signals, shots, and timing of all frames of a single 
+    polly_xt_first file. Returns the signals (time, channel, bins), the 
+    shots, the end time of each frame, and the temporal information 
+    dataframe"""
+    
+    filename = np.empty(raw_data.time.size, dtype = object)
+    folder = np.empty(raw_data.time.size, dtype = object)
+    
+    filename[:] = os.path.basename(fname)
+
+    raw_signal = np.transpose(raw_data.raw_signal.values, (0, 2, 1))
+    
+    raw_shots = raw_data.measurement_shots.values
+    
+    # Convert the time to npdatetime format and mask them
+    start_time = raw_data.measurement_time
+
+    start_time_arr = convert_time_to_npdatetime(start_time) 
+    
+    end_time_arr = start_time_arr + (start_time_arr[1] - start_time_arr[0])
+
+    if fname.split(os.sep)[-2] in ['north', 'east', 'south', 'west', 'inner', 'outer', '+45', '-45', 'static']:
+        folder[:] = fname.split(os.sep)[-2]
+
+    # Define temporal data pandas Dataframe
+    tdata = np.array([folder, filename, 
+                      start_time_arr, end_time_arr], dtype = object)
+       
+    properties = ['folder', 'filename', 'start_time', 'end_time']
+
+    time_info_f = pd.DataFrame(tdata.T,  
+                               index = end_time_arr,
+                               columns = properties)  
+    
+    return(raw_signal, raw_shots, end_time_arr, time_info_f)
 
 def read_meas(raw_data):
 
@@ -0,0 +1,53 @@
+"""
+@author: N. Siomos
+
+Worker pool utilities shared by the raw file readers
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# The netCDF/HDF5 library is not thread safe, the readers of netCDF raw 
+# files hold this lock while a file is open
+nc_lock = threading.Lock()
+
+# Minimum number of files per worker below which the pool is not worth it
+min_files_per_worker = 10
+
+def n_workers(workers, n_files, min_per_worker = min_files_per_worker):
+
+    """ Returns the number of workers that will actually be used for reading
+    n_files. Falls back to 1 (serial reading) for small folders, where the
+    pool start up costs more than it saves"""
+
+    if workers == None or workers < 1:
+        workers = 1
+
+    workers = min(workers, n_files // min_per_worker)
+
+    return(max(workers, 1))
+
+def run(func, n_files, workers = 1, min_per_worker = min_files_per_worker):
+
+    """ Calls func(k) for every file index k in range(n_files).
+
+    func is expected to store its results in arrays that were preallocated
+    by the caller at index k, so the output order is always the file order
+    and does not depend on the number of workers. If workers > 1 the files
+    are decoded concurrently by a thread pool. File reading and the numpy
+    decoding release the GIL, so threads are sufficient and the decoded
+    arrays do not have to be copied between processes. Any exception raised
+    while reading a file is propagated to the caller. min_per_worker can be
+    lowered for tasks that are heavier than a single file (e.g. folders)"""
+
+    workers = n_workers(workers, n_files, min_per_worker = min_per_worker)
+
+    if workers == 1:
+        for k in range(n_files):
+            func(k)
+    else:
+        print(f'-- Reading files with {workers} workers')
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            # Consume the iterator in order to propagate exceptions
+            list(pool.map(func, range(n_files)))
+
+    return()
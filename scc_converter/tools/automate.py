@@ -3,7 +3,6 @@
 """
 import os, sys
 import numpy as np
-import xarray as xr
 import pandas as pd
 
 def get_meas_type(args):
@@ -199,34 +198,40 @@ def detect_overflows(sig, shots, channel_info, time_info, meas_type, method = 0)
 
     filename = time_info.filename
         
-    # Get an overflow mask for each bin
-    mask = get_overflow_mask(sig, acquisition_mode, daq_range)
+    # Get the indexes of the overflowed bins
+    ovf_ind = get_overflows(sig, acquisition_mode, daq_range)
+    
+    found = ovf_ind.shape[0] > 0
+    
+    # One row per timeframe and channel with overflows
+    summary = overflow_summary(sig = sig, ovf_ind = ovf_ind, 
+                               filename = filename)
 
-    if method == 0 and mask.any(): # Detect the problematic profiles and raise error
+    if method == 0 and found: # Detect the problematic profiles and raise error
 
-        overflow_method_0(mask = mask, filename = filename)
+        overflow_method_0(summary = summary)
             
-    elif method == 1 and mask.any(): # Remove the problematic profiles
+    elif method == 1 and found: # Remove the problematic profiles
     
-        sig, shots, time_info = overflow_method_1(sig = sig.copy(), 
-                                                  shots = shots.copy(),
+        sig, shots, time_info = overflow_method_1(sig = sig, 
+                                                  shots = shots,
                                                   time_info = time_info, 
-                                                  mask = mask, 
+                                                  summary = summary, 
                                                   filename = filename)
         print("Profiles with overflowed bin were succesfully removed!")
         
-    elif method == 2 and mask.any(): # Replace the overflowed values with interpolated ones from the nearby bins
+    elif method == 2 and found: # Replace the overflowed values with interpolated ones from the nearby bins
         
         sig = overflow_method_2(sig = sig.copy(), 
-                                mask = mask, 
-                                filename = filename)
+                                ovf_ind = ovf_ind, 
+                                summary = summary)
         print("Overflowed were succesfully replaced!")
     
-    elif method == 3 and mask.any():
+    elif method == 3 and found:
 
         print("-- Warning: Overflows were detected but no action has been performed! Use trim_overflows to 3 only when debugging!")
 
-    elif not mask.any():
+    elif not found:
         
         print("No bins with overflows have been encountered!")
     
@@ -236,89 +241,120 @@ def detect_overflows(sig, shots, channel_info, time_info, meas_type, method = 0)
 
     return(sig, shots, time_info)
 
-def get_overflow_mask(sig, acquisition_mode, daq_range):
+def get_overflows(sig, acquisition_mode, daq_range):
+
+    """Detects the overflowed bins by comparing the signal against per 
+    channel thresholds: 2^15 summed counts for the photon channels and the 
+    data acquisition range (upper) and 0 (lower) for the analog channels. 
+    The maximum and minimum of each profile are compared first, so only the
+    bins of the affected profiles are checked individually. Returns the 
+    (time, channel, bins) indexes of the overflowed bins as an (N, 3) 
+    integer array, sorted in time, channel, and bins order"""
 
     channels = sig.channel.values
     
-    time = sig.time.values
-
-    bins = sig.bins.values
+    mode = acquisition_mode.loc[channels].values
     
-    mask = xr.DataArray(np.zeros([time.size, channels.size, bins.size], 
-                                 dtype = bool),
-                        dims = ['time','channel', 'bins'],
-                        coords = [time, channels, bins])
+    max_mV = daq_range.loc[channels].values.astype(float)
     
-    for ch in channels:
-
-        ch_d = dict(channel = ch)
-
-        if acquisition_mode.loc[ch] == 1: #3rd digit of channel name is the acquisition mode (a or p)
+    upper = np.inf * np.ones(channels.size)
+    
+    lower = -np.inf * np.ones(channels.size)
+    
+    upper[mode == 1] = np.power(2.,15)
+    
+    upper[mode == 0] = max_mV[mode == 0]
+    
+    lower[mode == 0] = 0.
+    
+    values = sig.values
+    
+    # Profile extremes, nans are ignored
+    with np.errstate(invalid = 'ignore'):
+        mask_p = (np.fmax.reduce(values, axis = 2) >= upper[np.newaxis, :]) | \
+            (np.fmin.reduce(values, axis = 2) <= lower[np.newaxis, :])
+    
+    t_ind, c_ind = np.nonzero(mask_p)
+    
+    # Check the bins of the affected profiles only
+    with np.errstate(invalid = 'ignore'):
+        mask = (values[t_ind, c_ind, :] >= upper[c_ind, np.newaxis]) | \
+            (values[t_ind, c_ind, :] <= lower[c_ind, np.newaxis])
+    
+    p_ind, b_ind = np.nonzero(mask)
+    
+    ovf_ind = np.column_stack([t_ind[p_ind], c_ind[p_ind], b_ind])
+    
+    for j in np.unique(ovf_ind[:,1]):
         
-            max_count = np.power(2.,15)
-
-            crit = (sig.loc[ch_d] >= max_count)
-            
-            if crit.any():
-                print(f"-- Warning: Channel {ch} - Photon signal count values above the maximum allowed summed counts were detected! ")
-
-                mask.loc[ch_d] = crit.values                                           
+        if mode[j] == 1:
+            print(f"-- Warning: Channel {channels[j]} - Photon signal count values above the maximum allowed summed counts were detected! ")
 
-        if acquisition_mode.loc[ch] == 0: #3rd digit of channel name is the acquisition mode (a or p)
+        if mode[j] == 0:
+            print(f"-- Warning: Channel {channels[j]} - Analog signal mV values above the data acqusition range or below 0. were detected! ")
+    
+    return(ovf_ind)
 
-            max_mV = daq_range.loc[ch]
-        
-            crit = (sig.loc[ch_d] >= max_mV) | (sig.loc[ch_d] <= 0.)
-            
-            if crit.any():
-                print(f"-- Warning: Channel {ch} - Analog signal mV values above the data acqusition range or below 0. were detected! ")
+def overflow_summary(sig, ovf_ind, filename):
 
-                mask.loc[ch_d] = crit.values
+    """Groups the overflowed bins per timeframe and channel. Returns a 
+    pandas DataFrame with one row per affected profile and the columns: 
+    time_index, channel_index, filename, channel, overflows (number of 
+    overflowed bins), and bins (the overflowed bins)"""
     
-    return(mask)
-
-def overflow_method_0(mask, filename):
+    columns = ['time_index', 'channel_index', 'filename', 'channel', 
+               'overflows', 'bins']
     
-    time = mask.time.values
+    if ovf_ind.shape[0] == 0:
+        return(pd.DataFrame(columns = columns))
     
-    channels = mask.channel.values
+    time = sig.time.values
     
-    bins = mask.bins.values
+    channels = sig.channel.values
     
-    # use the index and not the time....
-    if mask.any():
-        
-        print("-- Error at least one bin with an overflow was detected. ")
-        print("-- Please revise the following bins: ")
+    bins = sig.bins.values
+    
+    # Start of each (time, channel) group in the sorted overflow indexes
+    new_group = np.any(np.diff(ovf_ind[:,:2], axis = 0) != 0, axis = 1)
+    
+    start = np.hstack([0, np.where(new_group)[0] + 1])
+    
+    t_ind = ovf_ind[start, 0]
+    
+    c_ind = ovf_ind[start, 1]
+    
+    summary = pd.DataFrame({'time_index' : t_ind,
+                            'channel_index' : c_ind,
+                            'filename' : [filename[t] for t in time[t_ind]],
+                            'channel' : channels[c_ind],
+                            'overflows' : np.diff(np.hstack([start, ovf_ind.shape[0]])),
+                            'bins' : np.split(bins[ovf_ind[:,2]].astype(int), start[1:])},
+                           columns = columns)
+    
+    return(summary)
+
+def overflow_method_0(summary):
+    
+    print("-- Error at least one bin with an overflow was detected. ")
+    print("-- Please revise the following bins: ")
+    
+    for i in range(len(summary.index)):
         
-        mask_t = mask.any(dim = 'bins').any(dim = 'channel').values
-                    
-        time_ovf = time[mask_t]
-                    
-        for t in time_ovf:
-            filename_ovf = filename[t]
-            
-            t_d = dict(time = t)
-                            
-            ch_ovf = channels[mask.any(dim = 'bins').loc[t_d].values]
-            
-            for ch in ch_ovf:
-            
-                ch_d = dict(channel = ch)
-                
-                bins_ovf = bins[mask.loc[t_d].loc[ch_d].values].astype(int)
-                
-                print(f"    file: {filename_ovf} | ch: {ch} | bins: {bins_ovf}")
+        row = summary.iloc[i]
         
-        raise Exception("-- Error: In order to continue with an automated overflow removal use the trim_overflow argument with value 1 or 2 (default is 0) ")
+        print(f"    file: {row.filename} | ch: {row.channel} | bins: {row.bins}")
+    
+    raise Exception("-- Error: In order to continue with an automated overflow removal use the trim_overflow argument with value 1 or 2 (default is 0) ")
         
     return()
 
-def overflow_method_1(sig, shots, time_info, mask, filename):
+def overflow_method_1(sig, shots, time_info, summary, filename):
 
-    time = mask.time.values
+    time = sig.time.values
+    
+    mask_t = np.zeros(time.size, dtype = bool)
     
-    mask_t = mask.any(dim = 'bins').any(dim = 'channel').values
+    mask_t[summary.time_index.values] = True
 
     print(f"-- Warning: {np.sum(mask_t)} profiles with at least one overflowed bin have been detected ")
     print("-- Warning: trim_overflows = 1: The following profiles have been removed ")
@@ -334,31 +370,43 @@ def overflow_method_1(sig, shots, time_info, mask, filename):
 
     time_d = dict(time = time_cor)
     
-    sig_out = sig.copy().loc[time_d] 
+    sig_out = sig.loc[time_d] 
 
-    shots_out = shots.copy().loc[time_d] 
+    shots_out = shots.loc[time_d] 
     
     time_info = time_info.loc[time_cor,:]
     
     return(sig_out, shots_out, time_info)
 
-def overflow_method_2(sig, mask, filename):
-
-    mask_t = mask.any(dim = 'bins').any(dim = 'channel').values
+def overflow_method_2(sig, ovf_ind, summary):
 
-    ovfs = mask.sum(dim = 'bins')
+    """Replaces the overflowed bins with values linearly interpolated from
+    the surrounding bins. Only the affected profiles are interpolated"""
 
-    print(f"-- Warning: {np.sum(mask_t)} profiles with at least one overflowed bin have been detected ")
+    print(f"-- Warning: {np.unique(summary.time_index.values).size} profiles with at least one overflowed bin have been detected ")
     print("-- Warning: trim_overflows = 2: Will attempt to replace the overflows ")
           
-    if (ovfs > 100).any():
+    if (summary.overflows.values > 100).any():
         print("-- Warning: More that 100 overflowed bins encountered in single profiles... Interpolation is too risky, please revise the input files or consider switching to --trim_overflows 2 ")
     
-    sig = sig.copy().where(~mask)
+    values = sig.values
+    
+    values[ovf_ind[:,0], ovf_ind[:,1], ovf_ind[:,2]] = np.nan
     
-    sig_out = sig.copy().interpolate_na(dim = "bins", method = "linear")
+    x = sig.bins.values
+    
+    for t, j in zip(summary.time_index.values, summary.channel_index.values):
+        
+        y = values[t, j, :]
+        
+        nans = np.isnan(y)
+        
+        if nans.all():
+            continue
+        
+        y[nans] = np.interp(x[nans], x[~nans], y[~nans], 
+                            left = np.nan, right = np.nan)
 
-    print(f"-- Warning: {np.sum(mask).values} overflows have been replaced by interpolating across the bins ")
+    print(f"-- Warning: {ovf_ind.shape[0]} overflows have been replaced by interpolating across the bins ")
     
-    return(sig_out)
-  
\ No newline at end of file
+    return(sig)
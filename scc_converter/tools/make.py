@@ -7,12 +7,14 @@ Created on Tue Jul 26 15:32:07 2022
 """
 
 import os, sys
+from datetime import datetime
 import netCDF4 as nc
 import numpy as np
 
 def rayleigh_file(system_info, channel_info, time_info, time_info_d, nc_path,
                   meas_ID, sig, sig_d, shots, shots_d, 
-                  P = None, T = None, radiosonde_file = None):
+                  P = None, T = None, radiosonde_file = None, unlimited = False,
+                  compression_level = 0, chunking = None):
 
     print('-----------------------------------------')
     print('Start exporting to a Rayleigh QA file...')
@@ -20,7 +22,10 @@ def rayleigh_file(system_info, channel_info, time_info, time_info_d, nc_path,
     
     """Creates the rayleigh netcdf file according to the SCC format 
     https://docs.scc.imaa.cnr.it/en/latest/file_formats/netcdf_file.html
-    and exports it to nc_path"""
+    and exports it to nc_path. If unlimited is True the time dimension is 
+    created as unlimited so that new frames can be appended later with 
+    append_rayleigh_file. The compression_level and chunking arguments 
+    control the storage of the signal variables (see storage_options)"""
             
     n_time = sig.time.size
     n_channels = sig.channel.size
@@ -71,7 +76,10 @@ def rayleigh_file(system_info, channel_info, time_info, time_info_d, nc_path,
     ds = nc.Dataset(nc_path,mode='w')
 
 # Adding Dimensions    
-    ds.createDimension('time', n_time)
+    if unlimited:
+        ds.createDimension('time', None)
+    else:
+        ds.createDimension('time', n_time)
     ds.createDimension('channels', n_channels)
     ds.createDimension('points', n_points)
     ds.createDimension('nb_of_time_scales', n_nb_of_time_scales)
@@ -146,7 +154,7 @@ def rayleigh_file(system_info, channel_info, time_info, time_info_d, nc_path,
     make_nc_var(ds, name = 'Background_High', value = channel_info.background_high.values, dtype = 'float', dims = ('channels',))
         
     if not isinstance(sig_d,list):
-        make_nc_var(ds, name = 'Background_Profile', value = sig_d.values, dtype = 'float', dims = ('time_bck', 'channels', 'points',))
+        make_nc_var(ds, name = 'Background_Profile', value = sig_d.values, dtype = 'float', dims = ('time_bck', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
 
     make_nc_var(ds, name = 'channel_ID', value = channel_info.scc_channel_id.values, dtype = 'int', dims = ('channels',))
 
@@ -184,7 +192,7 @@ def rayleigh_file(system_info, channel_info, time_info, time_info_d, nc_path,
     if not isinstance(sig_d,list):
         make_nc_var(ds, name = 'Background_Shots', value = shots_d.values, dtype = 'int', dims = ('time_bck', 'channels',))
     
-    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',))
+    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
     
     make_nc_var(ds, name = 'Raw_Data_Range_Resolution', value = channel_info.range_resolution.values, dtype = 'float', dims = ('channels',))
     
@@ -220,8 +228,102 @@ def rayleigh_file(system_info, channel_info, time_info, time_info_d, nc_path,
     
     return()
 
+def append_rayleigh_file(channel_info, time_info, nc_path, sig, shots):
+
+    print('-----------------------------------------')
+    print('Start appending to a Rayleigh QA file...')
+    print('-----------------------------------------')
+    
+    """Appends new timeframes to an existing rayleigh netcdf file that was
+    created by rayleigh_file with an unlimited time dimension. Only the time
+    dependent variables (Raw_Lidar_Data, Laser_Shots, Raw_Data_Start_Time, 
+    Raw_Data_Stop_Time, Filename, Laser_Pointing_Angle_of_Profiles) and the
+    RawData_Stop_Time_UT attribute are updated"""
+
+    n_time = sig.time.size
+    n_nb_of_time_scales = 1
+    
+    ds = nc.Dataset(nc_path,mode='a')
+    
+    if ds.dimensions['channels'].size != sig.channel.size or \
+        ds.dimensions['points'].size != sig.bins.size or \
+            (ds.variables['channel_ID'][:] != channel_info.scc_channel_id.values.astype(int)).any():
+        ds.close()
+        raise Exception(f"-- Error: The channels of the new raw files do not match the channels of the existing QA file {nc_path}. Please remove the QA file or run the converter without the --append option ")
+
+    n_char_fname = ds.dimensions['nchar_filename'].size
+
+    if any(len(fname) > n_char_fname for fname in time_info.filename.values):
+        ds.close()
+        raise Exception(f"-- Error: The filenames of the new raw files are longer than the ones of the existing QA file {nc_path}. Please remove the QA file or run the converter without the --append option ")
+
+    # Start and stop times are relative to the start of the first timeframe
+    start_ref = datetime.strptime(ds.RawData_Start_Date + ds.RawData_Start_Time_UT, '%Y%m%d%H%M%S')
+
+    start_time = [np.datetime64(t,'us').item() for t in time_info['start_time']]
+    end_time = [np.datetime64(t,'us').item() for t in time_info['end_time']]
+    
+    start_t = [int((dt - start_ref).total_seconds()) for dt in start_time]
+    end_t = [int((dt - start_ref).total_seconds()) for dt in end_time]
+        
+    Raw_Start_Time = np.nan * np.zeros([n_time,n_nb_of_time_scales])
+    Raw_Stop_Time = np.nan * np.zeros([n_time,n_nb_of_time_scales])
+    
+    Raw_Start_Time[:,0] = start_t
+    Raw_Stop_Time[:,0] = end_t
+    
+    n_start = ds.dimensions['time'].size
+
+# Updating Global Parameters
+    ds.RawData_Stop_Time_UT = end_time[-1].strftime('%H%M%S');
+
+# Appending to Variables
+    append_nc_str(ds, name = 'Filename', value = time_info.filename.values, n_start = n_start, length = n_char_fname)    
+
+    append_nc_var(ds, name = 'Laser_Pointing_Angle_of_Profiles', value = np.zeros([n_time, n_nb_of_time_scales]), dtype = 'int', n_start = n_start)
+
+    append_nc_var(ds, name = 'Laser_Shots', value = shots.values, dtype = 'int', n_start = n_start)
+
+    append_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', n_start = n_start)
+
+    append_nc_var(ds, name = 'Raw_Data_Start_Time', value = Raw_Start_Time, dtype = 'int', n_start = n_start)
+    
+    append_nc_var(ds, name = 'Raw_Data_Stop_Time', value = Raw_Stop_Time, dtype = 'int', n_start = n_start)
+
+    ds.close()
+    
+    print(f'-- {n_time} new timeframe(s) appended. The QA file now contains {n_start + n_time} timeframe(s)')
+
+    return()
+
+def stored_frames(nc_path):
+    
+    """Returns the raw filenames and the radiosonde filename stored in an 
+    existing rayleigh netcdf file that can be extended with 
+    append_rayleigh_file. Returns None if the file does not exist or if its
+    time dimension is not unlimited"""
+    
+    stored = None
+    
+    if os.path.exists(nc_path):
+        
+        ds = nc.Dataset(nc_path,mode='r')
+        
+        if ds.dimensions['time'].isunlimited():
+            
+            filename = nc.chartostring(ds.variables['Filename'][:]).astype(str)
+            
+            sounding_file = getattr(ds, 'Sounding_File_Name', None)
+            
+            stored = (filename, sounding_file)
+            
+        ds.close()
+        
+    return(stored)
+
 def telecover_file(system_info, channel_info, time_info, time_info_d, nc_path, 
-                   meas_ID, sig, sig_d, shots, shots_d):
+                   meas_ID, sig, sig_d, shots, shots_d, 
+                   compression_level = 0, chunking = None):
 
     print('-----------------------------------------')
     print('Start exporting to a Telecover QA file...')
@@ -229,7 +331,8 @@ def telecover_file(system_info, channel_info, time_info, time_info_d, nc_path,
 
     """Creates the telecover netcdf file according to the SCC format 
     https://docs.scc.imaa.cnr.it/en/latest/file_formats/netcdf_file.html
-    and exports it to nc_path"""
+    and exports it to nc_path. The compression_level and chunking arguments 
+    control the storage of the signal variables (see storage_options)"""
             
     n_time = sig.time.size
     n_channels = sig.channel.size
@@ -351,7 +454,7 @@ def telecover_file(system_info, channel_info, time_info, time_info_d, nc_path,
     make_nc_var(ds, name = 'Background_High', value = channel_info.background_high.values, dtype = 'float', dims = ('channels',))
         
     if not isinstance(sig_d,list):
-        make_nc_var(ds, name = 'Background_Profile', value = sig_d.values, dtype = 'float', dims = ('time_bck', 'channels', 'points',))
+        make_nc_var(ds, name = 'Background_Profile', value = sig_d.values, dtype = 'float', dims = ('time_bck', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
 
     make_nc_var(ds, name = 'channel_ID', value = channel_info.scc_channel_id.values, dtype = 'int', dims = ('channels',))
 
@@ -395,7 +498,7 @@ def telecover_file(system_info, channel_info, time_info, time_info_d, nc_path,
     if not isinstance(sig_d,list):
         make_nc_var(ds, name = 'Background_Shots', value = shots_d.values, dtype = 'int', dims = ('time_bck', 'channels',))
     
-    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',))
+    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
     
     make_nc_var(ds, name = 'Raw_Data_Range_Resolution', value = channel_info.range_resolution.values, dtype = 'float', dims = ('channels',))
     
@@ -417,7 +520,8 @@ def telecover_file(system_info, channel_info, time_info, time_info_d, nc_path,
 def polarization_calibration_file(
         system_info, channel_info, time_info, time_info_d, nc_path,
         meas_ID, sig, sig_d, shots, shots_d, molecular_calc = [], 
-        P = [], T = [], radiosonde_file = None, rayleigh = []):
+        P = [], T = [], radiosonde_file = None, rayleigh = [],
+        compression_level = 0, chunking = None):
 
     print('-----------------------------------------')
     print('Start exporting to a Calibration QA file...')
@@ -425,7 +529,8 @@ def polarization_calibration_file(
     
     """Creates the polarization calibration netcdf file according to the SCC format 
     https://docs.scc.imaa.cnr.it/en/latest/file_formats/netcdf_file.html
-    and exports it to nc_path"""
+    and exports it to nc_path. The compression_level and chunking arguments 
+    control the storage of the signal variables (see storage_options)"""
         
     
     n_time = sig.time.size
@@ -547,7 +652,7 @@ def polarization_calibration_file(
     make_nc_var(ds, name = 'Background_High', value = channel_info.background_high.values, dtype = 'float', dims = ('channels',))
         
     if not isinstance(sig_d,list):
-        make_nc_var(ds, name = 'Background_Profile', value = sig_d.values, dtype = 'float', dims = ('time_bck', 'channels', 'points',))
+        make_nc_var(ds, name = 'Background_Profile', value = sig_d.values, dtype = 'float', dims = ('time_bck', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
 
     make_nc_var(ds, name = 'channel_ID', value = channel_info.scc_channel_id.values, dtype = 'int', dims = ('channels',))
 
@@ -585,7 +690,7 @@ def polarization_calibration_file(
     if not isinstance(sig_d,list):
         make_nc_var(ds, name = 'Background_Shots', value = shots_d.values, dtype = 'int', dims = ('time_bck', 'channels',))
     
-    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',))
+    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
     
     make_nc_var(ds, name = 'Raw_Data_Range_Resolution', value = channel_info.range_resolution.values, dtype = 'float', dims = ('channels',))
     
@@ -627,7 +732,7 @@ def polarization_calibration_file(
     return()
 
 def dark_file(system_info, channel_info, time_info, nc_path, 
-              meas_ID, sig, shots):
+              meas_ID, sig, shots, compression_level = 0, chunking = None):
     
     print('-----------------------------------------')
     print('Start exporting to a Standalone Dark QA file...')
@@ -635,7 +740,8 @@ def dark_file(system_info, channel_info, time_info, nc_path,
 
     """Creates the rayleigh netcdf file according to the SCC format 
     https://docs.scc.imaa.cnr.it/en/latest/file_formats/netcdf_file.html
-    and exports it to nc_path"""
+    and exports it to nc_path. The compression_level and chunking arguments 
+    control the storage of the signal variables (see storage_options)"""
             
     n_time = sig.time.size
     n_channels = sig.channel.size
@@ -733,7 +839,7 @@ def dark_file(system_info, channel_info, time_info, nc_path,
     
     make_nc_var(ds, name = 'Background_High', value = channel_info.background_high.values, dtype = 'float', dims = ('channels',))
         
-    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',))
+    make_nc_var(ds, name = 'Raw_Lidar_Data', value = sig.values, dtype = 'float', dims = ('time', 'channels', 'points',), compression_level = compression_level, chunking = chunking)
 
     make_nc_var(ds, name = 'channel_ID', value = channel_info.scc_channel_id.values, dtype = 'int', dims = ('channels',))
 
@@ -859,9 +965,10 @@ def meas_id(lr_id, time):
     
     return(meas_ID)
         
-def path(output_folder, system_info, time, meas_type, version):
+def path(output_folder, system_info, time, meas_type, version, overwrite = True):
     """Creates a sting variable with the full path to the output QA file: 
-    https://docs.scc.imaa.cnr.it/en/latest/file_formats/netcdf_file.html"""
+    https://docs.scc.imaa.cnr.it/en/latest/file_formats/netcdf_file.html
+    An existing QA file is removed unless overwrite is False"""
 
     start_date = time.dt.date.values[0].strftime('%Y%m%d')
 
@@ -886,7 +993,7 @@ def path(output_folder, system_info, time, meas_type, version):
     if os.path.exists(output_folder) == False:
         os.makedirs(nc_path)
         
-    if os.path.exists(nc_path):
+    if os.path.exists(nc_path) and overwrite:
         os.unlink(nc_path)
         
     return(nc_path)
@@ -905,9 +1012,11 @@ def rs_path(output_folder, meas_ID):
         
     return(nc_path)
 
-def make_nc_var(ds, name, value, dtype, dims = []):  
+def make_nc_var(ds, name, value, dtype, dims = [], compression_level = 0,
+                chunking = None):  
     """Function called by the *_file functions in order to fascilitate variable
-    creation in the netcdf"""
+    creation in the netcdf. The compression_level and chunking arguments are
+    applied only to 3D variables (see storage_options)"""
     
     if dtype == 'int':
         func = np.int32
@@ -923,7 +1032,14 @@ def make_nc_var(ds, name, value, dtype, dims = []):
         value[value != value] = default_val
         value = value.astype(dtype)
 
-    var = ds.createVariable(name, func, dims)
+    if len(dims) == 3:
+        options = storage_options(shape = value.shape, 
+                                  compression_level = compression_level, 
+                                  chunking = chunking)
+    else:
+        options = dict()
+        
+    var = ds.createVariable(name, func, dims, **options)
     
     if len(dims) == 0:
         var[:] = value
@@ -942,6 +1058,62 @@ def make_nc_var(ds, name, value, dtype, dims = []):
         
     return()
 
+def storage_options(shape, compression_level = 0, chunking = None):
+    """Returns the storage keywords of netCDF4.createVariable for a signal 
+    variable with dimensions (time, channels, points) and the given shape.
+    For compression_level > 0 the variable is compressed with zlib and the 
+    shuffle filter. The chunking can be one of:
+        profile: one chunk per time frame and channel (default when the 
+                 variable is compressed). Efficient for both time frame and
+                 channel reads
+        frame: one chunk per time frame with all channels
+        channel: one chunk per channel with all time frames
+    If neither compression nor chunking is requested the variable is stored 
+    contiguously, as before"""
+    
+    options = dict()
+    
+    if compression_level > 0:
+        options['zlib'] = True
+        options['complevel'] = compression_level
+        options['shuffle'] = True
+        
+        if chunking == None:
+            chunking = 'profile'
+    
+    n_time, n_channels, n_points = [max(size, 1) for size in shape]
+    
+    if chunking == 'profile':
+        options['chunksizes'] = (1, 1, n_points)
+    
+    elif chunking == 'frame':
+        options['chunksizes'] = (1, n_channels, n_points)
+
+    elif chunking == 'channel':
+        options['chunksizes'] = (n_time, 1, n_points)
+        
+    elif chunking != None:
+        raise Exception(f"-- Error: The provided chunking ({chunking}) is not supported! Please use one of: {['profile', 'frame', 'channel']}")
+        
+    return(options)
+
+def append_nc_var(ds, name, value, dtype, n_start):  
+    """Function called by the append_*_file functions in order to fascilitate
+    appending along the unlimited time dimension of an existing variable"""
+    
+    if dtype == 'int':
+        default_val = nc.default_fillvals['i4']
+        
+    if dtype == 'float':
+        default_val = nc.default_fillvals['f8']
+      
+    value[value != value] = default_val
+    value = value.astype(dtype)
+
+    ds.variables[name][n_start:n_start + value.shape[0]] = value
+        
+    return()
+
 def make_nc_str(ds, name, value, dims, length):  
     """Function called by the *_file functions in order to fascilitate variable
     creation in the netcdf"""
@@ -963,5 +1135,13 @@ def make_nc_str(ds, name, value, dims, length):
         sys.exit('-- Error: 4 or higher dimensional arrays and scalars not supported in function make_nc_str')
         
     return()
-    
-    
\ No newline at end of file
+
+def append_nc_str(ds, name, value, n_start, length):  
+    """Function called by the append_*_file functions in order to fascilitate
+    appending along the unlimited time dimension of an existing variable"""
+
+    value_char = nc.stringtochar(value.astype(f'S{length}'))
+
+    ds.variables[name][n_start:n_start + value_char.shape[0]] = value_char
+        
+    return()
@@ -16,7 +16,8 @@ def trim_channels(cfg, sig, shots, channel_info, meas_type):
     file. All IDs in the config_file must be correspondent to the IDs in
     the raw files. If an unkown ID is included in the config_file then an error
     is raised. For polarization calibration measurements, channels that are 
-    neither co- nor cross- polar will be automatically removed"""
+    neither co- nor cross- polar will be automatically removed. Signals that
+    were read lazily are decoded here, after the channel selection"""
     
 
     channel_subtype_cfg = cfg.channels.channel_subtype.values
@@ -45,6 +46,9 @@ def trim_channels(cfg, sig, shots, channel_info, meas_type):
     channel_info = channel_info.loc[channel_ind_com,:]
     
     cfg.channels = cfg.channels.loc[channel_ind_com,:]
+    
+    # Decode lazily read signals (only the selected channels are decoded)
+    sig = sig.load()
         
     return(sig, shots, channel_info, cfg)
 
@@ -191,66 +195,122 @@ def fill_defaults(cfg):
 
     return(cfg)
 
-def unit_conv_bits_to_mV(channel_info, signal, shots):
+def unit_conv_bits_to_mV(channel_info, signal, shots, inplace = False):
 
-    """Converts analog signals from bits to mV"""
+    """Converts analog signals from bits to mV. Integer (compact) signals
+    are first converted to floats, see compact_to_float. All the analog 
+    channels are converted at once with broadcast operations on the signal 
+    array. If inplace is True the signal values are overwritten instead of 
+    converting a copy of the signal"""
     
     if len(signal) > 0:
         
-        mask_an = channel_info.acquisition_mode.values == 0
+        if np.issubdtype(signal.dtype, np.integer):
+            signal = compact_to_float(channel_info = channel_info, 
+                                      signal = signal, shots = shots)
+        elif not inplace:
+            signal = signal.copy()
+        
+        channels = signal.channel.values
+        
+        mask_an = channel_info.acquisition_mode.loc[channels].values == 0
+        
+        data_acquisition_range = channel_info.data_acquisition_range.loc[channels].values.astype(float)
         
-        channel_id_an = channel_info.index.values[mask_an]
+        analog_to_digital_resolution = channel_info.analog_to_digital_resolution.loc[channels].values.astype(float)
         
-        data_acquisition_range = channel_info.data_acquisition_range
+        # Multiplier per channel and divisor per timeframe and channel (1 for the non analog channels)
+        mult = np.ones(channels.size)
         
-        analog_to_digital_resolution = channel_info.analog_to_digital_resolution
+        mult[mask_an] = data_acquisition_range[mask_an]
         
-        for ch in channel_id_an:
-            ch_d = dict(channel = ch)
-            # analog conversion (to mV)
-            signal.loc[ch_d] = signal.loc[ch_d]*data_acquisition_range.loc[ch]/(shots.loc[ch_d]*(np.power(2,analog_to_digital_resolution.loc[ch])-1.))
+        div = np.ones(shots.shape)
+        
+        div[:, mask_an] = shots.values[:, mask_an].astype(float) * \
+            (np.power(2, analog_to_digital_resolution[mask_an]) - 1.)
+        
+        # analog conversion (to mV)
+        np.multiply(signal.values, mult[np.newaxis, :, np.newaxis], out = signal.values)
+        
+        np.divide(signal.values, div[:, :, np.newaxis], out = signal.values)
     
     return(signal) 
 
-def screen_low_shots(time_info, channel_info, signal, shots):
+def screen_low_shots(time_info, channel_info, signal, shots, inplace = False):
 
-    """Replaces values in all bins with nans if the numer of shots is
-    lower than 10% of the maximum """
-    
+    """Replaces values in all bins with nans if the number of shots is
+    lower than 90% of the maximum of the channel (see low_shots_mask). The 
+    shots of the screened profiles are also set to nan in place. The 
+    screened files are reported once per channel. If inplace is True the 
+    signal values are overwritten instead of screening a copy of the signal"""
     
     if len(signal) > 0:
-        time = signal.copy().time.values
-                
-        channel_id = channel_info.index.values
-        
-        time_ls = []
-                
-        for ch in channel_id:
-            ch_d = dict(channel = ch)
-            
-            shots_ch = shots.loc[ch_d].values.astype(float)
-            
-            if not np.isnan(shots_ch).all():
-                
-                mask_t = (shots_ch < 0.9 * np.nanmax(shots_ch)) & \
-                    (np.nanmax(shots_ch) > 20)
-                
-                time_ls.extend(time[mask_t])
-    
-                if len(time[mask_t]) > 0:                
-                    print('-- Warning: The following files have less shots than 90% of the naximum number of shots encountered and will be screened out:')
-                    for t in time[mask_t]:
-                        ind_t = np.where(t == time)[0][0]
-                        print(f'    Filename: {time_info.filename[ind_t]} | Channel: {ch}')
-                    
-                    sel = dict(time = time[mask_t], channel = ch)
-                    
-                    signal.loc[sel] = np.nan
+        
+        if not inplace:
+            signal = signal.copy()
+        
+        channels = signal.channel.values
+        
+        filename = time_info.filename.values
+        
+        mask = low_shots_mask(shots.values)
+        
+        if mask.any():
+            print('-- Warning: The following files have less shots than 90% of the naximum number of shots encountered and will be screened out:')
+            for j in np.where(mask.any(axis = 0))[0]:
+                print(f'    Channel: {channels[j]} | Filenames: {filename[mask[:,j]]}')
             
-                    shots.loc[sel] = np.nan        
+            # Integer (compact) signals cannot hold nans. They are 
+            # screened when converted to floats in unit_conv_bits_to_mV
+            if not np.issubdtype(signal.dtype, np.integer):
+                signal.values[mask, :] = np.nan
+        
+                shots.values[mask] = np.nan
             
     return(signal) 
 
+def compact_to_float(channel_info, signal, shots):
+
+    """Converts the integer raw signals of the compact reading to floats. 
+    The bins beyond the range of each channel and the profiles with low 
+    shots (see low_shots_mask) are set to nan, as in the float reading. 
+    The shots of the screened profiles are also set to nan in place"""
+    
+    bins = channel_info.bins.loc[signal.channel.values].values
+    
+    mask_bins = signal.bins.values[np.newaxis, :] >= bins[:, np.newaxis]
+    
+    mask_shots = low_shots_mask(shots.values)
+    
+    signal = signal.astype(float)
+    
+    signal.values[:, mask_bins] = np.nan
+    
+    signal.values[mask_shots, :] = np.nan
+    
+    shots.values[mask_shots] = np.nan
+    
+    return(signal)
+
+def low_shots_mask(shots):
+    
+    """Returns a boolean (time, channel) mask that is True for the profiles 
+    that have less shots than 90% of the maximum number of shots of the 
+    respective channel. Channels without any valid shots value are never
+    masked"""
+    
+    shots = np.asarray(shots, dtype = float)
+    
+    mask = np.zeros(shots.shape, dtype = bool)
+    
+    valid = ~np.isnan(shots).all(axis = 0)
+    
+    if valid.any():
+        max_shots = np.nanmax(shots[:,valid], axis = 0)
+        mask[:,valid] = (shots[:,valid] < 0.9 * max_shots) & (max_shots > 20)
+    
+    return(mask)
+
 def get_from_raw(section):
     
     if section == 'System':
@@ -310,13 +370,87 @@ def flexible_type(val, scalar_type):
 
 def slice_in_time(sig_raw, shots, time_info, slice_reg):
     
+    s_dt, e_dt = get_time_window(time = time_info.index, slice_reg = slice_reg)
+    
+    if s_dt != None and e_dt != None:
+    
+        sig_raw, shots, time_info = \
+            slice_in_window(sig_raw = sig_raw, shots = shots, 
+                            time_info = time_info, window = (s_dt, e_dt))
+        
+    return(sig_raw, shots, time_info)
+
+def slice_in_window(sig_raw, shots, time_info, window):
+    
+    """Keeps the timeframes that start within the datetime limits of window
+    (both limits included)"""
+    
+    s_dt, e_dt = window
+    
+    time_info = time_info.loc[s_dt:e_dt].copy()
+    sig_raw = sig_raw.loc[s_dt:e_dt,:,:].copy()
+    shots = shots.loc[s_dt:e_dt,:].copy()
+        
+    return(sig_raw, shots, time_info)
+
+def get_time_windows(time, windows):
+    
+    """Converts the batch slicing windows to a sorted list of datetime 
+    limits. Recurring windows (HHMM-HHMM) are applied to every date covered 
+    by the (sorted) timeframes, including the previous date for windows that
+    end after midnight. Absolute windows (YYYYMMDDHHMM-YYYYMMDDHHMM) are used
+    as they are. Only the windows that overlap with the measurement are 
+    returned"""
+    
+    s_time = time[0].to_pydatetime()
+    e_time = time[-1].to_pydatetime()
+    
+    dates = [s_time.date() + dt.timedelta(days = i) for i in 
+             range(-1, (e_time.date() - s_time.date()).days + 1)]
+    
+    limits = []
+    
+    for window in windows:
+        
+        s_lim, e_lim = window.split('-')
+        
+        if len(s_lim) == 4:
+            for date in dates:
+                s_dt = dt.datetime(date.year, date.month, date.day, 
+                                   int(s_lim[:2]), int(s_lim[2:]))
+                e_dt = dt.datetime(date.year, date.month, date.day, 
+                                   int(e_lim[:2]), int(e_lim[2:]))
+                if e_dt <= s_dt:
+                    e_dt = e_dt + dt.timedelta(days = 1)
+                limits.append((s_dt, e_dt))
+        else:
+            s_dt = dt.datetime.strptime(s_lim, '%Y%m%d%H%M')
+            e_dt = dt.datetime.strptime(e_lim, '%Y%m%d%H%M')
+            if e_dt <= s_dt:
+                raise Exception(f"-- Error: The end of the rayleigh window {window} is not after its start. Please revise the rayleigh_windows")
+            limits.append((s_dt, e_dt))
+    
+    limits = [lim for lim in sorted(set(limits)) 
+              if lim[0] <= e_time and lim[1] >= s_time]
+    
+    return(limits)
+
+def get_time_window(time, slice_reg):
+    
+    """Converts the HHMM limits of slice_reg to datetime limits based on the
+    date of the first (sorted) timeframe. Returns None, None if no slicing 
+    was requested"""
+    
     s_slice = slice_reg[0]
     e_slice = slice_reg[1]
     
+    s_dt = None
+    e_dt = None
+    
     if s_slice != None and e_slice != None:
     
-        s_date = time_info.index[0].date()
-        e_date = time_info.index[1].date()
+        s_date = time[0].date()
+        e_date = time[1].date()
         
         s_year = s_date.year
         s_month = s_date.month
@@ -336,9 +470,5 @@ def slice_in_time(sig_raw, shots, time_info, slice_reg):
             e_dt = dt.datetime(s_year, s_month, s_day, e_hour, e_mins)
         else:
             e_dt = dt.datetime(s_year, s_month, s_day + 1, e_hour, e_mins)
-    
-        time_info = time_info.loc[s_dt:e_dt].copy()
-        sig_raw = sig_raw.loc[s_dt:e_dt,:,:].copy()
-        shots = shots.loc[s_dt:e_dt,:].copy()
         
-    return(sig_raw, shots, time_info)
\ No newline at end of file
+    return(s_dt, e_dt)
\ No newline at end of file
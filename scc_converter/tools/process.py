@@ -15,10 +15,54 @@ from ..tools.automate import check_telecover_sec, check_telecover_rin
 from ..tools.automate import detect_overflows
 import shutil
 
-def rayleigh(args, version):
+def prepare_dark(args):
+    
+    """Reads the files in the dark folder and prepares the dark signals once
+    per converter run so that they can be shared by all the measurement types.
+    The dark-only pipeline of the dark QA file is applied: channel selection, 
+    low shot screening, unit conversion, and overflow handling. The callers 
+    select their channels with modify.trim_channels, which returns copies, so
+    the shared signals are never modified"""
+
+    file_format = args['file_format']
+    
+    cfg = config(path = args['config_file'], file_format = file_format, 
+                 operation_mode = args['operation_mode']) 
+
+    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d  = \
+        read_files.dark(finput_drk = args['dark_folder'], file_format = file_format, workers = args['workers'], header_index = args['header_index'], lazy = args['lazy_read'], compact = args['compact_read'])
+
+    if not isinstance(sig_raw_d,list):
+        # Remove channels that should be excluded according to the configuration file
+        sig_raw_d, shots_d, channel_info_d, cfg = \
+            modify.trim_channels(cfg = cfg, sig = sig_raw_d, shots = shots_d, channel_info = channel_info_d, meas_type = 'drk')
+        
+        # Add the information from the raw file headers to the configuration object
+        cfg = modify.merge_config(cfg = cfg, system_info = system_info_d, channel_info = channel_info_d)
+    
+        # Add default values to the configuration object when the respective variables are not provided in the configuration file
+        cfg = modify.fill_defaults(cfg)
+        
+        # Screen profiles that have an iregularly low number of shots
+        sig_raw_d = modify.screen_low_shots(time_info_d, channel_info_d, signal = sig_raw_d, shots = shots_d, inplace = True)
+    
+        # Convert analog channel units to mV (applicable mainly to licel)   
+        sig_raw_d = modify.unit_conv_bits_to_mV(channel_info_d, signal = sig_raw_d, shots = shots_d, inplace = True)
+        
+        # Detect and Screen Overflows for the dark
+        sig_raw_d, shots_d, time_info_d = \
+            detect_overflows(sig = sig_raw_d, 
+                             shots = shots_d,
+                             channel_info = cfg.channels,
+                             time_info = time_info_d,
+                             method = args['trim_overflows'],
+                             meas_type = 'drk')
+    
+    return(sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d)
+
+def rayleigh(args, version, dark = None):
    
     path_ray = args['rayleigh_folder']
-    path_drk = args['dark_folder']
     path_cfg = args['config_file']
     
     file_format = args['file_format']
@@ -33,20 +77,57 @@ def rayleigh(args, version):
     print('-----------------------------------------')
     print(' ')
 
-    # Read the files in the dark folder
-    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d  = \
-        read_files.dark(finput_drk = path_drk, file_format = file_format)
+    # Read and prepare the files in the dark folder, unless already shared by the caller
+    if dark == None:
+        dark = prepare_dark(args)
+    
+    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d = dark
     
     # Read the files in the rayleigh folder
     sig_raw, shots, system_info, channel_info, time_info = \
-        read_files.rayleigh(finput_ray = path_ray, file_format = file_format)
-        
-    sig_raw, shots, time_info = \
-        modify.slice_in_time(sig_raw = sig_raw, 
-                             shots = shots, 
-                             time_info = time_info,
-                             slice_reg = args['slice_rayleigh'])
+        read_files.rayleigh(finput_ray = path_ray, file_format = file_format, workers = args['workers'], header_index = args['header_index'], slice_reg = args['slice_rayleigh'], lazy = args['lazy_read'] or args['append'], compact = args['compact_read'])
+    
+    # The temporal slicing is already applied with the header index
+    if not (args['header_index'] and file_format in read_files.header_index_formats):
+        sig_raw, shots, time_info = \
+            modify.slice_in_time(sig_raw = sig_raw, 
+                                 shots = shots, 
+                                 time_info = time_info,
+                                 slice_reg = args['slice_rayleigh'])
     
+    append = False
+    
+    if not isinstance(sig_raw,list) and args['append']:
+        # The QA file is named after the first timeframe of the whole folder
+        time = sig_raw.time.copy()
+        
+        nc_path = make.path(output_folder = args['output_folder'], system_info = cfg.system, time = time, meas_type = 'ray', version = version, overwrite = False)
+        
+        stored = make.stored_frames(nc_path)
+        
+        # Keep only the timeframes recorded after the last stored timeframe
+        if stored != None:
+            mask_stored = np.isin(time_info.filename.values, stored[0])
+            
+            if mask_stored.any():
+                append = True
+                
+                ind_new = np.arange(mask_stored.size)[np.where(mask_stored)[0].max() + 1:]
+                
+                if ind_new.size == 0:
+                    print(f'-- No new raw files were found. The rayleigh QA file is up to date: {nc_path}')
+                    print('')
+                    args['radiosonde'] = stored[1]
+                    return([nc_path, os.path.join(args['output_folder'], stored[1])])
+                
+                print(f'-- Appending {ind_new.size} new raw file(s) to the existing rayleigh QA file')
+                
+                sig_raw = sig_raw.isel(time = ind_new)
+                shots = shots.isel(time = ind_new)
+                time_info = time_info.iloc[ind_new]
+            else:
+                print('-- Warning: None of the raw files stored in the existing rayleigh QA file was found in the rayleigh folder. The QA file will be recreated')
+                
     if not isinstance(sig_raw,list):
         # Remove channels that should be excluded according to the configuration file
         if not isinstance(sig_raw_d,list):
@@ -65,72 +146,109 @@ def rayleigh(args, version):
         cfg = modify.fill_defaults(cfg)
     
         # Screen profiles that have an iregularly low number of shots
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d = modify.screen_low_shots(time_info_d, channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        sig_raw = modify.screen_low_shots(time_info, channel_info, signal = sig_raw.copy(), shots = shots)
+        sig_raw = modify.screen_low_shots(time_info, channel_info, signal = sig_raw, shots = shots, inplace = True)
     
         # Convert analog channel units to mV (applicable mainly to licel)   
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d = modify.unit_conv_bits_to_mV(channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        
-        sig_raw = modify.unit_conv_bits_to_mV(channel_info, signal = sig_raw.copy(), shots = shots)
+        sig_raw = modify.unit_conv_bits_to_mV(channel_info, signal = sig_raw, shots = shots, inplace = True)
     
     
         # Detect and Screen Overflows
         sig_raw, shots, time_info = \
-            detect_overflows(sig = sig_raw.copy(), 
-                             shots = shots.copy(),
+            detect_overflows(sig = sig_raw, 
+                             shots = shots,
                              channel_info = cfg.channels,
                              time_info = time_info,
                              method = args['trim_overflows'],
                              meas_type = 'ray')
-    
-        # Detect and Screen Overflows for the dark
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d, shots_d, time_info_d = \
-                detect_overflows(sig = sig_raw_d.copy(), 
-                                 shots = shots_d.copy(),
-                                 channel_info = cfg.channels,
-                                 time_info = time_info_d,
-                                 method = args['trim_overflows'],
-                                 meas_type = 'drk')    
                 
-        # Creating the measurement ID
-        meas_ID = make.meas_id(lr_id = cfg.system['station_id'], time = sig_raw.time)
+        # Batch slicing: one QA file per window from a single read of the raw files
+        if args['rayleigh_windows'] != None:
+            windows = modify.get_time_windows(time = time_info.index, windows = args['rayleigh_windows'])
+        else:
+            windows = [None]
+        
+        sig_all, shots_all, time_info_all = sig_raw, shots, time_info
+        
+        path_rs = args['radiosonde']
+        
+        nc_paths = []
+        nc_paths_rs = []
+        
+        for window in windows:
+            
+            if window != None:
+                sig_raw, shots, time_info = \
+                    modify.slice_in_window(sig_raw = sig_all, shots = shots_all, time_info = time_info_all, window = window)
+                
+                if time_info.index.size == 0:
+                    print(f'-- Warning: No rayleigh timeframes were found between {window[0]} and {window[1]}. Skipping the window')
+                    continue
+                
+                print(f'-- Rayleigh window: {window[0]} - {window[1]} ({time_info.index.size} timeframes)')
+                
+                args['radiosonde'] = path_rs
+                
+            # In append mode the QA file keeps the time of the first stored timeframe
+            if not args['append']:
+                time = sig_raw.time
+        
+            # Creating the measurement ID
+            meas_ID = make.meas_id(lr_id = cfg.system['station_id'], time = time)
               
-        # Creating the paths and folders
-        nc_path = make.path(output_folder = args['output_folder'], system_info = cfg.system, time = sig_raw.time, meas_type = 'ray', version = version)
+            # Creating the paths and folders
+            nc_path = make.path(output_folder = args['output_folder'], system_info = cfg.system, time = time, meas_type = 'ray', version = version, overwrite = not append)
         
-        # Checking for radiosonde data
-        if os.path.isdir(args['radiosonde']):
-            nc_path_rs = radiosonde(args, time = sig_raw.time.values, version = version, lidar = cfg.system['lidar_name'], lr_id = cfg.system['station_id'])
-        else: 
-            nc_path_rs = os.path.join(args['output_folder'], os.path.basename(args['radiosonde']))
-            shutil.copy(args['radiosonde'], nc_path_rs)
-        args['radiosonde'] = os.path.basename(nc_path_rs)
+            # Checking for radiosonde data
+            if os.path.isdir(args['radiosonde']):
+                nc_path_rs = radiosonde(args, time = time.values, version = version, lidar = cfg.system['lidar_name'], lr_id = cfg.system['station_id'])
+            else: 
+                nc_path_rs = os.path.join(args['output_folder'], os.path.basename(args['radiosonde']))
+                shutil.copy(args['radiosonde'], nc_path_rs)
+            args['radiosonde'] = os.path.basename(nc_path_rs)
             
-        # Making the raw SCC file
-        make.rayleigh_file(system_info = cfg.system.copy(), 
-                           channel_info = cfg.channels.copy(), 
-                           time_info = time_info, time_info_d = time_info_d,
-                           nc_path = nc_path, meas_ID = meas_ID,  
-                           P = args['ground_pressure'], 
-                           T = args['ground_temperature'], 
-                           radiosonde_file = args['radiosonde'], 
-                           sig = sig_raw, sig_d = sig_raw_d,
-                           shots = shots, shots_d = shots_d)
-    
-        # Creating debugging files from the configuration and licel input
-        if args['debug']:
-            make.debug_file(path = args['output_folder'], data = cfg.system, meas_type = 'ray', label = 'config_lidar', meas_ID = meas_ID, show_index = True, header = False)
-            make.debug_file(path = args['output_folder'], data = cfg.channels, meas_type = 'ray', label = 'config_channels', meas_ID = meas_ID)
-            make.debug_file(path = args['output_folder'], data = time_info, meas_type = 'ray', label = 'time_info', meas_ID = meas_ID)
-            if not isinstance(sig_raw_d,list):
-                make.debug_file(path = args['output_folder'], data = time_info_d, meas_type = 'ray', label = 'time_info_d', meas_ID = meas_ID)
+            # Making the raw SCC file or appending the new timeframes to it
+            if append:
+                make.append_rayleigh_file(channel_info = cfg.channels.copy(), 
+                                          time_info = time_info, 
+                                          nc_path = nc_path, 
+                                          sig = sig_raw, shots = shots)
+            else:
+                make.rayleigh_file(system_info = cfg.system.copy(), 
+                                   channel_info = cfg.channels.copy(), 
+                                   time_info = time_info, time_info_d = time_info_d,
+                                   nc_path = nc_path, meas_ID = meas_ID,  
+                                   P = args['ground_pressure'], 
+                                   T = args['ground_temperature'], 
+                                   radiosonde_file = args['radiosonde'], 
+                                   sig = sig_raw, sig_d = sig_raw_d,
+                                   shots = shots, shots_d = shots_d,
+                                   unlimited = args['append'],
+                                   compression_level = args['nc_compression_level'],
+                                   chunking = args['nc_chunking'])
+    
+            # Creating debugging files from the configuration and licel input
+            if args['debug']:
+                make.debug_file(path = args['output_folder'], data = cfg.system, meas_type = 'ray', label = 'config_lidar', meas_ID = meas_ID, show_index = True, header = False)
+                make.debug_file(path = args['output_folder'], data = cfg.channels, meas_type = 'ray', label = 'config_channels', meas_ID = meas_ID)
+                make.debug_file(path = args['output_folder'], data = time_info, meas_type = 'ray', label = 'time_info', meas_ID = meas_ID)
+                if not isinstance(sig_raw_d,list):
+                    make.debug_file(path = args['output_folder'], data = time_info_d, meas_type = 'ray', label = 'time_info_d', meas_ID = meas_ID)
     
         
-        print('Succesfully generated a rayleigh QA file!')
-        print('')
+            print('Succesfully generated a rayleigh QA file!')
+            print('')
+            
+            nc_paths.append(nc_path)
+            nc_paths_rs.append(nc_path_rs)
+        
+        # The batch slicing returns the lists of the QA and radiosonde files
+        if args['rayleigh_windows'] != None:
+            if len(nc_paths) > 0:
+                nc_path = nc_paths
+                nc_path_rs = nc_paths_rs
+            else:
+                nc_path = None
+                nc_path_rs = None
     
     else:
         nc_path = None
@@ -138,11 +256,10 @@ def rayleigh(args, version):
     
     return([nc_path, nc_path_rs])
 
-def telecover(args, version):
+def telecover(args, version, dark = None):
     
     path_sec = args['telecover_sectors_folder']
     path_rin = args['telecover_rings_folder']
-    path_drk = args['dark_folder']
     path_cfg = args['config_file']
 
     file_format = args['file_format']
@@ -164,13 +281,15 @@ def telecover(args, version):
     print('-----------------------------------------')
     print(' ')
 
-    # Read the files in the dark folder
-    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d  = \
-        read_files.dark(finput_drk = path_drk, file_format = file_format)
+    # Read and prepare the files in the dark folder, unless already shared by the caller
+    if dark == None:
+        dark = prepare_dark(args)
+    
+    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d = dark
 
     # Read the files in the telecover folder
     sig_raw, shots, system_info, channel_info, time_info = \
-        read_files.telecover(finput_sec = path_sec, finput_rin = path_rin, file_format = file_format, files_per_sector = files_per_sector, files_per_ring = files_per_ring)
+        read_files.telecover(finput_sec = path_sec, finput_rin = path_rin, file_format = file_format, files_per_sector = files_per_sector, files_per_ring = files_per_ring, workers = args['workers'], header_index = args['header_index'], compact = args['compact_read'])
 
     if not isinstance(sig_raw,list):
         # Remove channels that should be excluded according to the configuration file
@@ -190,35 +309,21 @@ def telecover(args, version):
         cfg = modify.fill_defaults(cfg)
     
         # Screen profiles that have an iregularly low number of shots
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d = modify.screen_low_shots(time_info_d, channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        sig_raw = modify.screen_low_shots(time_info, channel_info, signal = sig_raw.copy(), shots = shots)
+        sig_raw = modify.screen_low_shots(time_info, channel_info, signal = sig_raw, shots = shots, inplace = True)
     
         # Convert analog channel units to mV (applicable mainly to licel)   
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d = modify.unit_conv_bits_to_mV(channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        
-        sig_raw = modify.unit_conv_bits_to_mV(channel_info, signal = sig_raw.copy(), shots = shots)
+        sig_raw = modify.unit_conv_bits_to_mV(channel_info, signal = sig_raw, shots = shots, inplace = True)
     
     
         # Detect and Screen Overflows
         sig_raw, shots, time_info = \
-            detect_overflows(sig = sig_raw.copy(), 
-                             shots = shots.copy(),
+            detect_overflows(sig = sig_raw, 
+                             shots = shots,
                              channel_info = cfg.channels,
                              time_info = time_info,
                              method = args['trim_overflows'],
                              meas_type = 'tlc')
             
-        # Detect and Screen Overflows for the dark
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d, shots_d, time_info_d = \
-                detect_overflows(sig = sig_raw_d.copy(), 
-                                 shots = shots_d.copy(),
-                                 channel_info = cfg.channels,
-                                 time_info = time_info_d,
-                                 method = args['trim_overflows'],
-                                 meas_type = 'drk')    
         # Creating the measurement ID
         meas_ID = make.meas_id(lr_id = cfg.system['station_id'], time = sig_raw.time)
               
@@ -231,7 +336,9 @@ def telecover(args, version):
                             time_info = time_info, time_info_d = time_info_d,
                             nc_path = nc_path, meas_ID = meas_ID, 
                             sig = sig_raw, sig_d = sig_raw_d,
-                            shots = shots, shots_d = shots_d)
+                            shots = shots, shots_d = shots_d,
+                            compression_level = args['nc_compression_level'],
+                            chunking = args['nc_chunking'])
     
         # Creating debugging files from the configuration and licel input
         if args['debug']:
@@ -250,13 +357,12 @@ def telecover(args, version):
         
     return([nc_path])
 
-def polarization_calibration(args, version):
+def polarization_calibration(args, version, dark = None):
    
     path_ray = args['rayleigh_folder']
     path_p45 = args['pcb_cal_p45_folder']
     path_m45 = args['pcb_cal_m45_folder']
     path_stc = args['pcb_cal_stc_folder']
-    path_drk = args['dark_folder']
     path_cfg = args['config_file']
 
     file_format = args['file_format']
@@ -275,13 +381,15 @@ def polarization_calibration(args, version):
     if not args['rayleigh_filename']:
         raise Exception("-- Error: A polarization calibration measurement is being processed but the rayleigh filename was not provided in the arguments! Please prepare the rayleigh file fist and included it with: -l <rayleigh_filename>'")
         
-    # Read the files in the dark folder
-    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d  = \
-        read_files.dark(finput_drk = path_drk, file_format = file_format)
+    # Read and prepare the files in the dark folder, unless already shared by the caller
+    if dark == None:
+        dark = prepare_dark(args)
+    
+    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d = dark
 
     # Read the files in the calibration folder
     sig_raw, shots, system_info, channel_info, time_info = \
-        read_files.polarization_calibration(finput_ray = path_ray, finput_p45 = path_p45, finput_m45 = path_m45, finput_stc = path_stc, file_format = file_format)
+        read_files.polarization_calibration(finput_ray = path_ray, finput_p45 = path_p45, finput_m45 = path_m45, finput_stc = path_stc, file_format = file_format, workers = args['workers'], header_index = args['header_index'], compact = args['compact_read'])
 
     if not isinstance(sig_raw,list):
         # Remove channels that should be excluded according to the configuration file
@@ -301,34 +409,19 @@ def polarization_calibration(args, version):
         cfg = modify.fill_defaults(cfg)
     
         # Screen profiles that have an iregularly low number of shots
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d = modify.screen_low_shots(time_info_d, channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        sig_raw = modify.screen_low_shots(time_info, channel_info, signal = sig_raw.copy(), shots = shots)
+        sig_raw = modify.screen_low_shots(time_info, channel_info, signal = sig_raw, shots = shots, inplace = True)
     
         # Convert analog channel units to mV (applicable mainly to licel)   
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d = modify.unit_conv_bits_to_mV(channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        
-        sig_raw = modify.unit_conv_bits_to_mV(channel_info, signal = sig_raw.copy(), shots = shots)
+        sig_raw = modify.unit_conv_bits_to_mV(channel_info, signal = sig_raw, shots = shots, inplace = True)
     
         # Detect and Screen Overflows
         sig_raw, shots, time_info = \
-            detect_overflows(sig = sig_raw.copy(), 
-                             shots = shots.copy(),
+            detect_overflows(sig = sig_raw, 
+                             shots = shots,
                              channel_info = cfg.channels,
                              time_info = time_info,
                              method = args['trim_overflows'],
                              meas_type = 'pcb')
-            
-        # Detect and Screen Overflows for the dark
-        if not isinstance(sig_raw_d,list):
-            sig_raw_d, shots_d, time_info_d = \
-                detect_overflows(sig = sig_raw_d.copy(), 
-                                 shots = shots_d.copy(),
-                                 channel_info = cfg.channels,
-                                 time_info = time_info_d,
-                                 method = args['trim_overflows'],
-                                 meas_type = 'drk')
                 
         # Creating the measurement ID
         meas_ID = make.meas_id(lr_id = cfg.system['station_id'], time = sig_raw.time)
@@ -346,7 +439,9 @@ def polarization_calibration(args, version):
                                            radiosonde_file = args['radiosonde'],
                                            rayleigh = args['rayleigh_filename'],  
                                            sig = sig_raw, sig_d = sig_raw_d,
-                                           shots = shots, shots_d = shots_d)
+                                           shots = shots, shots_d = shots_d,
+                                           compression_level = args['nc_compression_level'],
+                                           chunking = args['nc_chunking'])
     
         # Creating debugging files from the configuration and licel input
         if args['debug']:
@@ -366,9 +461,8 @@ def polarization_calibration(args, version):
     
     return([nc_path])
 
-def dark(args, version):
+def dark(args, version, dark = None):
 
-    path_drk = args['dark_folder']
     path_cfg = args['config_file']
 
     file_format = args['file_format']
@@ -382,9 +476,11 @@ def dark(args, version):
     print('-----------------------------------------')
     print(' ')
 
-    # Read the files in the dark folder
-    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d  = \
-        read_files.dark(finput_drk = path_drk, file_format = file_format)
+    # Read and prepare the files in the dark folder, unless already shared by the caller
+    if dark == None:
+        dark = prepare_dark(args)
+    
+    sig_raw_d, shots_d, system_info_d, channel_info_d, time_info_d = dark
 
     if not isinstance(sig_raw_d,list):
         # Remove channels that should be excluded according to the configuration file
@@ -398,21 +494,6 @@ def dark(args, version):
         # Add default values to the configuration object when the respective variables are not provided in the configuration file
         cfg = modify.fill_defaults(cfg)
         
-        # Screen profiles that have an iregularly low number of shots
-        sig_raw_d = modify.screen_low_shots(time_info_d, channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-    
-        # Convert analog channel units to mV (applicable mainly to licel)   
-        sig_raw_d = modify.unit_conv_bits_to_mV(channel_info_d, signal = sig_raw_d.copy(), shots = shots_d)
-        
-        # Detect and Screen Overflows for the dark
-        sig_raw_d, shots_d, time_info_d = \
-            detect_overflows(sig = sig_raw_d.copy(), 
-                             shots = shots_d.copy(),
-                             channel_info = cfg.channels,
-                             time_info = time_info_d,
-                             method = args['trim_overflows'],
-                             meas_type = 'drk')
-        
         # Creating the measurement ID
         meas_ID = make.meas_id(lr_id = cfg.system['station_id'], time = sig_raw_d.time)
               
@@ -424,7 +505,9 @@ def dark(args, version):
                        channel_info = cfg.channels.copy(),
                        time_info = time_info_d,
                        nc_path = nc_path, meas_ID = meas_ID, 
-                       sig = sig_raw_d, shots = shots_d)
+                       sig = sig_raw_d, shots = shots_d,
+                       compression_level = args['nc_compression_level'],
+                       chunking = args['nc_chunking'])
     
         # Creating debugging files from the configuration and licel input
         if args['debug']:
@@ -30,6 +30,27 @@ class ConverterSettingsWindow (SettingsWindow):
         self.files_per_ring = AtlasUIInputField.FromSetting ( parent = self, label = "Files per ring", setting = self._settings.files_per_ring )
         self.sizer.Add ( self.files_per_ring, 1, wx.EXPAND )
         
+        self.workers = AtlasUIInputField.FromSetting ( parent = self, label = "Reading workers", setting = self._settings.workers )
+        self.sizer.Add ( self.workers, 1, wx.EXPAND )
+        
+        self.header_index = AtlasUIInputField.FromSetting ( parent = self, label = "Use header index?", setting = self._settings.header_index )
+        self.sizer.Add ( self.header_index, 1, wx.EXPAND )
+        
+        self.lazy_read = AtlasUIInputField.FromSetting ( parent = self, label = "Lazy reading?", setting = self._settings.lazy_read )
+        self.sizer.Add ( self.lazy_read, 1, wx.EXPAND )
+        
+        self.compact_read = AtlasUIInputField.FromSetting ( parent = self, label = "Compact (integer) reading?", setting = self._settings.compact_read )
+        self.sizer.Add ( self.compact_read, 1, wx.EXPAND )
+        
+        self.append = AtlasUIInputField.FromSetting ( parent = self, label = "Append to existing QA file?", setting = self._settings.append )
+        self.sizer.Add ( self.append, 1, wx.EXPAND )
+        
+        self.nc_compression_level = AtlasUIInputField.FromSetting ( parent = self, label = "QA file compression level", setting = self._settings.nc_compression_level )
+        self.sizer.Add ( self.nc_compression_level, 1, wx.EXPAND )
+        
+        self.nc_chunking = AtlasUIInputField.FromSetting ( parent = self, label = "QA file chunking", setting = self._settings.nc_chunking )
+        self.sizer.Add ( self.nc_chunking, 1, wx.ALIGN_CENTER_VERTICAL | wx.EXPAND )
+        
         self.rsonde_skip_header = AtlasUIInputField.FromSetting ( parent = self, label = "Radiosonde header lines to ignore", setting = self._settings.rsonde_skip_header )
         self.sizer.Add ( self.rsonde_skip_header, 1, wx.EXPAND )
         
@@ -36,6 +36,24 @@ class PreprocessorSettingsWindow (SettingsWindow):
         self.exclude_channel_subtype = AtlasUIInputField.FromSetting ( self._settings.exclude_channel_subtype, parent = self, label = "Exclude acquisition mode" )
         self.sizer.Add (self.exclude_channel_subtype, pos = wx.GBPosition (3, 1), flag = wx.EXPAND)
         
+        self.cache_size = AtlasUIInputField.FromSetting ( self._settings.cache_size, parent = self, label = "Cache size [MB]" )
+        self.sizer.Add ( self.cache_size, pos = wx.GBPosition (4, 0), flag = wx.EXPAND )
+        
+        self.fused_preprocessing = AtlasUIInputField.FromSetting ( self._settings.fused_preprocessing, parent = self, label = "Fused quicklook preprocessing?" )
+        self.sizer.Add ( self.fused_preprocessing, pos = wx.GBPosition (4, 1), flag = wx.EXPAND )
+        
+        self.workers = AtlasUIInputField.FromSetting ( self._settings.workers, parent = self, label = "Preprocessor workers" )
+        self.sizer.Add ( self.workers, pos = wx.GBPosition (5, 0), flag = wx.EXPAND )
+        
+        self.memory_limit = AtlasUIInputField.FromSetting ( self._settings.memory_limit, parent = self, label = "Memory limit [MB]" )
+        self.sizer.Add ( self.memory_limit, pos = wx.GBPosition (5, 1), flag = wx.EXPAND )
+        
+        self.chunked_quicklook = AtlasUIInputField.FromSetting ( self._settings.chunked_quicklook, parent = self, label = "Chunked quicklook preprocessing?" )
+        self.sizer.Add ( self.chunked_quicklook, pos = wx.GBPosition (6, 0), flag = wx.EXPAND )
+        
+        self.chunk_size = AtlasUIInputField.FromSetting ( self._settings.chunk_size, parent = self, label = "Chunk size [MB]" )
+        self.sizer.Add ( self.chunk_size, pos = wx.GBPosition (6, 1), flag = wx.EXPAND )
+        
         self.sizer.SetFlexibleDirection(wx.VERTICAL)
         self.sizer.AddGrowableCol (idx = 0, proportion = 1)
         self.sizer.AddGrowableCol (idx = 1, proportion = 1)
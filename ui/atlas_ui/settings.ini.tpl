@@ -15,6 +15,31 @@ files_per_sector = ${converter.files_per_sector.pretty}
 #files_per_ring: The number of telecover files per ring (integer). If provided, the telecover files must be placed in a single folder (this should be <path_to_parent_folder>/tlc_rin according to the default folder structure). An automated assignment of the telecover files in different sectors will be attempted serially assuming the following temporal sequence of sectors: inner - outer. Note that the telecover test can have more than 1 rounds.
 files_per_ring = ${converter.files_per_ring.pretty}
 
+#workers: The number of workers used by the converter to decode the raw files of each measurement folder concurrently (integer). Folders with only a few files are always read serially. The converter output does not depend on the number of workers. Defaults to: 1 (serial reading)
+workers = ${converter.workers.pretty}
+
+#header_index: If set to True, a header index (.atlas_header_index.csv) is created and incrementally updated inside each raw measurement folder. It holds the start/end time, shots, and channel layout of each raw file. The converter uses it to skip files outside the slice_rayleigh limits and to avoid decoding files with low shots in all channels. Currently supported only for the licel and licel_old2rack formats. Defaults to: False
+header_index = ${converter.header_index.pretty}
+
+#lazy_read: If set to True, the raw signals of the rayleigh and dark measurements are memory-mapped and only the channels selected in the configuration file are decoded. It reduces the peak memory for long measurements with many channels. Currently supported only for the licel and licel_old2rack formats. Defaults to: False
+lazy_read = ${converter.lazy_read.pretty}
+
+#compact_read: If set to True, the raw signals are kept as 32bit unsigned integers (their native width in the raw files) instead of floats until the conversion of the analog channels to mV. It halves the memory of the raw signals for long measurements. The QA files are not affected. Currently supported only for the licel and licel_old2rack formats. Defaults to: False
+compact_read = ${converter.compact_read.pretty}
+
+#append: If set to True, the rayleigh QA file is created with an unlimited time dimension. Each later run on the same rayleigh folder decodes only the raw files recorded after the last timeframe of the existing QA file and appends them to it. Overflow and low shot screening are applied to the new timeframes only. Intended for repeated conversions during an ongoing measurement. Defaults to: False
+append = ${converter.append.pretty}
+
+#nc_compression_level: The zlib compression level (0-9) of the signal variables (Raw_Lidar_Data, Background_Profile) of the QA files. The shuffle filter is applied together with the compression. Higher levels produce smaller files but take longer to write. Defaults to: 0 (no compression)
+nc_compression_level = ${converter.nc_compression_level.pretty}
+
+#nc_chunking: The chunk shape of the signal variables of the QA files. Choose one of:
+#    • profile: one chunk per time frame and channel, efficient for both time frame and channel reads
+#    • frame: one chunk per time frame with all channels
+#    • channel: one chunk per channel with all time frames
+#Defaults to: profile if nc_compression_level > 0, otherwise the signals are stored contiguously
+nc_chunking = ${converter.nc_chunking.pretty}
+
 #rsonde_skip_header: Radiosonde parser option. Number of lines to skip at the beginning of the radiosonde ascii file. Defaults to: 1 (1 line reserved for header info)
 rsonde_skip_header = ${converter.rsonde_skip_header.pretty}
 
@@ -85,6 +110,24 @@ exclude_acquisition_mode = ${preprocessor.exclude_acquisition_mode.pretty}
 #exclude_channel_subtype: Provide it to entirely exclude all channels of a specific channel_subtype. By default, no channel is excluded if this variable is not provided. 
 exclude_channel_subtype = ${preprocessor.exclude_channel_subtype.pretty}
 
+#cache_size: The memory cap in MB of the in-process cache of the parsed QA files and the preprocessed dark profiles. The cache is shared by all the preprocessor calls of the same run so that e.g. the rayleigh QA file of a polarization calibration is parsed only once. Use 0 to disable caching. Defaults to: 512
+cache_size = ${preprocessor.cache_size.pretty}
+
+#fused_preprocessing: If set to True then the quicklook signals will be preprocessed in a single pass over blocks of timeframes instead of one pass per preprocessing stage. The results are identical but the memory traffic is much lower for long quicklooks. It is ignored in debug mode because the intermediate stages are not stored. Defaults to: False
+fused_preprocessing = ${preprocessor.fused_preprocessing.pretty}
+
+#workers: The number of processes used to preprocess the measurements of the run concurrently. The polarization calibration always runs after the rayleigh fit in the same process because it depends on the rayleigh QA file. Use 1 to preprocess the measurements one after the other. Defaults to: 1
+workers = ${preprocessor.workers.pretty}
+
+#memory_limit: The memory budget in MB of the concurrent preprocessor processes. A measurement waits for a running one to finish if its estimated memory does not fit in the budget. Only used if workers is larger than 1. Use 0 for no limit. Defaults to: 0
+memory_limit = ${preprocessor.memory_limit.pretty}
+
+#chunked_quicklook: If set to True then the signals of the measurement will not be read in memory at once. They are read, preprocessed, and written to the quicklook file in blocks of timeframes, and the averaged signals are accumulated block by block. The results are identical. Only used if quicklook is set to True and ignored in debug mode. Defaults to: False
+chunked_quicklook = ${preprocessor.chunked_quicklook.pretty}
+
+#chunk_size: The size in MB of the raw signals of a block of timeframes in the chunked quicklook mode. Only used if chunked_quicklook is set to True. Defaults to: 256
+chunk_size = ${preprocessor.chunk_size.pretty}
+
 #-------------------------------------------------------------------------------------------------
 # Visualizer options following below. Please note:
 #    • If new data is set to False, the converter and preprocessor sections will not be taken into
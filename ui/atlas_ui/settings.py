@@ -270,6 +270,21 @@ class ATLASConverterSettings(BaseSettings):
         self.files_per_sector = ATLASIntegerOption ( default = None )
         self.files_per_ring = ATLASIntegerOption ( default = None )
         
+        self.workers = ATLASIntegerOption ( default = 1, min = 1, max = 256 )
+        self.header_index = ATLASSelectOption ( default = False )
+        self.lazy_read = ATLASSelectOption ( default = False )
+        self.compact_read = ATLASSelectOption ( default = False )
+        self.append = ATLASSelectOption ( default = False )
+        self.nc_compression_level = ATLASIntegerOption ( default = 0, min = 0, max = 9 )
+        self.nc_chunking = ATLASChoiceOption (
+            default = None,
+            choices = {
+                "profile": "Per time frame and channel",
+                "frame": "Per time frame",
+                "channel": "Per channel"
+            }
+        )
+        
         self.rsonde_skip_header = ATLASIntegerOption ( default = 1, min = 0, max = 100 )
         self.rsonde_skip_footer = ATLASIntegerOption ( default = 0, min = 0, max = 100 )
         self.rsonde_delimiter = ATLASChoiceOption (
@@ -387,6 +402,12 @@ class ATLASPreprocessorSettings(BaseSettings):
                 "x": "Unspecified"
             }
         )
+        self.cache_size = ATLASDoubleOption ( default = 512, min = 0, max = 65536 )
+        self.fused_preprocessing = ATLASSelectOption ( default = False )
+        self.workers = ATLASIntegerOption ( default = 1, min = 1, max = 64 )
+        self.memory_limit = ATLASDoubleOption ( default = 0, min = 0, max = 1048576 )
+        self.chunked_quicklook = ATLASSelectOption ( default = False )
+        self.chunk_size = ATLASDoubleOption ( default = 256, min = 1, max = 65536 )
         
 class ATLASQuicklooksSettings(BaseSettings):
     def __init__ (self):